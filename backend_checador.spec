@@ -6,6 +6,14 @@ binaries = []
 hiddenimports = []
 tmp_ret = collect_all('face_recognition_models')
 datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
+# face_recognition se importa de forma diferida (services/biometric.py) y los
+# procesos del pool importan los servicios dentro de funciones: declararlos
+# explícitamente para que PyInstaller los incluya
+hiddenimports += ['face_recognition', 'dlib', 'services.biometric', 'services.encoder_pool']
+# uvicorn elige la implementación de WebSocket en tiempo de ejecución (/api/attendance/stream)
+hiddenimports += ['websockets', 'uvicorn.protocols.websockets.websockets_impl']
+# Con CHECADOR_WEB_WORKERS > 1 cada worker importa la app como "main:app"
+hiddenimports += ['main']
 
 
 a = Analysis(
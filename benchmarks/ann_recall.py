@@ -0,0 +1,94 @@
+"""
+Recall y latencia del índice de la galería por configuración.
+
+Uso:
+    python -m benchmarks.ann_recall --sizes 10000 50000 --nprobe 1 4 8 16 --output ann.json
+
+Compara cada configuración IVF contra la búsqueda exacta (BruteForceIndex):
+recall@1 = fracción de consultas cuyo vecino más cercano coincide con el exacto.
+Los datos sintéticos son uniformes (peor caso para IVF); con encodings reales,
+que forman grupos, el recall a igual nprobe suele ser mayor.
+"""
+import argparse
+import json
+import time
+import numpy as np
+from benchmarks.synthetic import VECTOR_DIM, random_gallery, noisy_queries, percentiles
+from services.face_index import BruteForceIndex, IVFIndex
+
+
+def _run(index, queries: np.ndarray) -> tuple[list, list[float]]:
+    answers = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        owners, sq_dist = index.candidates(query)
+        answers.append(owners[int(np.argmin(sq_dist))] if len(owners) else None)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return answers, latencies
+
+
+def evaluate(size: int, nprobes: list[int], nlist: int = 0, query_count: int = 500, seed: int = 0) -> list[dict]:
+    matrix = random_gallery(size, seed=seed)
+    owners = np.array([f"emp-{i}" for i in range(size)], dtype=object)
+    queries, _ = noisy_queries(matrix, query_count, seed=seed + 1)
+
+    exact = BruteForceIndex(VECTOR_DIM)
+    start = time.perf_counter()
+    exact.build(matrix, owners)
+    exact_build = time.perf_counter() - start
+    truth, exact_latencies = _run(exact, queries)
+
+    report = [{
+        "index": "exact",
+        "size": size,
+        "build_s": exact_build,
+        "recall_at_1": 1.0,
+        "latency": percentiles(exact_latencies),
+    }]
+
+    for nprobe in nprobes:
+        ivf = IVFIndex(VECTOR_DIM, nlist=nlist, nprobe=nprobe, min_rows=0, seed=seed)
+        start = time.perf_counter()
+        ivf.build(matrix, owners)
+        build = time.perf_counter() - start
+
+        answers, latencies = _run(ivf, queries)
+        recall = float(np.mean([a == t for a, t in zip(answers, truth)]))
+        report.append({
+            "index": "ivf",
+            "size": size,
+            "nlist": ivf.partitions,
+            "nprobe": nprobe,
+            "build_s": build,
+            "recall_at_1": recall,
+            "latency": percentiles(latencies),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--nlist", type=int, default=0, help="0 = raíz cuadrada del tamaño")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--output", help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for row in evaluate(size, args.nprobe, args.nlist, args.queries):
+            results.append(row)
+            latency = row["latency"]
+            label = row["index"] if row["index"] == "exact" else f"ivf nlist={row['nlist']} nprobe={row['nprobe']}"
+            print(f"{row['size']:>7}  {label:<28} recall@1={row['recall_at_1']:.3f}  "
+                  f"p50={latency['p50_ms']:.3f}ms  p95={latency['p95_ms']:.3f}ms  build={row['build_s']:.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
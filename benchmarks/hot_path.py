@@ -0,0 +1,285 @@
+"""
+Benchmarks de la ruta crítica de reconocimiento y checada.
+
+Uso:
+    python -m benchmarks.hot_path --sizes 1000 10000 100000 --output antes.json
+    python -m benchmarks.hot_path --only match gallery_load --output despues.json
+    python -m benchmarks.hot_path --compare antes.json despues.json
+
+Mide, por tamaño de galería (empleados sintéticos con encodings aleatorios
+de norma unitaria):
+- gallery_load:   FaceGallery.load desde SQLite (arranque / invalidación).
+- match:          BiometricService.find_best_match (galería + db.get).
+- encode:         BiometricService.vector_from_image sobre imágenes sintéticas,
+                  en el mismo proceso (sin el pool).
+- check_in:       POST /api/attendance/check-in completo con TestClient.
+- check_in_vector: POST /api/attendance/check-in/vector con vectores cercanos a
+                  empleados distintos (cada uno genera un registro).
+
+Todo corre en un directorio temporal con su propia checador_python.db; la
+base real nunca se toca. La configuración (CHECADOR_*) se toma del entorno,
+igual que el servidor, y se guarda en el JSON para comparar corridas.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from benchmarks.synthetic import (
+    random_gallery, noisy_queries, synthetic_face_image, percentiles, throughput
+)
+
+BENCHMARKS = ["gallery_load", "match", "encode", "check_in", "check_in_vector"]
+# Benchmarks que dependen del tamaño de la galería
+SIZED = {"gallery_load", "match", "check_in", "check_in_vector"}
+
+
+def _timed(fn, items) -> tuple[list[float], float, list]:
+    """Ejecuta fn(item) para cada item; retorna (latencias ms, segundos totales, resultados)."""
+    latencies = []
+    results = []
+    begin = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        results.append(fn(item))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, time.perf_counter() - begin, results
+
+
+def _row(benchmark: str, size, latencies: list[float], elapsed: float, **extra) -> dict:
+    return {
+        "benchmark": benchmark,
+        "size": size,
+        "latency": percentiles(latencies),
+        "throughput_per_s": throughput(len(latencies), elapsed),
+        **extra
+    }
+
+
+def seed_gallery(size: int, seed: int = 0) -> tuple[np.ndarray, list[str]]:
+    """Reemplaza los empleados de la BD temporal por `size` empleados sintéticos."""
+    from sqlalchemy import insert
+    from database import engine
+    import models
+
+    matrix = random_gallery(size, seed=seed)
+    ids = [f"bench-{seed}-{i:06d}" for i in range(size)]
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        for table in (models.DailySummary, models.AttendanceRecord, models.FaceTemplate, models.Employee):
+            conn.execute(table.__table__.delete())
+
+        for begin in range(0, size, 5000):
+            chunk = range(begin, min(size, begin + 5000))
+            blobs = [models.encode_face_vector(matrix[i]) for i in chunk]
+            conn.execute(insert(models.Employee.__table__), [
+                {"id": ids[i], "code": f"B{i:06d}", "full_name": f"Empleado {i}", "face_vector_blob": blob,
+                 "is_active": True, "created_at_utc": now}
+                for i, blob in zip(chunk, blobs)
+            ])
+            conn.execute(insert(models.FaceTemplate.__table__), [
+                {"id": models.generate_uuid(), "employee_id": ids[i], "vector_blob": blob,
+                 "source": "enroll", "created_at_utc": now}
+                for i, blob in zip(chunk, blobs)
+            ])
+    return matrix, ids
+
+
+def bench_gallery_load(size: int, repeats: int) -> dict:
+    from database import SessionLocal
+    from services.gallery import FaceGallery, _configured_index
+    import config
+
+    db = SessionLocal()
+    try:
+        target = FaceGallery(reduce=config.TEMPLATE_REDUCE, index_factory=_configured_index)
+        latencies, elapsed, _ = _timed(lambda _: target.load(db), range(repeats))
+    finally:
+        db.close()
+    return _row("gallery_load", size, latencies, elapsed, rows=len(target))
+
+
+def bench_match(size: int, matrix: np.ndarray, ids: list[str], query_count: int) -> dict:
+    from database import SessionLocal
+    from services.biometric import BiometricService
+    from services.gallery import gallery
+
+    queries, targets = noisy_queries(matrix, query_count, seed=size)
+    db = SessionLocal()
+    try:
+        gallery.load(db)
+        service = BiometricService(db)
+        service.find_best_match(queries[0])  # Calentamiento
+        latencies, elapsed, results = _timed(service.find_best_match, queries)
+    finally:
+        db.close()
+
+    hits = sum(1 for employee, target in zip(results, targets) if employee is not None and employee.id == ids[target])
+    return _row("match", size, latencies, elapsed, hit_rate=hits / len(queries))
+
+
+def bench_encode(image_count: int) -> dict:
+    from io import BytesIO
+    from services.biometric import BiometricService
+
+    images = [synthetic_face_image(seed) for seed in range(image_count)]
+    BiometricService.vector_from_image(BytesIO(images[0]))  # Calentamiento (carga de modelos)
+    latencies, elapsed, results = _timed(lambda data: BiometricService.vector_from_image(BytesIO(data)), images)
+    faces = sum(1 for vector in results if vector)
+    return _row("encode", None, latencies, elapsed, faces_found=faces)
+
+
+def bench_check_in(client, size: int, request_count: int) -> dict:
+    images = [synthetic_face_image(seed) for seed in range(request_count)]
+
+    def post(data):
+        return client.post("/api/attendance/check-in", files={"file": ("bench.jpg", data, "image/jpeg")}).status_code
+
+    latencies, elapsed, statuses = _timed(post, images)
+    return _row("check_in", size, latencies, elapsed, statuses=_count(statuses))
+
+
+def bench_check_in_vector(client, size: int, matrix: np.ndarray, request_count: int) -> dict:
+    # Un empleado distinto por request para que ninguno caiga en el anti-rebote
+    queries, _ = noisy_queries(matrix, min(request_count, size), seed=size + 1, unique=True)
+
+    def post(vector):
+        response = client.post(
+            "/api/attendance/check-in/vector",
+            content=np.asarray(vector, dtype="<f4").tobytes(),
+            headers={"Content-Type": "application/octet-stream"}
+        )
+        return response.status_code, response.json().get("success")
+
+    latencies, elapsed, results = _timed(post, queries)
+    return _row("check_in_vector", size, latencies, elapsed,
+                statuses=_count([status for status, _ in results]),
+                recorded=sum(1 for _, success in results if success))
+
+
+def _count(values) -> dict:
+    counts = {}
+    for value in values:
+        counts[str(value)] = counts.get(str(value), 0) + 1
+    return counts
+
+
+def run(sizes: list[int], only: list[str], queries: int, images: int, requests: int, repeats: int) -> dict:
+    """Corre los benchmarks pedidos en un directorio temporal y retorna el reporte."""
+    workdir = tempfile.mkdtemp(prefix="checador_bench_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # database.py usa ./checador_python.db
+    try:
+        import config
+        import main  # Crea las tablas y aplica migraciones en la BD temporal
+        from fastapi.testclient import TestClient
+        from services.gallery import gallery
+        from services.attendance_state import attendance_state
+
+        results = []
+        if "encode" in only:
+            results.append(bench_encode(images))
+            _report(results[-1])
+
+        for size in sizes:
+            if not SIZED & set(only):
+                break
+            matrix, ids = seed_gallery(size)
+            gallery.invalidate()
+            attendance_state.invalidate()
+
+            if "gallery_load" in only:
+                results.append(bench_gallery_load(size, repeats))
+                _report(results[-1])
+            if "match" in only:
+                results.append(bench_match(size, matrix, ids, queries))
+                _report(results[-1])
+            if "check_in" in only or "check_in_vector" in only:
+                with TestClient(main.app) as client:
+                    if "check_in" in only:
+                        results.append(bench_check_in(client, size, requests))
+                        _report(results[-1])
+                    if "check_in_vector" in only:
+                        results.append(bench_check_in_vector(client, size, matrix, requests))
+                        _report(results[-1])
+
+        return {
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "config": {
+                    "index": config.INDEX_TYPE,
+                    "template_reduce": config.TEMPLATE_REDUCE,
+                    "encoder_workers": config.ENCODER_WORKERS,
+                    "max_image_side": config.ENCODER_MAX_IMAGE_SIDE,
+                    "detection_side": config.ENCODER_DETECTION_SIDE,
+                    "detection_model": config.ENCODER_DETECTION_MODEL,
+                },
+            },
+            "results": results,
+        }
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _report(row: dict) -> None:
+    latency = row["latency"]
+    size = "-" if row["size"] is None else row["size"]
+    print(f"{row['benchmark']:<16} {size:>7}  p50={latency['p50_ms']:.3f}ms  p95={latency['p95_ms']:.3f}ms  "
+          f"p99={latency['p99_ms']:.3f}ms  {row['throughput_per_s']:.1f}/s")
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """Imprime el cambio en p50/p95/p99 y throughput entre dos corridas."""
+    with open(before_path) as f:
+        before = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = json.load(f)["results"]
+
+    def delta(old, new):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    for row in after:
+        old = before.get((row["benchmark"], row["size"]))
+        if old is None:
+            continue
+        size = "-" if row["size"] is None else row["size"]
+        parts = [f"{key}={delta(old['latency'][f'{key}_ms'], row['latency'][f'{key}_ms'])}" for key in ("p50", "p95", "p99")]
+        parts.append(f"throughput={delta(old['throughput_per_s'], row['throughput_per_s'])}")
+        print(f"{row['benchmark']:<16} {size:>7}  " + "  ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--queries", type=int, default=500, help="Búsquedas por tamaño (match)")
+    parser.add_argument("--images", type=int, default=50, help="Imágenes sintéticas (encode)")
+    parser.add_argument("--requests", type=int, default=100, help="Requests por tamaño (check_in)")
+    parser.add_argument("--repeats", type=int, default=5, help="Cargas por tamaño (gallery_load)")
+    parser.add_argument("--output", help="Archivo JSON con los resultados")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"), help="Comparar dos archivos JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = os.path.abspath(args.output) if args.output else None
+    report = run(args.sizes, args.only, args.queries, args.images, args.requests, args.repeats)
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
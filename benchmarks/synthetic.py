@@ -0,0 +1,88 @@
+import numpy as np
+from io import BytesIO
+from PIL import Image, ImageDraw
+
+VECTOR_DIM = 128
+
+
+def random_gallery(n: int, dim: int = VECTOR_DIM, seed: int = 0) -> np.ndarray:
+    """Galería sintética de n encodings float32 de norma unitaria."""
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def noisy_queries(gallery: np.ndarray, count: int, noise: float = 0.35, seed: int = 1,
+                  unique: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Consultas que simulan una nueva foto de empleados existentes: un vector de
+    la galería más ruido de norma `noise`, re-normalizado. Con `unique` cada
+    consulta viene de una fila distinta (count <= len(gallery)).
+    Retorna (consultas, índice de la fila de origen).
+    """
+    rng = np.random.default_rng(seed)
+    if unique:
+        targets = rng.permutation(len(gallery))[:count]
+    else:
+        targets = rng.integers(0, len(gallery), size=count)
+    noise_vectors = rng.standard_normal((count, gallery.shape[1])).astype(np.float32)
+    noise_vectors *= noise / np.linalg.norm(noise_vectors, axis=1, keepdims=True)
+    queries = gallery[targets] + noise_vectors
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.astype(np.float32), targets
+
+
+def synthetic_face_image(seed: int = 0, width: int = 640, height: int = 480, quality: int = 90) -> bytes:
+    """
+    JPEG con un rostro esquemático (óvalo, ojos, cejas, nariz y boca) sobre
+    un fondo con ruido, con posición y tono variables según `seed`.
+    Sirve para medir el costo del pipeline de imagen (decodificación,
+    detección y encoding); que el detector lo acepte como cara depende del modelo.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+    image = Image.fromarray(background)
+    draw = ImageDraw.Draw(image)
+
+    face_w = int(width * rng.uniform(0.25, 0.4))
+    face_h = int(face_w * 1.3)
+    left = int(rng.uniform(0.1, 0.9) * (width - face_w))
+    top = int(rng.uniform(0.1, 0.9) * (height - face_h))
+    skin = tuple(int(c) for c in rng.integers(150, 235, size=3))
+    draw.ellipse([left, top, left + face_w, top + face_h], fill=skin)
+
+    eye_y = top + face_h * 0.4
+    for eye_x in (left + face_w * 0.3, left + face_w * 0.7):
+        r = face_w * 0.07
+        draw.line([eye_x - 2 * r, eye_y - 2.2 * r, eye_x + 2 * r, eye_y - 2.2 * r], fill=(40, 30, 20), width=max(2, face_w // 40))
+        draw.ellipse([eye_x - 1.5 * r, eye_y - r, eye_x + 1.5 * r, eye_y + r], fill=(250, 250, 250))
+        draw.ellipse([eye_x - 0.7 * r, eye_y - 0.7 * r, eye_x + 0.7 * r, eye_y + 0.7 * r], fill=(30, 20, 10))
+
+    nose_x = left + face_w * 0.5
+    draw.line([nose_x, eye_y + face_h * 0.05, nose_x - face_w * 0.05, top + face_h * 0.65, nose_x + face_w * 0.05, top + face_h * 0.65],
+              fill=tuple(max(0, c - 60) for c in skin), width=max(2, face_w // 50))
+    draw.arc([left + face_w * 0.3, top + face_h * 0.65, left + face_w * 0.7, top + face_h * 0.82], 20, 160,
+             fill=(150, 40, 40), width=max(2, face_w // 35))
+
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    if len(values) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def throughput(count: int, elapsed_s: float) -> float:
+    """Operaciones por segundo (tiempo de reloj total, incluye el overhead del ciclo)."""
+    return float(count / elapsed_s) if elapsed_s > 0 else 0.0
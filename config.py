@@ -0,0 +1,156 @@
+import os
+
+# Configuración del backend. Todos los valores se pueden sobreescribir con
+# variables de entorno (útil para el ejecutable de PyInstaller).
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# --- Procesos del servidor web ---
+# Workers de uvicorn al ejecutar `python main.py` (1 = un solo proceso)
+WEB_WORKERS = max(1, _env_int("CHECADOR_WEB_WORKERS", 1))
+# Varios procesos atienden requests sobre la misma BD: la galería se comparte por
+# archivos mapeados (services/shared_gallery.py) y el estado de asistencia se
+# relee de la BD en cada checada. Se activa solo con WEB_WORKERS > 1; forzarlo
+# con CHECADOR_MULTI_WORKER=1 al usar `uvicorn --workers` directamente.
+MULTI_WORKER = WEB_WORKERS > 1 or os.getenv("CHECADOR_MULTI_WORKER", "0") == "1"
+# Carpeta con la galería compartida
+SHARED_GALLERY_DIR = os.getenv("CHECADOR_SHARED_GALLERY_DIR", "gallery_shared")
+
+# --- Pool de procesos para encoding facial ---
+# Número de procesos POR WORKER web; 0 = usar hilos dentro del mismo proceso (depuración)
+ENCODER_WORKERS = _env_int("CHECADOR_ENCODER_WORKERS", max(1, ((os.cpu_count() or 2) - 1) // WEB_WORKERS))
+# Máximo de trabajos en espera + en ejecución antes de rechazar con 503
+ENCODER_MAX_PENDING = _env_int("CHECADOR_ENCODER_MAX_PENDING", ENCODER_WORKERS * 4)
+# Tiempo máximo por trabajo (segundos)
+ENCODER_TIMEOUT_SECONDS = _env_float("CHECADOR_ENCODER_TIMEOUT", 10.0)
+
+# --- Detección y encoding facial ---
+# Lado mayor al decodificar la imagen subida (JPEG usa decodificación reducida)
+ENCODER_MAX_IMAGE_SIDE = _env_int("CHECADOR_MAX_IMAGE_SIDE", 1024)
+# Lado mayor de la copia sobre la que se corre el detector (0 = sin reducir)
+ENCODER_DETECTION_SIDE = _env_int("CHECADOR_DETECTION_SIDE", 480)
+# "hog" (CPU, rápido) o "cnn" (más preciso, requiere GPU para ser práctico)
+ENCODER_DETECTION_MODEL = os.getenv("CHECADOR_DETECTION_MODEL", "hog")
+# Veces que se amplía la imagen para encontrar caras pequeñas
+ENCODER_UPSAMPLE = _env_int("CHECADOR_DETECTION_UPSAMPLE", 1)
+# Re-muestreos al calcular el encoding (1 = rápido; más = más preciso y más lento)
+ENCODER_NUM_JITTERS = _env_int("CHECADOR_NUM_JITTERS", 1)
+# Etiqueta de los parámetros de encoding, guardada con cada plantilla. Cambia
+# sola al cambiar los de arriba; las plantillas con otra etiqueta se regeneran
+# con services/reencode.py
+ENCODER_MODEL_VERSION = os.getenv(
+    "CHECADOR_MODEL_VERSION",
+    f"dlib-{ENCODER_DETECTION_MODEL}-j{ENCODER_NUM_JITTERS}-u{ENCODER_UPSAMPLE}"
+    f"-d{ENCODER_DETECTION_SIDE}-m{ENCODER_MAX_IMAGE_SIDE}"
+)
+
+# --- Control de admisión (endpoints de checada con foto) ---
+# Requests que codifican a la vez; los demás esperan en la cola
+ADMISSION_MAX_CONCURRENT = _env_int("CHECADOR_ADMISSION_MAX_CONCURRENT", max(1, ENCODER_WORKERS) * 2)
+# Requests en espera antes de rechazar con 503 + Retry-After (0 = sin cola)
+ADMISSION_MAX_QUEUE = _env_int("CHECADOR_ADMISSION_MAX_QUEUE", max(1, ENCODER_WORKERS) * 8)
+# Espera máxima en la cola (segundos)
+ADMISSION_QUEUE_TIMEOUT_SECONDS = _env_float("CHECADOR_ADMISSION_QUEUE_TIMEOUT", 5.0)
+# Calidad adaptativa: con la cola ocupada se detecta sin ampliar y sobre una copia más pequeña
+ADAPTIVE_QUALITY = os.getenv("CHECADOR_ADAPTIVE_QUALITY", "1") == "1"
+# Fracción de la cola ocupada a partir de la cual se baja a "reduced" y a "minimal"
+ADAPTIVE_REDUCED_AT = _env_float("CHECADOR_ADAPTIVE_REDUCED_AT", 0.25)
+ADAPTIVE_MINIMAL_AT = _env_float("CHECADOR_ADAPTIVE_MINIMAL_AT", 0.6)
+# Lado mayor de la copia para detectar en el nivel "minimal"
+ADAPTIVE_MIN_DETECTION_SIDE = _env_int("CHECADOR_ADAPTIVE_MIN_DETECTION_SIDE", 320)
+
+# --- Plantillas biométricas por empleado ---
+# Cómo se reduce la distancia de varias plantillas a una por empleado: "min" o "centroid"
+TEMPLATE_REDUCE = os.getenv("CHECADOR_TEMPLATE_REDUCE", "min")
+# Máximo de plantillas por empleado (se desalojan primero las aprendidas más antiguas)
+MAX_TEMPLATES_PER_EMPLOYEE = _env_int("CHECADOR_MAX_TEMPLATES", 5)
+# Aprender plantillas nuevas a partir de checadas con coincidencia muy alta
+AUTO_TEMPLATES = os.getenv("CHECADOR_AUTO_TEMPLATES", "1") == "1"
+# Distancia máxima de la checada para considerarla confiable
+AUTO_TEMPLATE_MAX_DISTANCE = _env_float("CHECADOR_AUTO_TEMPLATE_MAX_DISTANCE", 0.4)
+# Distancia mínima a las plantillas existentes para que aporte variación
+AUTO_TEMPLATE_MIN_NOVELTY = _env_float("CHECADOR_AUTO_TEMPLATE_MIN_NOVELTY", 0.2)
+
+# --- Índice de búsqueda de la galería ---
+# "exact" (fuerza bruta vectorizada) o "ivf" (aproximado por particiones k-means)
+INDEX_TYPE = os.getenv("CHECADOR_INDEX", "exact")
+# Particiones del IVF (0 = raíz cuadrada del número de plantillas)
+IVF_NLIST = _env_int("CHECADOR_IVF_NLIST", 0)
+# Particiones revisadas por búsqueda (más = mejor recall, más lento)
+IVF_NPROBE = _env_int("CHECADOR_IVF_NPROBE", 8)
+# Por debajo de este número de plantillas el IVF hace búsqueda exacta
+IVF_MIN_ROWS = _env_int("CHECADOR_IVF_MIN_ROWS", 2000)
+
+# --- SQLite ---
+# NORMAL es seguro con WAL (solo se puede perder el último commit ante un corte de luz)
+SQLITE_SYNCHRONOUS = os.getenv("CHECADOR_SQLITE_SYNCHRONOUS", "NORMAL")
+# Bytes de la BD mapeados en memoria
+SQLITE_MMAP_SIZE = _env_int("CHECADOR_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+# Caché de páginas por conexión, en KiB
+SQLITE_CACHE_SIZE_KB = _env_int("CHECADOR_SQLITE_CACHE_KB", 64 * 1024)
+# Espera máxima por el lock de escritura
+SQLITE_BUSY_TIMEOUT_MS = _env_int("CHECADOR_SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+# --- Escritura agrupada de checadas (group commit) ---
+# Máximo de checadas por transacción
+GROUP_COMMIT_MAX_BATCH = _env_int("CHECADOR_GROUP_COMMIT_MAX_BATCH", 64)
+# Milisegundos que se espera a otras checadas después de la primera del lote (0 = solo las ya encoladas)
+GROUP_COMMIT_WAIT_MS = _env_float("CHECADOR_GROUP_COMMIT_WAIT_MS", 5.0)
+
+# --- Regeneración de encodings (services/reencode.py) ---
+# Empleados por transacción y archivo con el avance para reanudar
+REENCODE_BATCH_SIZE = _env_int("CHECADOR_REENCODE_BATCH_SIZE", 100)
+REENCODE_CHECKPOINT_PATH = os.getenv("CHECADOR_REENCODE_CHECKPOINT", "reencode_checkpoint.json")
+
+# --- Fotos (checadas y perfiles) ---
+UPLOADS_DIR = os.getenv("CHECADOR_UPLOADS_DIR", "uploads")
+# Hilos que escriben fotos en segundo plano y tamaño máximo de su cola
+PHOTO_WORKERS = _env_int("CHECADOR_PHOTO_WORKERS", 2)
+PHOTO_MAX_QUEUE = _env_int("CHECADOR_PHOTO_MAX_QUEUE", 256)
+# Recompresión JPEG al guardar (0 en PHOTO_MAX_SIDE = conservar la resolución)
+PHOTO_JPEG_QUALITY = _env_int("CHECADOR_PHOTO_QUALITY", 80)
+PHOTO_MAX_SIDE = _env_int("CHECADOR_PHOTO_MAX_SIDE", 800)
+
+# --- Caché de ráfagas de los checadores (0 en el TTL = desactivado) ---
+# Segundos que se reutiliza el encoding del mismo rostro en el mismo dispositivo (X-Device-Id)
+BURST_FRAME_TTL_SECONDS = _env_float("CHECADOR_BURST_FRAME_TTL", 10.0)
+# Dispositivos recordados y cuadros por dispositivo
+BURST_FRAME_MAX_DEVICES = _env_int("CHECADOR_BURST_FRAME_MAX_DEVICES", 256)
+BURST_FRAME_PER_DEVICE = _env_int("CHECADOR_BURST_FRAME_PER_DEVICE", 8)
+# Bits distintos (de 64) del hash perceptual del recorte de la cara para considerarla la misma.
+# Más de 0 aumenta el riesgo de reutilizar el encoding de la persona anterior en la fila
+BURST_FRAME_MAX_BITS = _env_int("CHECADOR_BURST_FRAME_MAX_BITS", 0)
+# Diferencia media (0-255) entre las miniaturas de 16x16 del rostro que confirma el acierto
+BURST_FRAME_MAX_PIXEL_DIFF = _env_float("CHECADOR_BURST_FRAME_MAX_PIXEL_DIFF", 4.0)
+# Encodings recientes que coincidieron con un empleado: cuántos, por cuánto tiempo
+RECENT_MATCH_SIZE = _env_int("CHECADOR_RECENT_MATCH_SIZE", 256)
+RECENT_MATCH_TTL_SECONDS = _env_float("CHECADOR_RECENT_MATCH_TTL", 30.0)
+# Distancia máxima a un encoding reciente para saltarse la búsqueda en la galería
+RECENT_MATCH_MAX_DISTANCE = _env_float("CHECADOR_RECENT_MATCH_MAX_DISTANCE", 0.15)
+
+# --- Métricas ---
+# Requests más lentos que esto (ms) se imprimen con el desglose por etapa (0 = desactivado)
+SLOW_REQUEST_MS = _env_int("CHECADOR_SLOW_REQUEST_MS", 0)
+
+# --- Checada por streaming (WebSocket /api/attendance/stream) ---
+# Cuadros con el rostro seguido antes de elegir el más nítido y codificarlo
+STREAM_COLLECT_FRAMES = _env_int("CHECADOR_STREAM_COLLECT_FRAMES", 3)
+# Cuadros seguidos sin ver un rostro antes de darlo por perdido
+STREAM_MAX_MISSED_FRAMES = _env_int("CHECADOR_STREAM_MAX_MISSED_FRAMES", 5)
+# Traslape (IoU) mínimo entre cajas de cuadros consecutivos para considerarlas el mismo rostro
+STREAM_IOU_THRESHOLD = _env_float("CHECADOR_STREAM_IOU", 0.3)
+# Rostros seguidos a la vez por checador (los más grandes)
+STREAM_MAX_FACES = _env_int("CHECADOR_STREAM_MAX_FACES", 3)
+# Tamaño máximo de un cuadro
+STREAM_MAX_FRAME_BYTES = _env_int("CHECADOR_STREAM_MAX_FRAME_BYTES", 512 * 1024)
@@ -1,5 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+import config
 
 # Nombre de la base de datos (igual que en tu appsettings.json original pero con extensión .db)
 SQLALCHEMY_DATABASE_URL = "sqlite:///./checador_python.db"
@@ -9,6 +10,22 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 
+# Ajustes de SQLite por conexión:
+# - WAL: los lectores no se bloquean mientras se escribe un registro
+# - synchronous=NORMAL: seguro con WAL y evita un fsync por commit
+# - mmap/cache: las lecturas de la galería y reportes se sirven desde memoria
+# - busy_timeout: esperar al otro escritor en vez de fallar con "database is locked"
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -18,19 +18,52 @@ if sys.stderr is None:
     sys.stderr = NullWriter()
 # ------------------------------------------------
 
+import asyncio
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
-from routers import employees, attendance
+from migrations import run_migrations
+from routers import employees, attendance, reports
+from services.encoder_pool import encoder_pool
+from services.warmup import warmup
+from services.photo_store import photo_store
+from services.gallery import gallery
+from services import metrics
+from services.burst_cache import frame_cache, recent_matches
+from services.admission import admission
+from services.attendance_writer import attendance_writer
+import config
 
 # Crear carpeta uploads si no existe
-os.makedirs("uploads", exist_ok=True)
+os.makedirs(config.UPLOADS_DIR, exist_ok=True)
 
-Base.metadata.create_all(bind=engine)
+# Con varios workers uvicorn vuelve a importar este módulo en cada uno; el
+# proceso padre (python main.py) ya preparó el esquema y lo avisa por el
+# entorno para que los workers no repitan las migraciones al mismo tiempo.
+if os.getenv("CHECADOR_SCHEMA_READY") != "1":
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
-app = FastAPI(title="Checador API AI")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Arrancar el pool de encoding; los procesos, los modelos de dlib, la galería
+    # y el estado de asistencia se cargan en segundo plano (ver services/warmup.py)
+    # para que el servidor empiece a escuchar de inmediato
+    encoder_pool.start()
+    warmup_task = asyncio.create_task(warmup.run())
+    yield
+    warmup_task.cancel()
+    encoder_pool.shutdown()
+    # Guardar las checadas que estén en el commit agrupado
+    attendance_writer.shutdown()
+    # Terminar de escribir las fotos pendientes antes de salir
+    photo_store.shutdown(wait=True)
+
+app = FastAPI(title="Checador API AI", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -39,15 +72,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de la siguiente página en /api/attendance/today y /history
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Tiempos por request y por etapa (ver services/metrics.py)
+app.add_middleware(metrics.MetricsMiddleware, slow_request_ms=config.SLOW_REQUEST_MS)
+
+metrics.registry.gauge("checador_encoder_pending", "Trabajos de encoding en cola o en ejecución", lambda: encoder_pool.pending)
+metrics.registry.gauge("checador_admission_in_flight", "Requests de checada admitidos en proceso", lambda: admission.in_flight)
+metrics.registry.gauge("checador_admission_queue_depth", "Requests de checada esperando turno", lambda: admission.queue_depth)
+metrics.registry.gauge("checador_attendance_write_queue", "Checadas esperando el commit agrupado", lambda: attendance_writer.pending)
+metrics.registry.gauge("checador_gallery_rows", "Filas en el índice de la galería", lambda: len(gallery))
+metrics.registry.gauge("checador_gallery_employees", "Empleados en la galería", lambda: gallery.employee_count)
+metrics.registry.gauge("checador_gallery_generation", "Generación de la galería compartida que usa este worker", lambda: gallery.generation)
+
+metrics.registry.gauge("checador_burst_frame_cache_entries", "Cuadros en el caché de ráfagas", lambda: len(frame_cache))
+metrics.registry.gauge("checador_recent_matches_entries", "Encodings vigentes en el caché de coincidencias", lambda: len(recent_matches))
+metrics.registry.gauge("checador_ready", "1 cuando los modelos, la galería y el estado están cargados", lambda: warmup.ready)
+
+@app.get("/health/ready", tags=["Health"])
+def get_readiness():
+    """
+    Listo para checar con latencia normal: modelos cargados en los procesos
+    de encoding, galería y estado de asistencia en memoria. 503 mientras no.
+    """
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # Servir carpeta uploads
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", StaticFiles(directory=config.UPLOADS_DIR), name="uploads")
 
 app.include_router(employees.router)
 app.include_router(attendance.router)
+app.include_router(reports.router)
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
     # Ejecutamos con log_config=None y access_log=False para máximo silencio
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None, access_log=False)
\ No newline at end of file
+    if config.WEB_WORKERS > 1:
+        # Varios procesos: uvicorn necesita la app como "modulo:variable" para importarla en cada uno.
+        # Las migraciones ya corrieron arriba, en este proceso; los workers heredan
+        # CHECADOR_SCHEMA_READY y no las repiten al importar el módulo.
+        os.environ["CHECADOR_SCHEMA_READY"] = "1"
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=config.WEB_WORKERS,
+                    log_config=None, access_log=False)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None, access_log=False)
\ No newline at end of file
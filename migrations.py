@@ -0,0 +1,162 @@
+"""
+Migraciones ligeras del esquema de SQLite.
+
+Base.metadata.create_all() crea las tablas nuevas, pero no modifica tablas
+existentes (columnas o índices agregados después). Cada migración de la lista
+MIGRATIONS se aplica una sola vez, en orden; la versión aplicada se guarda en
+PRAGMA user_version del propio archivo .db. Las migraciones son además
+idempotentes, así que también son seguras sobre una base recién creada.
+"""
+import json
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from models import encode_face_vector, generate_uuid
+from datetime import datetime
+
+
+def migrate_face_vectors(engine: Engine) -> int:
+    """
+    Migración única: convierte los vectores guardados como texto JSON
+    (face_vector_json) al formato binario (face_vector_blob).
+
+    Es idempotente: solo toca filas que todavía no tienen blob, así que puede
+    ejecutarse en cada arranque. Retorna el número de filas convertidas.
+    """
+    columns = {col["name"] for col in inspect(engine).get_columns("employees")}
+
+    with engine.begin() as conn:
+        if "face_vector_blob" not in columns:
+            conn.execute(text("ALTER TABLE employees ADD COLUMN face_vector_blob BLOB"))
+
+        if "face_vector_json" not in columns:
+            return 0
+
+        rows = conn.execute(text(
+            "SELECT id, face_vector_json FROM employees "
+            "WHERE face_vector_blob IS NULL AND face_vector_json IS NOT NULL"
+        )).fetchall()
+
+        converted = 0
+        for employee_id, vector_json in rows:
+            try:
+                values = json.loads(vector_json) if vector_json else []
+            except ValueError:
+                values = []
+
+            blob = encode_face_vector(values) if values else None
+            # Se libera el texto JSON para recuperar espacio
+            conn.execute(
+                text("UPDATE employees SET face_vector_blob = :blob, face_vector_json = NULL WHERE id = :id"),
+                {"blob": blob, "id": employee_id}
+            )
+            if blob:
+                converted += 1
+
+    return converted
+
+
+def seed_face_templates(engine: Engine) -> int:
+    """
+    Crea la plantilla de registro ('enroll') de cada empleado que todavía no
+    tiene plantillas, a partir de su face_vector_blob. Idempotente.
+    """
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT e.id, e.face_vector_blob, e.created_at_utc FROM employees e "
+            "WHERE e.face_vector_blob IS NOT NULL "
+            "AND NOT EXISTS (SELECT 1 FROM face_templates t WHERE t.employee_id = e.id)"
+        )).fetchall()
+
+        for employee_id, blob, created_at in rows:
+            conn.execute(
+                text(
+                    "INSERT INTO face_templates (id, employee_id, vector_blob, source, created_at_utc) "
+                    "VALUES (:id, :employee_id, :blob, 'enroll', :created_at)"
+                ),
+                {"id": generate_uuid(), "employee_id": employee_id, "blob": blob,
+                 "created_at": created_at or datetime.utcnow()}
+            )
+
+    return len(rows)
+
+
+def create_attendance_indexes(engine: Engine) -> None:
+    """Índices para la checada (último registro por empleado) y los rangos por fecha."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_attendance_employee_ts "
+            "ON attendance_records (employee_id, timestamp_utc)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_attendance_local_time "
+            "ON attendance_records (local_time)"
+        ))
+        # Estadísticas para que el planificador elija los índices nuevos
+        conn.execute(text("ANALYZE attendance_records"))
+
+
+def backfill_daily_summaries(engine: Engine) -> int:
+    """Calcula los resúmenes diarios (daily_summaries) del historial existente."""
+    from sqlalchemy.orm import Session
+    from services.reports import backfill
+    with Session(bind=engine) as db:
+        return backfill(db)
+
+
+def add_employee_revision(engine: Engine) -> None:
+    """Columna employees.revision (versión de la tabla para ETag y sincronización)."""
+    columns = {col["name"] for col in inspect(engine).get_columns("employees")}
+    with engine.begin() as conn:
+        if "revision" not in columns:
+            conn.execute(text("ALTER TABLE employees ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+        # Las filas existentes toman números distintos en orden de alta
+        conn.execute(text("UPDATE employees SET revision = rowid WHERE revision = 0"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_employees_revision ON employees (revision)"))
+
+
+def add_template_model_version(engine: Engine) -> None:
+    """Columna face_templates.model_version (parámetros con los que se calculó cada plantilla)."""
+    columns = {col["name"] for col in inspect(engine).get_columns("face_templates")}
+    if "model_version" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE face_templates ADD COLUMN model_version VARCHAR"))
+
+
+# (versión, migración) en orden. Agregar al final; nunca renumerar.
+MIGRATIONS = [
+    (1, migrate_face_vectors),
+    (2, seed_face_templates),
+    (3, create_attendance_indexes),
+    (4, backfill_daily_summaries),
+    (5, add_employee_revision),
+    (6, add_template_model_version),
+]
+
+
+def get_schema_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("PRAGMA user_version")).scalar() or 0
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Aplica las migraciones pendientes y retorna las versiones aplicadas."""
+    current = get_schema_version(engine)
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        migration(engine)
+        with engine.begin() as conn:
+            conn.execute(text(f"PRAGMA user_version = {int(version)}"))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    # Uso: python migrations.py  (migra checador_python.db en el directorio actual)
+    from database import engine
+    from database import Base
+    import models  # noqa: F401  (registra las tablas)
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
+    print(f"Migraciones aplicadas: {applied or 'ninguna'} (versión actual: {get_schema_version(engine)})")
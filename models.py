@@ -1,7 +1,9 @@
 import uuid
 import json
-from sqlalchemy import Column, String, Boolean, DateTime, Float, ForeignKey, Integer
-from sqlalchemy.orm import relationship
+import struct
+import numpy as np
+from sqlalchemy import Column, String, Boolean, Date, DateTime, Float, ForeignKey, Integer, LargeBinary, Index, event, func, select
+from sqlalchemy.orm import relationship, deferred, object_session
 from datetime import datetime
 from database import Base
 
@@ -9,6 +11,32 @@ from database import Base
 def generate_uuid():
     return str(uuid.uuid4())
 
+# --- Formato binario de los vectores faciales ---
+# Cabecera de 8 bytes: magic "FV", versión, tamaño del float (4 u 8) y dimensión,
+# seguida de los valores crudos en little-endian.
+FACE_VECTOR_MAGIC = b"FV"
+FACE_VECTOR_VERSION = 1
+_FACE_VECTOR_HEADER = struct.Struct("<2sBBI")
+_FACE_VECTOR_DTYPES = {4: np.dtype("<f4"), 8: np.dtype("<f8")}
+
+def encode_face_vector(vector, dtype="<f4") -> bytes:
+    """Serializa un vector (lista o ndarray) al formato binario con cabecera."""
+    arr = np.asarray(vector, dtype=dtype).reshape(-1)
+    header = _FACE_VECTOR_HEADER.pack(FACE_VECTOR_MAGIC, FACE_VECTOR_VERSION, arr.itemsize, arr.shape[0])
+    return header + arr.tobytes()
+
+def decode_face_vector(blob) -> np.ndarray:
+    """
+    Convierte el blob binario a un ndarray sin copiar (np.frombuffer).
+    El arreglo resultante es de solo lectura.
+    """
+    if not blob:
+        return np.empty(0, dtype=np.float32)
+    magic, version, itemsize, dim = _FACE_VECTOR_HEADER.unpack_from(blob)
+    if magic != FACE_VECTOR_MAGIC or version != FACE_VECTOR_VERSION or itemsize not in _FACE_VECTOR_DTYPES:
+        raise ValueError("Formato de vector facial no reconocido")
+    return np.frombuffer(blob, dtype=_FACE_VECTOR_DTYPES[itemsize], count=dim, offset=_FACE_VECTOR_HEADER.size)
+
 class Employee(Base):
     __tablename__ = "employees"
 
@@ -16,27 +44,82 @@ class Employee(Base):
     code = Column(String, unique=True, index=True, nullable=False)
     full_name = Column(String, nullable=False)
     
-    # En base de datos se guarda como texto plano: "[0.12, -0.5, ...]"
-    face_vector_json = Column(String, default="[]")
+    # Vector facial en binario (ver encode_face_vector): 8 bytes de cabecera + 128 float32
+    face_vector_blob = Column(LargeBinary, nullable=True)
+    # Legado: texto JSON "[0.12, -0.5, ...]". Solo se lee para filas aún no migradas
+    # (ver migrations.py); los registros nuevos ya no lo llenan.
+    face_vector_json = deferred(Column(String, nullable=True))
     photo_path = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     deleted_at = Column(DateTime, nullable=True)  # Fecha de desactivación para auditoría
     created_at_utc = Column(DateTime, default=datetime.utcnow)
+    # Versión de la fila: toma el siguiente número de la tabla en cada alta o
+    # cambio (ver next_revision). max(revision) cambia con cualquier escritura
+    revision = Column(Integer, nullable=False, default=0, index=True)
 
     # Relación con registros de asistencia
     attendance_records = relationship("AttendanceRecord", back_populates="employee")
+    # Plantillas biométricas (varios encodings por empleado, ver FaceTemplate)
+    face_templates = relationship("FaceTemplate", back_populates="employee", cascade="all, delete-orphan")
 
-    # Propiedad mágica para usar 'face_vector' como lista en Python
-    # automáticamente convierte a/desde JSON al leer/escribir
+    # Propiedad para usar 'face_vector' como ndarray en Python
+    # automáticamente convierte a/desde el formato binario al leer/escribir
     @property
-    def face_vector(self):
-        if not self.face_vector_json:
-            return []
-        return json.loads(self.face_vector_json)
+    def face_vector(self) -> np.ndarray:
+        if self.face_vector_blob:
+            return decode_face_vector(self.face_vector_blob)
+        if self.face_vector_json:
+            return np.asarray(json.loads(self.face_vector_json), dtype=np.float32)
+        return np.empty(0, dtype=np.float32)
 
     @face_vector.setter
     def face_vector(self, value):
-        self.face_vector_json = json.dumps(value)
+        self.face_vector_blob = encode_face_vector(value) if value is not None and len(value) > 0 else None
+        self.face_vector_json = None
+
+
+def next_revision():
+    """Expresión SQL con la siguiente revisión de la tabla de empleados."""
+    # Se calcula dentro del mismo INSERT/UPDATE: con el lock de escritura de
+    # SQLite dos procesos nunca obtienen el mismo número
+    latest = Employee.__table__.alias("latest")
+    return select(func.coalesce(func.max(latest.c.revision), 0) + 1).scalar_subquery()
+
+
+@event.listens_for(Employee, "before_insert")
+def _revision_on_insert(mapper, connection, target):
+    target.revision = next_revision()
+
+
+@event.listens_for(Employee, "before_update")
+def _revision_on_update(mapper, connection, target):
+    # before_update también llega por cambios solo en relaciones (plantillas)
+    if object_session(target).is_modified(target, include_collections=False):
+        target.revision = next_revision()
+
+
+class FaceTemplate(Base):
+    """
+    Encoding facial adicional de un empleado. La foto de registro genera una
+    plantilla 'enroll'; las checadas con coincidencia muy alta pueden agregar
+    plantillas 'checkin' (cambios de luz, lentes, etc.).
+    """
+    __tablename__ = "face_templates"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    employee_id = Column(String, ForeignKey("employees.id"), index=True, nullable=False)
+    vector_blob = Column(LargeBinary, nullable=False)
+    source = Column(String, nullable=False, default="enroll")  # "enroll" | "checkin"
+    match_score = Column(Float, nullable=True)  # Distancia con la que se aprendió (solo 'checkin')
+    # config.ENCODER_MODEL_VERSION con el que se calculó (None = anterior a las etiquetas)
+    model_version = Column(String, nullable=True)
+    created_at_utc = Column(DateTime, default=datetime.utcnow)
+
+    employee = relationship("Employee", back_populates="face_templates")
+
+    @property
+    def vector(self) -> np.ndarray:
+        return decode_face_vector(self.vector_blob)
 
 
 class AttendanceRecord(Base):
@@ -56,4 +139,40 @@ class AttendanceRecord(Base):
     photo_path = Column(String, nullable=True) # Ej: "uploads/abc-123.jpg"
 
     employee = relationship("Employee", back_populates="attendance_records")
-    
\ No newline at end of file
+
+    __table_args__ = (
+        # Último registro por empleado y su historial (ORDER BY timestamp_utc DESC)
+        Index("ix_attendance_employee_ts", "employee_id", "timestamp_utc"),
+        # Rangos por fecha de /today y reportes
+        Index("ix_attendance_local_time", "local_time"),
+    )
+    
+
+
+class DailySummary(Base):
+    """
+    Resumen precalculado de un empleado en un día (hora local): turnos
+    formados por pares entrada/salida y minutos trabajados. Lo mantiene
+    services/reports.py en cada checada; los reportes leen de aquí en lugar
+    de recorrer attendance_records.
+
+    Un turno cuenta para el día de su ENTRADA, aunque la salida sea al día
+    siguiente (turnos nocturnos).
+    """
+    __tablename__ = "daily_summaries"
+
+    employee_id = Column(String, ForeignKey("employees.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    first_check_in = Column(DateTime, nullable=True)
+    last_check_out = Column(DateTime, nullable=True)
+    shifts = Column(Integer, nullable=False, default=0)         # Turnos completos (entrada + salida)
+    open_shifts = Column(Integer, nullable=False, default=0)    # Entradas sin salida
+    orphan_check_outs = Column(Integer, nullable=False, default=0)  # Salidas sin entrada
+    worked_minutes = Column(Float, nullable=False, default=0.0)
+    updated_at_utc = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Reportes por rango de fechas de todos los empleados
+        Index("ix_daily_summaries_day", "day"),
+    )
@@ -1,15 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response, Query, Header, WebSocket
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import desc, or_, and_
+from pydantic import ValidationError
+from typing import List, Optional
 from datetime import datetime, timedelta
-import uuid
-import os
-from io import BytesIO
+import numpy as np
+import struct
+import base64
+import binascii
+import csv
+import io
+import json
 import database
 import models
 import schemas
 from services.biometric import BiometricService
+from services.encoder_pool import encode_image_or_raise, encode_batch_or_raise, detect_face_or_raise, encode_box_or_raise
+from services.gallery import VECTOR_DIM
+from services.templates import learn_from_check_in, sync_gallery
+from services.attendance_state import attendance_state
+from services.photo_store import photo_store
+from services.reports import refresh_daily_summary
+from services import metrics
+from services.burst_cache import frame_cache, MISS
+from services.checkin_stream import CheckInStream
+from services.admission import admission
+from services.attendance_writer import attendance_writer
+from services.attendance_rules import evaluate_check_in, success_response, display_time
 
 router = APIRouter(
     prefix="/api/attendance",
@@ -18,175 +37,459 @@ router = APIRouter(
 
 get_db = database.get_db
 
+async def _register_check_in(db: Session, incoming_vector, file_bytes: Optional[bytes] = None) -> schemas.CheckInResponse:
+    """
+    Lógica común de los endpoints de checada: busca al empleado, aplica las
+    reglas de tiempos y guarda el registro. La foto es opcional (el endpoint
+    de vectores puede subirla después). El registro se guarda con el commit
+    agrupado (services/attendance_writer.py) junto con los de otros requests.
+    """
+    # 3. Buscar coincidencia en BD
+    biometric_service = BiometricService(db)
+    match = biometric_service.find_best_match_with_distance(incoming_vector)
+
+    if not match:
+        metrics.check_ins.inc(result="unknown")
+        return schemas.CheckInResponse(
+            success=False,
+            message="Empleado no reconocido",
+            time=display_time()
+        )
+
+    employee, match_score = match
+
+    with metrics.stage("rules"):
+        # 4. Datos para las reglas: último registro y entradas de hoy
+        # (tabla en memoria write-through, sin consultas en la ruta crítica)
+        attendance_state.ensure_warm(db)
+        attendance_state.refresh(db, [employee.id])  # Solo con varios workers
+        last_record, entries_today = attendance_state.get(employee.id)
+
+        # 5. Lógica de Negocio con validación de cooldown (ver services/attendance_rules.py)
+        new_type, rejection = evaluate_check_in(employee, last_record, entries_today)
+        if rejection:
+            metrics.check_ins.inc(result="rejected")
+            return rejection
+
+        # El estado en memoria se actualiza en cuanto las reglas deciden, sin
+        # ningún await de por medio: otra checada del mismo empleado que llegue
+        # mientras se guardan la foto y el registro ya ve este registro
+        # (ID y horas se generan aquí para no recargar el registro después del commit)
+        record_id = models.generate_uuid()
+        timestamp_utc = datetime.utcnow()
+        local_time = datetime.now()
+        employee_id = employee.id
+        attendance_state.record(employee_id, new_type, timestamp_utc, local_time)
+
+    # 6. Registro en BD (photo_url se asigna antes de que corra el commit)
+    def write(session: Session) -> bool:
+        session.add(models.AttendanceRecord(
+            id=record_id,
+            employee_id=employee_id,
+            timestamp_utc=timestamp_utc,
+            local_time=local_time,
+            type=new_type,
+            match_score=match_score,
+            photo_path=photo_url # <--- Campo nuevo para el Admin
+        ))
+        # Resumen diario para reportes, en la misma transacción
+        refresh_daily_summary(session, employee_id, local_time)
+        # Coincidencia muy alta: aprender el vector como plantilla adicional
+        return learn_from_check_in(session, employee_id, incoming_vector, match_score)
+
+    try:
+        # 7. Guardar la FOTO (en segundo plano; la ruta por hash se conoce desde ya) y el registro
+        with metrics.stage("photo"):
+            photo_url = await photo_store.submit_async(file_bytes, "checkins") if file_bytes else None
+        with metrics.stage("commit"):
+            learned = await attendance_writer.run(write)
+    except Exception:
+        attendance_state.invalidate()  # El registro no se guardó: recargar el estado de la BD
+        raise
+
+    if learned:
+        with metrics.stage("gallery_sync"):
+            sync_gallery(db, employee.id)
+
+    # 8. Respuesta
+    metrics.check_ins.inc(result="recorded")
+    return success_response(employee, new_type, local_time, record_id=record_id)
+
+
 @router.post("/check-in", response_model=schemas.CheckInResponse)
-async def check_in(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def check_in(
+    file: UploadFile = File(...),
+    device_id: Optional[str] = Header(None, alias="X-Device-Id"),  # Identificador del checador (activa el caché de ráfagas)
+    db: Session = Depends(get_db)
+):
     
     # 1. Leer los bytes de la imagen (para usarla en IA y luego guardarla)
-    file_bytes = await file.read()
+    with metrics.stage("read_upload"):
+        file_bytes = await file.read()
 
     # 2. IA: Convertir foto a vector
-    # Usamos BytesIO porque face_recognition espera un objeto tipo archivo
-    incoming_vector = BiometricService.vector_from_image(BytesIO(file_bytes))
+    # Se ejecuta en el pool de procesos para no congelar el event loop; el
+    # turno y la calidad de detección los decide el control de admisión
+    async with admission.slot() as quality:
+        if device_id and frame_cache.enabled:
+            # Ráfagas: el mismo rostro que hace poco en este checador reutiliza
+            # su encoding (ver services/burst_cache.py). Se detecta siempre: la
+            # clave es el recorte de la cara, no el cuadro completo
+            box, face_key = await detect_face_or_raise(file_bytes, quality)
+            incoming_vector = None
+            if box is not None:
+                incoming_vector = frame_cache.get(device_id, face_key, box)
+                if incoming_vector is MISS:
+                    incoming_vector = await encode_box_or_raise(file_bytes, box)
+                    frame_cache.put(device_id, face_key, box, incoming_vector)
+        else:
+            incoming_vector = await encode_image_or_raise(file_bytes, quality)
 
     if not incoming_vector:
+        metrics.check_ins.inc(result="no_face")
         return schemas.CheckInResponse(
             success=False,
             message="No se detectó rostro en la cámara",
-            time=datetime.now().strftime("%I:%M %p")
+            time=display_time()
         )
 
-    # 3. Buscar coincidencia en BD
-    biometric_service = BiometricService(db)
-    employee = biometric_service.find_best_match(incoming_vector)
+    return await _register_check_in(db, incoming_vector, file_bytes)
 
-    if not employee:
-        return schemas.CheckInResponse(
-            success=False,
-            message="Empleado no reconocido",
-            time=datetime.now().strftime("%I:%M %p")
-        )
 
-    # 4. REGLA PREVIA: Máximo 4 entradas por día
-    # Contar cuántas ENTRADAS (type=0) ha hecho hoy este empleado
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    entries_today = db.query(models.AttendanceRecord)\
-        .filter(
-            models.AttendanceRecord.employee_id == employee.id,
-            models.AttendanceRecord.type == 0,
-            models.AttendanceRecord.local_time >= today_start
-        ).count()
-    
-    # Si ya tiene 4 entradas hoy y el próximo registro sería ENTRADA, rechazar
-    # (Primero verificamos si sería entrada checando el último registro)
-    last_record = db.query(models.AttendanceRecord)\
-        .filter(models.AttendanceRecord.employee_id == employee.id)\
-        .order_by(desc(models.AttendanceRecord.timestamp_utc))\
-        .first()
-    
-    # Si no hay registro previo O el último fue SALIDA → próximo sería ENTRADA
-    would_be_entry = (last_record is None) or (last_record.type == 1)
-    
-    if would_be_entry and entries_today >= 4:
-        first_name = employee.full_name.split(" ")[0]
+@router.websocket("/stream")
+async def check_in_stream(websocket: WebSocket):
+    """
+    Checada continua desde un checador: recibe cuadros de baja resolución,
+    sigue cada rostro entre cuadros y solo codifica una vez por persona
+    (el cuadro más nítido). Protocolo en services/checkin_stream.py.
+    """
+    await websocket.accept()
+
+    async def register(incoming_vector: list[float], frame: bytes) -> schemas.CheckInResponse:
+        db = database.SessionLocal()
+        try:
+            return await _register_check_in(db, incoming_vector, frame)
+        finally:
+            db.close()
+
+    def no_face() -> schemas.CheckInResponse:
         return schemas.CheckInResponse(
             success=False,
-            message=f"❌ Máximo de entradas diarias alcanzado (4), {first_name}",
-            employee_name=employee.full_name,
-            employee_code=employee.code,
-            time=datetime.now().strftime("%I:%M %p")
+            message="No se detectó rostro en la cámara",
+            time=display_time()
         )
 
-    # 5. Lógica de Negocio con validación de cooldown
-    new_type = 0 # CheckIn por defecto
-    
-    match_score = BiometricService.calculate_distance(incoming_vector, employee.face_vector)
-
-    if last_record:
-        time_diff = datetime.utcnow() - last_record.timestamp_utc
-        seconds_since = time_diff.total_seconds()
-        minutes_since = seconds_since / 60
-        hours_since = seconds_since / 3600
-        
-        # ⚡ REGLA 1: ANTI-REBOTE (Cooldown Global de 60 segundos)
-        # Si han pasado menos de 60 segundos, NO guardar en BD
-        # Retornar éxito para no confundir al usuario con error rojo
-        if seconds_since < 60:
-            first_name = employee.full_name.split(" ")[0]
-            last_action = "entrada" if last_record.type == 0 else "salida"
-            return schemas.CheckInResponse(
-                success=True,
-                message=f"✓ Ya registraste tu {last_action}, {first_name}",
-                employee_name=employee.full_name,
-                employee_code=employee.code,
-                time=last_record.local_time.strftime("%I:%M %p")
+    await CheckInStream(websocket, register, no_face).run()
+
+
+@router.post("/check-in/batch", response_model=schemas.BatchCheckInResponse)
+async def check_in_batch(
+    files: List[UploadFile] = File(...),
+    multi_face: bool = Form(False),  # True: registrar todas las caras de cada imagen
+    db: Session = Depends(get_db)
+):
+    """
+    Checada por lotes (ráfagas de imágenes en cambio de turno o varias caras
+    en una misma foto). Codifica todo junto, busca todas las coincidencias en
+    una sola operación matricial, evalúa las reglas con el estado en memoria
+    (services/attendance_state.py) y guarda todos los registros en una sola
+    transacción.
+    """
+    with metrics.stage("read_upload"):
+        images = [await file.read() for file in files]
+    async with admission.slot() as quality:
+        vectors_per_image = await encode_batch_or_raise(images, all_faces=multi_face, quality=quality)
+
+    # Aplanar (imagen, cara) → vector
+    items = []
+    for image_index, vectors in enumerate(vectors_per_image):
+        for face_index, vector in enumerate(vectors):
+            items.append((image_index, face_index, vector))
+
+    matches = BiometricService(db).find_best_matches([vector for _, _, vector in items])
+    attendance_state.ensure_warm(db)
+    attendance_state.refresh(db, [match[0].id for match in matches if match])
+
+    results = []
+    # ID del registro -> imagen de la que salió (la foto se guarda después del ciclo)
+    record_images = {}
+    # Estado dentro del lote: employee_id -> (último registro, entradas de hoy)
+    batch_state = {}
+    # (campos del registro, vector, distancia) de cada checada aceptada
+    new_records = []
+    now_utc = datetime.utcnow()
+    local_time = datetime.now()
+
+    for image_index, vectors in enumerate(vectors_per_image):
+        if not vectors:
+            metrics.check_ins.inc(result="no_face")
+            results.append(schemas.BatchCheckInItem(
+                success=False,
+                message="No se detectó rostro en la cámara",
+                time=display_time(),
+                image_index=image_index
+            ))
+
+    for (image_index, face_index, vector), match in zip(items, matches):
+        if not match:
+            metrics.check_ins.inc(result="unknown")
+            response = schemas.CheckInResponse(
+                success=False,
+                message="Empleado no reconocido",
+                time=display_time()
             )
-        
-        # 🔄 REGLA 2: GESTIÓN DE TIEMPOS OPERACIONALES
-        # Configuración de intervalos
-        MINIMUM_SHIFT_MINUTES = 10  # Tiempo mínimo para permitir salida (errores, devoluciones)
-        CYCLE_TIMEOUT_HOURS = 18     # Ventana máxima antes de auto-cerrar ciclo
-        
-        # Si último registro fue ENTRADA (type 0)
-        if last_record.type == 0:
-            # ⏰ VALIDACIÓN 1: Intervalo mínimo de 10 minutos
-            # Permite gestionar: errores de turno, devoluciones por retardo, incidencias
-            if minutes_since < MINIMUM_SHIFT_MINUTES:
-                first_name = employee.full_name.split(" ")[0]
-                minutes_remaining = int(MINIMUM_SHIFT_MINUTES - minutes_since)
-                return schemas.CheckInResponse(
-                    success=False,
-                    message=f"⏱️ Espera {minutes_remaining} min para marcar salida, {first_name}",
-                    employee_name=employee.full_name,
-                    employee_code=employee.code,
-                    time=datetime.now().strftime("%I:%M %p")
+        else:
+            employee, match_score = match
+            last_record, entries_today = batch_state.get(employee.id) or attendance_state.get(employee.id)
+            new_type, response = evaluate_check_in(employee, last_record, entries_today, now_utc)
+            metrics.check_ins.inc(result="rejected" if response is not None else "recorded")
+            if response is None:
+                fields = dict(
+                    id=models.generate_uuid(),
+                    employee_id=employee.id,
+                    timestamp_utc=now_utc,
+                    local_time=local_time,
+                    type=new_type,
+                    match_score=match_score
                 )
-            elif hours_since < CYCLE_TIMEOUT_HOURS:
-                # ✅ Entre 10 min y 18 horas → PERMITIR SALIDA
-                new_type = 1  # Marcar SALIDA
+                new_records.append((fields, vector, match_score))
+                record_images[fields["id"]] = image_index
+                # Sin await dentro del ciclo: el estado en memoria se actualiza
+                # antes de que otra checada pueda leerlo
+                attendance_state.record(employee.id, new_type, now_utc, local_time)
+
+                # El mismo empleado puede repetirse en el lote (ráfaga): las
+                # siguientes apariciones ven este registro como el último
+                batch_state[employee.id] = (models.AttendanceRecord(**fields), entries_today + (1 if new_type == 0 else 0))
+                response = success_response(employee, new_type, local_time, record_id=fields["id"])
+
+        results.append(schemas.BatchCheckInItem(
+            **response.model_dump(),
+            image_index=image_index,
+            face_index=face_index
+        ))
+
+    def write(session: Session) -> set[str]:
+        learned_ids = set()
+        for fields, vector, match_score in new_records:
+            session.add(models.AttendanceRecord(**fields))
+            # Máximo una plantilla aprendida por empleado en cada lote
+            employee_id = fields["employee_id"]
+            if employee_id not in learned_ids and learn_from_check_in(session, employee_id, vector, match_score):
+                learned_ids.add(employee_id)
+        for employee_id in {fields["employee_id"] for fields, _, _ in new_records}:
+            refresh_daily_summary(session, employee_id, local_time)
+        return learned_ids
+
+    learned_ids = set()
+    if new_records:
+        try:
+            # Una foto por imagen aunque tenga varias caras
+            with metrics.stage("photo"):
+                photo_urls = {}
+                for image_index in sorted(set(record_images.values())):
+                    photo_urls[image_index] = await photo_store.submit_async(images[image_index], "checkins")
+            for fields, _, _ in new_records:
+                fields["photo_path"] = photo_urls[record_images[fields["id"]]]
+            # Todo el lote en un solo trabajo del commit agrupado (una transacción)
+            with metrics.stage("commit"):
+                learned_ids = await attendance_writer.run(write)
+        except Exception:
+            attendance_state.invalidate()  # Los registros no se guardaron: recargar el estado de la BD
+            raise
+
+    for employee_id in learned_ids:
+        sync_gallery(db, employee_id)
+
+    results.sort(key=lambda item: (item.image_index, item.face_index))
+    return schemas.BatchCheckInResponse(results=results)
+
+
+def _parse_vector_body(content_type: str, body: bytes) -> schemas.CheckInRequest:
+    """
+    Acepta el vector como JSON (CheckInRequest) o como binario:
+    - application/octet-stream con el formato de models.encode_face_vector (cabecera "FV"), o
+    - application/octet-stream con 128 float32 little-endian crudos (512 bytes).
+    """
+    if content_type.startswith("application/octet-stream"):
+        try:
+            if body[:2] == models.FACE_VECTOR_MAGIC:
+                vector = models.decode_face_vector(body)
+            elif len(body) == VECTOR_DIM * 4:
+                vector = np.frombuffer(body, dtype="<f4")
             else:
-                # 🔄 Más de 18 horas sin cerrar ciclo → Auto-cierre y Nueva ENTRADA
-                new_type = 0
-                
-        # Si último registro fue SALIDA (type 1)
-        elif last_record.type == 1:
-            # Siempre será ENTRADA después de una SALIDA
-            # (El cooldown de 60 segundos ya previene duplicados)
-            new_type = 0
-
-    # 6. Guardar la FOTO en disco (NUEVO)
-    # Generamos un nombre único con UUID para evitar colisiones
-    filename = f"{uuid.uuid4()}.jpg"
-    
-    # Aseguramos que la carpeta uploads exista (por seguridad, aunque main.py ya lo hace)
-    os.makedirs("uploads", exist_ok=True)
-    
-    file_path_disk = os.path.join("uploads", filename)
-    
-    # Escribimos el archivo físico
-    with open(file_path_disk, "wb") as f:
-        f.write(file_bytes)
-    
-    # Ruta relativa para la URL (usamos '/' para que sea compatible con web)
-    photo_url = f"uploads/{filename}"
-
-    # 6. Crear registro en BD
-    new_record = models.AttendanceRecord(
-        employee_id=employee.id,
-        timestamp_utc=datetime.utcnow(),
-        local_time=datetime.now(),
-        type=new_type,
-        match_score=match_score,
-        photo_path=photo_url # <--- Campo nuevo para el Admin
-    )
-    
-    db.add(new_record)
+                raise ValueError("Tamaño de vector inválido")
+        except (ValueError, struct.error):
+            raise HTTPException(status_code=400, detail="Vector binario inválido")
+        return schemas.CheckInRequest(face_vector=vector.tolist())
+
+    try:
+        return schemas.CheckInRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+
+@router.post(
+    "/check-in/vector",
+    response_model=schemas.CheckInResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": schemas.CheckInRequest.model_json_schema()},
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}}
+            }
+        }
+    }
+)
+async def check_in_vector(request: Request, db: Session = Depends(get_db)):
+    """
+    Checada con un encoding ya calculado en el dispositivo (128 dimensiones).
+    Aplica el mismo matching y las mismas reglas que /check-in, sin foto.
+    La foto se puede adjuntar después con POST /api/attendance/{record_id}/photo.
+    """
+    payload = _parse_vector_body(request.headers.get("content-type", ""), await request.body())
+
+    vector = np.asarray(payload.face_vector, dtype=np.float32)
+    if vector.shape[0] != VECTOR_DIM or not np.isfinite(vector).all():
+        raise HTTPException(
+            status_code=400,
+            detail=f"El vector facial debe tener {VECTOR_DIM} valores numéricos"
+        )
+
+    return await _register_check_in(db, vector)
+
+
+@router.post("/{record_id}/photo", status_code=204)
+async def upload_record_photo(record_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Adjunta la foto a un registro creado por /check-in/vector."""
+    record = db.query(models.AttendanceRecord).filter(models.AttendanceRecord.id == record_id).first()
+    if not record:
+        raise HTTPException(status_code=404, detail="Registro no encontrado")
+    if record.photo_path:
+        raise HTTPException(status_code=409, detail="El registro ya tiene foto")
+
+    record.photo_path = await photo_store.submit_async(await file.read(), "checkins")
     db.commit()
+    return None
+
+# --- Consultas de registros: paginación por cursor y exportación ---
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_ROWS = 1000
+EXPORT_FIELDS = [
+    "id", "timestamp_utc", "local_time", "type", "match_score",
+    "employee_id", "employee_name", "employee_code", "photo_path"
+]
+
+
+def _parse_date_range(start_date: Optional[str], end_date: Optional[str]) -> tuple[datetime, datetime]:
+    """Rango [inicio, fin) en hora local; sin fechas es el día de hoy."""
+    # Si no se especifican fechas, usar día de hoy por defecto
+    if not start_date:
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1)
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        # Si no hay end_date, usar el mismo día que start_date
+        if end_date:
+            end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+        else:
+            end = start + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Formato de fecha inválido. Usa YYYY-MM-DD (ej: 2026-01-01)"
+        )
+    return start, end
+
+
+def _records_query(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   employee_id: Optional[str] = None):
+    """
+    Registros con los datos del empleado en una sola consulta de columnas
+    (sin objetos ORM ni joinedload): cada fila ya tiene la forma de la respuesta.
+    """
+    record = models.AttendanceRecord
+    query = db.query(
+            record.id,
+            record.timestamp_utc,
+            record.local_time,
+            record.type,
+            record.match_score,
+            record.employee_id,
+            models.Employee.full_name.label("employee_name"),
+            models.Employee.code.label("employee_code"),
+            record.photo_path
+        )\
+        .join(models.Employee, models.Employee.id == record.employee_id)
+
+    if start is not None:
+        query = query.filter(record.local_time >= start, record.local_time < end)
+    if employee_id:
+        query = query.filter(record.employee_id == employee_id)
+    return query
+
+
+def _encode_cursor(timestamp_utc: datetime, record_id: str) -> str:
+    raw = f"{timestamp_utc.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), record_id
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _paginate(query, response: Response, limit: int, cursor: Optional[str]) -> list[dict]:
+    """
+    Paginación por keyset sobre (timestamp_utc, id), del más reciente al más
+    antiguo. A diferencia de OFFSET, cada página cuesta lo mismo sin importar
+    qué tan atrás esté. Si hay más registros, el cursor de la siguiente página
+    va en el header X-Next-Cursor.
+    """
+    record = models.AttendanceRecord
+    if cursor:
+        timestamp, record_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            record.timestamp_utc < timestamp,
+            and_(record.timestamp_utc == timestamp, record.id < record_id)
+        ))
+
+    rows = query.order_by(desc(record.timestamp_utc), desc(record.id)).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].timestamp_utc, rows[-1].id)
+    return [row._asdict() for row in rows]
 
-    # 7. Respuesta
-    action_msg = "Bienvenido" if new_type == 0 else "Hasta luego"
-    first_name = employee.full_name.split(" ")[0]
-    
-    return schemas.CheckInResponse(
-        success=True,
-        message=f"{action_msg} {first_name}",
-        employee_name=employee.full_name,
-        employee_code=employee.code,
-        time=new_record.local_time.strftime("%I:%M %p")
-    )
 
 @router.get("/history/{employee_id}", response_model=List[schemas.AttendanceRecordResponse])
-def get_history(employee_id: str, db: Session = Depends(get_db)):
-    return db.query(models.AttendanceRecord)\
-        .filter(models.AttendanceRecord.employee_id == employee_id)\
-        .order_by(desc(models.AttendanceRecord.timestamp_utc))\
-        .limit(50)\
-        .all()
+def get_history(
+    employee_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Historial de un empleado, del más reciente al más antiguo.
+    Para la siguiente página enviar el header X-Next-Cursor como `cursor`.
+    """
+    return _paginate(_records_query(db, employee_id=employee_id), response, limit, cursor)
 
 @router.get("/today", response_model=List[schemas.AttendanceRecordResponse])
 def get_today_records(
+    response: Response,
     start_date: str = None,
     end_date: str = None,
     employee_id: str = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -194,49 +497,84 @@ def get_today_records(
     - start_date: formato YYYY-MM-DD (ej: 2026-01-01)
     - end_date: formato YYYY-MM-DD (ej: 2026-01-05)
     - employee_id: UUID del empleado para filtrar por empleado específico
+    - limit / cursor: paginación (el cursor de la siguiente página viene en el
+      header X-Next-Cursor). Sin ninguno de los dos se retorna todo el rango.
     Si no se proporcionan fechas, retorna solo el día de hoy.
+    Para rangos grandes usar /export.
     """
-    # Si no se especifican fechas, usar día de hoy por defecto
-    if not start_date:
-        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        end = start + timedelta(days=1)
-    else:
-        try:
-            start = datetime.strptime(start_date, "%Y-%m-%d")
-            # Si no hay end_date, usar el mismo día que start_date
-            if end_date:
-                end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    start, end = _parse_date_range(start_date, end_date)
+    query = _records_query(db, start, end, employee_id)
+
+    if limit is None and cursor is None:
+        record = models.AttendanceRecord
+        rows = query.order_by(desc(record.timestamp_utc), desc(record.id)).all()
+        return [row._asdict() for row in rows]
+
+    return _paginate(query, response, limit or DEFAULT_PAGE_SIZE, cursor)
+
+@router.get("/export")
+def export_records(
+    start_date: str = None,
+    end_date: str = None,
+    employee_id: str = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$")
+):
+    """
+    Exporta los registros del rango (mismos filtros que /today) en orden
+    cronológico, como NDJSON (un objeto JSON por línea) o CSV.
+    Las filas se leen de la BD por lotes y se escriben conforme se generan,
+    así que la memoria no crece con el tamaño del rango.
+    """
+    start, end = _parse_date_range(start_date, end_date)
+    filename = f"asistencia_{start:%Y%m%d}_{(end - timedelta(days=1)):%Y%m%d}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+
+    return StreamingResponse(
+        _export_rows(start, end, employee_id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def _export_rows(start: datetime, end: datetime, employee_id: Optional[str], format: str):
+    # Sesión propia: el generador se consume después de que el endpoint retorna
+    db = database.SessionLocal()
+    try:
+        record = models.AttendanceRecord
+        rows = _records_query(db, start, end, employee_id)\
+            .order_by(record.timestamp_utc, record.id)\
+            .yield_per(EXPORT_BATCH_ROWS)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if format == "csv" else None
+        if writer:
+            writer.writerow(EXPORT_FIELDS)
+
+        pending = 0
+        for row in rows:
+            if writer:
+                writer.writerow([_export_value(value) for value in row])
             else:
-                end = start + timedelta(days=1)
-        except ValueError:
-            raise HTTPException(
-                status_code=400,
-                detail="Formato de fecha inválido. Usa YYYY-MM-DD (ej: 2026-01-01)"
-            )
-    
-    # Construir query con filtros
-    query = db.query(models.AttendanceRecord)\
-        .options(joinedload(models.AttendanceRecord.employee))\
-        .filter(models.AttendanceRecord.local_time >= start, models.AttendanceRecord.local_time < end)
-    
-    # Filtrar por empleado si se especifica
-    if employee_id:
-        query = query.filter(models.AttendanceRecord.employee_id == employee_id)
-    
-    records = query.order_by(desc(models.AttendanceRecord.timestamp_utc)).all()
-    
-    # Construir respuesta enriquecida con datos del empleado
-    result = []
-    for record in records:
-        result.append({
-            "id": str(record.id),
-            "timestamp_utc": record.timestamp_utc,
-            "type": record.type,
-            "match_score": record.match_score,
-            "employee_id": str(record.employee_id),
-            "employee_name": record.employee.full_name,
-            "employee_code": record.employee.code,
-            "photo_path": record.photo_path
-        })
-    
-    return result
\ No newline at end of file
+                buffer.write(json.dumps(
+                    {field: _export_value(value) for field, value in zip(EXPORT_FIELDS, row)},
+                    ensure_ascii=False
+                ))
+                buffer.write("\n")
+
+            pending += 1
+            if pending >= EXPORT_BATCH_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
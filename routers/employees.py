@@ -1,14 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response, Query
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import func, or_, and_
+from typing import List, Optional
 from datetime import datetime
-import uuid
+import asyncio
+import base64
+import binascii
+import json
 import os
-from io import BytesIO
+import shutil
+import tempfile
+import zipfile
 import database
 import models
 import schemas
-from services.biometric import BiometricService
+from services.encoder_pool import encode_image_or_raise
+from services.templates import set_enrollment_template, sync_gallery
+from services.photo_store import photo_store
+from services import metrics
+from services import bulk_import
+from services import gallery_sync
+from services.reencode import reencode_jobs, run_reencode
+import config
 
 router = APIRouter(
     prefix="/api/employees",
@@ -32,11 +45,12 @@ async def create_or_update_employee(
     # 1. Si se envió una nueva foto, procesarla
     if file is not None:
         # Leer los bytes de la imagen (para IA y para guardar)
-        file_bytes = await file.read()
+        with metrics.stage("read_upload"):
+            file_bytes = await file.read()
 
         # 2. IA: Procesar imagen para obtener el vector facial
-        # Usamos BytesIO porque la librería espera un objeto tipo archivo
-        face_vector = BiometricService.vector_from_image(BytesIO(file_bytes))
+        # Se ejecuta en el pool de procesos para no congelar el event loop
+        face_vector = await encode_image_or_raise(file_bytes)
 
         if not face_vector:
             raise HTTPException(
@@ -44,21 +58,10 @@ async def create_or_update_employee(
                 detail="No se detectó ningún rostro en la imagen. Intente con una foto más clara."
             )
 
-        # 3. Guardar la FOTO DE PERFIL en disco
-        # Usamos un prefijo 'profile_' para distinguirlas de las de asistencia
-        filename = f"profile_{uuid.uuid4()}.jpg"
-        
-        # Asegurar que la carpeta exista
-        os.makedirs("uploads", exist_ok=True)
-        
-        file_path_disk = os.path.join("uploads", filename)
-        
-        # Escribir el archivo
-        with open(file_path_disk, "wb") as f:
-            f.write(file_bytes)
-            
-        # Ruta relativa para la URL y la Base de Datos
-        photo_url = f"uploads/{filename}"
+        # 3. Guardar la FOTO DE PERFIL (en segundo plano, deduplicada por hash)
+        # Van en uploads/profiles/ para distinguirlas de las de asistencia
+        with metrics.stage("photo"):
+            photo_url = await photo_store.submit_async(file_bytes, "profiles")
 
     # 4. Lógica de Actualización o Creación
     existing_employee = None
@@ -96,9 +99,15 @@ async def create_or_update_employee(
         if face_vector and photo_url:
             existing_employee.face_vector = face_vector
             existing_employee.photo_path = photo_url
+            set_enrollment_template(db, existing_employee, face_vector)
         
-        db.commit()
-        db.refresh(existing_employee)
+        with metrics.stage("commit"):
+            db.commit()
+            db.refresh(existing_employee)
+
+        # Mantener la galería en memoria sincronizada (también cubre reactivaciones)
+        with metrics.stage("gallery_sync"):
+            sync_gallery(db, existing_employee.id)
         return existing_employee
     else:
         # Modo creación: verificar que el código no exista en empleados ACTIVOS
@@ -127,24 +136,282 @@ async def create_or_update_employee(
         face_vector=face_vector,
         photo_path=photo_url
     )
+    set_enrollment_template(db, new_employee, face_vector)
     
     db.add(new_employee)
-    db.commit()
-    db.refresh(new_employee)
+    with metrics.stage("commit"):
+        db.commit()
+        db.refresh(new_employee)
+
+    with metrics.stage("gallery_sync"):
+        sync_gallery(db, new_employee.id)
     
     return new_employee
 
-@router.get("/", response_model=List[schemas.EmployeeResponse])
-def get_all_employees(db: Session = Depends(get_db)):
-    # Retorna solo empleados activos
-    return db.query(models.Employee).filter(models.Employee.is_active == True).all()
+@router.post("/import", response_model=schemas.ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def import_employees(
+    file: UploadFile = File(...),        # ZIP con las fotos (y opcionalmente el CSV)
+    csv_file: UploadFile = File(None),   # CSV code,full_name[,photo] si no viene dentro del ZIP
+):
+    """
+    Alta masiva: ZIP de fotos + CSV. Responde de inmediato con el trabajo;
+    el avance y los errores por fila se consultan en GET /import/{job_id}.
+    """
+    # El archivo subido se cierra al terminar el request: copiarlo a disco para
+    # el trabajo (en un hilo, puede pesar cientos de MB)
+    tmp = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+    source = None
+    started = False
+    try:
+        with tmp:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, tmp)
+        try:
+            source = await asyncio.to_thread(bulk_import.open_photo_source, tmp.name)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="El archivo debe ser un ZIP con las fotos")
+
+        try:
+            if csv_file is not None:
+                csv_text = bulk_import.read_csv_bytes(await csv_file.read())
+            else:
+                csv_text = await asyncio.to_thread(bulk_import.csv_from_source, source)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        job = bulk_import.import_jobs.create(file.filename or "import.zip")
+
+        async def run():
+            try:
+                await bulk_import.run_import(job, source, csv_text)
+            finally:
+                os.unlink(tmp.name)
+
+        # Referencia en el trabajo para que la tarea no sea recolectada antes de terminar
+        job.task = asyncio.create_task(run())
+        started = True
+        return job.to_dict()
+    finally:
+        # Cualquier error antes de arrancar el trabajo: no dejar el ZIP temporal en disco
+        if not started:
+            if source is not None:
+                source.close()
+            os.unlink(tmp.name)
+
+@router.get("/import/{job_id}", response_model=schemas.ImportJobResponse)
+def get_import_job(job_id: str):
+    job = bulk_import.import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo de importación no encontrado")
+    return job.to_dict()
+
+@router.post("/reencode", response_model=schemas.ReencodeJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def reencode_employees(force: bool = False):
+    """
+    Regenera los encodings de todos los empleados desde su foto de perfil con
+    los parámetros actuales (config.ENCODER_MODEL_VERSION). Si una ejecución
+    anterior se interrumpió, continúa desde su checkpoint. force=true regenera
+    también las plantillas que ya tienen la etiqueta actual.
+    El avance se consulta en GET /reencode.
+    """
+    job = reencode_jobs.create(config.ENCODER_MODEL_VERSION, force)
+    if job is None:
+        raise HTTPException(status_code=409, detail="Ya hay una regeneración de encodings en curso")
+    job.task = asyncio.create_task(run_reencode(job))
+    return job.to_dict()
+
+@router.get("/reencode", response_model=schemas.ReencodeJobResponse)
+def get_reencode_job():
+    job = reencode_jobs.current
+    if not job:
+        raise HTTPException(status_code=404, detail="No se ha ejecutado ninguna regeneración de encodings")
+    return job.to_dict()
+
+# --- Listado: selección de campos, ETag y paginación ---
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Campo de la respuesta -> columna. face_vector (512 bytes por empleado) solo
+# viene si se pide explícitamente en ?fields=
+LIST_FIELDS = {
+    "id": models.Employee.id,
+    "code": models.Employee.code,
+    "full_name": models.Employee.full_name,
+    "face_vector": models.Employee.face_vector_blob,
+    "is_active": models.Employee.is_active,
+    "created_at_utc": models.Employee.created_at_utc,
+    "deleted_at": models.Employee.deleted_at,
+    "photo_path": models.Employee.photo_path,
+    "revision": models.Employee.revision,
+}
+DEFAULT_LIST_FIELDS = [name for name in LIST_FIELDS if name != "face_vector"]
+
+
+def _parse_fields(fields: Optional[str]) -> list[str]:
+    if not fields:
+        return DEFAULT_LIST_FIELDS
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in LIST_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(LIST_FIELDS)}"
+        )
+    # El id siempre viene: identifica la fila y arma el cursor
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
+def employees_etag(db: Session) -> str:
+    """
+    Versión de la tabla de empleados: cualquier alta o cambio sube
+    max(revision) (ver models.next_revision) y el conteo cubre borrados.
+    Es una sola consulta sobre el índice de revision.
+    """
+    latest, count = db.query(func.max(models.Employee.revision), func.count(models.Employee.id)).one()
+    return f'W/"{latest or 0}-{count}"'
+
 
-@router.get("/inactive", response_model=List[schemas.EmployeeResponse])
-def get_inactive_employees(db: Session = Depends(get_db)):
-    """Retorna solo empleados desactivados para gestión de reactivación"""
-    return db.query(models.Employee).filter(
-        models.Employee.is_active == False
-    ).order_by(models.Employee.deleted_at.desc()).all()
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    # Comparación débil: W/"x" equivale a "x"
+    return "*" in tags or etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in tags}
+
+
+def _encode_cursor(value, employee_id: str) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, employee_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[Optional[str], str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, employee_id = json.loads(raw)
+        return value, str(employee_id)
+    except (ValueError, TypeError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _list_employees(db: Session, request: Request, response: Response, active: bool,
+                    fields: Optional[str], limit: Optional[int], cursor: Optional[str]):
+    """
+    Listado de empleados activos (por código) o inactivos (desactivados más
+    recientes primero). Responde 304 si el cliente ya tiene la versión
+    actual de la tabla (If-None-Match). Con limit/cursor pagina por keyset;
+    el cursor de la siguiente página va en el header X-Next-Cursor.
+    """
+    names = _parse_fields(fields)
+    etag = employees_etag(db)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    employee = models.Employee
+    # Columna de orden siempre seleccionada (para el cursor) aunque no se haya pedido
+    order_column = employee.code if active else employee.deleted_at
+    columns = [LIST_FIELDS[name].label(name) for name in names]
+    query = db.query(*columns, order_column.label("_order")).filter(employee.is_active == active)
+
+    if cursor:
+        value, last_id = _decode_cursor(cursor)
+        if active:
+            query = query.filter(or_(employee.code > value, and_(employee.code == value, employee.id > last_id)))
+        elif value is None:
+            # Sin fecha de desactivación (registros antiguos): van al final
+            query = query.filter(employee.deleted_at.is_(None), employee.id < last_id)
+        else:
+            value = datetime.fromisoformat(value)
+            query = query.filter(or_(
+                employee.deleted_at < value,
+                and_(employee.deleted_at == value, employee.id < last_id),
+                employee.deleted_at.is_(None)
+            ))
+
+    if active:
+        query = query.order_by(employee.code, employee.id)
+    else:
+        # En SQLite los NULL quedan al final con DESC
+        query = query.order_by(employee.deleted_at.desc(), employee.id.desc())
+
+    if limit is None and cursor is None:
+        rows = query.all()
+    else:
+        limit = limit or DEFAULT_PAGE_SIZE
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1]._order, rows[-1].id)
+
+    items = []
+    for row in rows:
+        item = {name: getattr(row, name) for name in names}
+        if "face_vector" in item:
+            blob = item["face_vector"]
+            item["face_vector"] = models.decode_face_vector(blob).tolist() if blob else []
+        items.append(item)
+    return items
+
+
+@router.get("/", response_model=List[schemas.EmployeeListItem], response_model_exclude_unset=True)
+def get_all_employees(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Retorna solo empleados activos, ordenados por código.
+    - fields: campos separados por coma (ej: `code,full_name`). Por defecto
+      todos excepto face_vector; pedirlo con `fields=...,face_vector`.
+    - limit / cursor: paginación (el cursor de la siguiente página viene en el
+      header X-Next-Cursor). Sin ninguno de los dos se retorna la lista completa.
+    - If-None-Match: con el ETag de una respuesta anterior, 304 si nada cambió.
+    """
+    return _list_employees(db, request, response, True, fields, limit, cursor)
+
+@router.get("/inactive", response_model=List[schemas.EmployeeListItem], response_model_exclude_unset=True)
+def get_inactive_employees(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Retorna solo empleados desactivados para gestión de reactivación (mismos parámetros que /)"""
+    return _list_employees(db, request, response, False, fields, limit, cursor)
+
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 5000
+
+@router.get("/sync")
+def sync_gallery_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Cambios de la galería desde la revisión `since` para kioscos que comparan
+    localmente: altas/cambios con sus plantillas y bajas, en formato binario
+    (ver services/gallery_sync.py). since=0 descarga la galería completa.
+    Si no hubo cambios la respuesta son 32 bytes.
+    """
+    page = gallery_sync.read_changes(db, since, limit)
+    return Response(
+        content=gallery_sync.encode_changes(page),
+        media_type=gallery_sync.MEDIA_TYPE,
+        headers={
+            "X-Revision": str(page.next_since),
+            "X-Latest-Revision": str(page.latest),
+            "Cache-Control": "no-store"
+        }
+    )
 
 @router.get("/{employee_id}", response_model=schemas.EmployeeResponse)
 def get_employee(employee_id: str, db: Session = Depends(get_db)):
@@ -163,4 +430,6 @@ def deactivate_employee(employee_id: str, db: Session = Depends(get_db)):
     employee.is_active = False
     employee.deleted_at = datetime.utcnow()
     db.commit()
+
+    sync_gallery(db, employee.id)
     return None
\ No newline at end of file
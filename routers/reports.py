@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import database
+import schemas
+from services import reports
+
+router = APIRouter(
+    prefix="/api/reports",
+    tags=["Reports"]
+)
+
+get_db = database.get_db
+
+
+def _parse_period(month: Optional[str], start_date: Optional[str], end_date: Optional[str]) -> tuple[date, date]:
+    """
+    Periodo [inicio, fin] (ambos inclusive):
+    - month: YYYY-MM (ej: 2026-01), o
+    - start_date / end_date: YYYY-MM-DD (sin end_date, solo start_date).
+    Sin parámetros, el mes en curso.
+    """
+    try:
+        if start_date:
+            start = datetime.strptime(start_date, "%Y-%m-%d").date()
+            end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start
+        else:
+            start = datetime.strptime(month, "%Y-%m").date() if month else date.today().replace(day=1)
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Formato de fecha inválido. Usa YYYY-MM (ej: 2026-01) o YYYY-MM-DD (ej: 2026-01-01)"
+        )
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date debe ser anterior a end_date")
+    return start, end
+
+
+@router.get("/daily", response_model=List[schemas.DailySummaryResponse])
+def get_daily_report(
+    month: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    employee_id: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Resumen por empleado y día: primera entrada, última salida, turnos
+    completos / sin salida y horas trabajadas. Un turno nocturno cuenta
+    para el día de su entrada.
+    """
+    start, end = _parse_period(month, start_date, end_date)
+    return reports.daily_report(db, start, end, employee_id)
+
+
+@router.get("/worked-hours", response_model=List[schemas.WorkedHoursResponse])
+def get_worked_hours(
+    month: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    employee_id: str = None,
+    db: Session = Depends(get_db)
+):
+    """Horas trabajadas por empleado en el periodo (por defecto, el mes en curso)."""
+    start, end = _parse_period(month, start_date, end_date)
+    return reports.worked_hours_report(db, start, end, employee_id)
+
+
+@router.post("/backfill", response_model=schemas.BackfillResponse)
+def backfill_summaries(start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
+    """
+    Reconstruye los resúmenes diarios desde attendance_records (todo el
+    historial si no se indican fechas). Solo es necesario después de
+    modificar registros a mano en la BD.
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Formato de fecha inválido. Usa YYYY-MM-DD (ej: 2026-01-01)"
+        )
+    return schemas.BackfillResponse(days=reports.backfill(db, start, end))
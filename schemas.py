@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # --- Employee DTOs ---
 class EmployeeBase(BaseModel):
@@ -8,6 +8,12 @@ class EmployeeBase(BaseModel):
     full_name: str
     face_vector: List[float] # Recibe una lista de doubles/floats
 
+    @field_validator("face_vector", mode="before")
+    @classmethod
+    def _vector_to_list(cls, value):
+        # El modelo expone el vector como ndarray (ver models.Employee.face_vector)
+        return value.tolist() if hasattr(value, "tolist") else value
+
 class EmployeeCreate(EmployeeBase):
     pass
 
@@ -21,6 +27,55 @@ class EmployeeResponse(EmployeeBase):
     class Config:
         from_attributes = True # Permite leer datos desde los modelos de SQLAlchemy
 
+class EmployeeListItem(BaseModel):
+    # Listado con selección de campos (?fields=): solo vienen los pedidos
+    id: str
+    code: Optional[str] = None
+    full_name: Optional[str] = None
+    face_vector: Optional[List[float]] = None
+    is_active: Optional[bool] = None
+    created_at_utc: Optional[datetime] = None
+    deleted_at: Optional[datetime] = None
+    photo_path: Optional[str] = None
+    revision: Optional[int] = None
+
+class ImportFailure(BaseModel):
+    row: int # Fila del CSV (la 1 es el encabezado)
+    code: str
+    error: str
+
+class ImportJobResponse(BaseModel):
+    id: str
+    source: str
+    status: str # queued | running | done | failed
+    total: int
+    processed: int
+    created: int
+    failed: int
+    failures: List[ImportFailure] = []
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+class ReencodeFailure(BaseModel):
+    employee_id: str
+    code: str
+    error: str
+
+class ReencodeJobResponse(BaseModel):
+    id: str
+    status: str # queued | running | done | failed
+    model_version: str
+    total: int
+    processed: int
+    updated: int
+    failed: int
+    failures: List[ReencodeFailure] = []
+    resumed: bool # Continuó desde el checkpoint de una ejecución interrumpida
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
 # --- Attendance DTOs ---
 class CheckInRequest(BaseModel):
     face_vector: List[float]
@@ -32,6 +87,14 @@ class CheckInResponse(BaseModel):
     employee_name: Optional[str] = None
     employee_code: Optional[str] = None
     time: str
+    record_id: Optional[str] = None # ID del registro creado (para adjuntar la foto después)
+
+class BatchCheckInItem(CheckInResponse):
+    image_index: int # Posición de la imagen en el lote
+    face_index: int = 0 # Cara dentro de la imagen (0 = la más grande)
+
+class BatchCheckInResponse(BaseModel):
+    results: List[BatchCheckInItem]
 
 class AttendanceRecordResponse(BaseModel):
     id: str
@@ -44,4 +107,30 @@ class AttendanceRecordResponse(BaseModel):
     photo_path: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Report DTOs ---
+class DailySummaryResponse(BaseModel):
+    employee_id: str
+    employee_name: str
+    employee_code: str
+    day: date
+    first_check_in: Optional[datetime] = None
+    last_check_out: Optional[datetime] = None
+    shifts: int
+    open_shifts: int
+    orphan_check_outs: int
+    worked_hours: float
+
+class WorkedHoursResponse(BaseModel):
+    employee_id: str
+    employee_name: str
+    employee_code: str
+    days_worked: int # Días con al menos un turno completo
+    shifts: int
+    open_shifts: int
+    orphan_check_outs: int
+    worked_hours: float
+
+class BackfillResponse(BaseModel):
+    days: int # Resúmenes diarios recalculados
@@ -0,0 +1,169 @@
+"""
+Control de admisión para los endpoints de reconocimiento.
+
+En un cambio de turno llegan muchas checadas a la vez; sin límite todas
+esperan al pool de encoding y la latencia sube para todos hasta que los
+checadores se rinden por timeout. Aquí:
+
+- Concurrencia acotada: solo `max_concurrent` requests codifican a la vez.
+- Cola acotada: hasta `max_queue` esperan su turno (por `queue_timeout` segundos).
+- Rechazo rápido: con la cola llena se responde 503 con Retry-After de
+  inmediato, estimado con el tiempo promedio de servicio.
+- Calidad adaptativa: al obtener su turno, el request recibe un nivel de
+  calidad según qué tan llena está la cola; con carga se detecta sin
+  ampliar la imagen y sobre una copia más pequeña (más rápido, puede perder
+  caras pequeñas o lejanas).
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import NamedTuple
+from fastapi import HTTPException
+from services import metrics
+import config
+
+shed = metrics.registry.counter(
+    "checador_admission_shed_total", "Requests rechazados por el control de admisión (queue_full, timeout)", ("reason",))
+admitted = metrics.registry.counter(
+    "checador_admission_admitted_total", "Requests admitidos por nivel de calidad (normal, reduced, minimal)", ("quality",))
+queue_wait = metrics.registry.histogram(
+    "checador_admission_wait_seconds", "Espera en la cola de admisión")
+
+
+class Quality(NamedTuple):
+    level: str
+    detection_side: int
+    upsample: int
+
+
+NORMAL = Quality("normal", config.ENCODER_DETECTION_SIDE, config.ENCODER_UPSAMPLE)
+# Sin ampliar la imagen para buscar caras pequeñas
+REDUCED = Quality("reduced", config.ENCODER_DETECTION_SIDE, 0)
+# Además, detección sobre una copia más pequeña
+MINIMAL = Quality(
+    "minimal",
+    min(config.ENCODER_DETECTION_SIDE or config.ADAPTIVE_MIN_DETECTION_SIDE, config.ADAPTIVE_MIN_DETECTION_SIDE),
+    0
+)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 adaptive: bool = True, reduced_at: float = 0.25, minimal_at: float = 0.6):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.reduced_at = reduced_at
+        self.minimal_at = minimal_at
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        # Promedio móvil de la duración de un request admitido (para Retry-After)
+        self._service_seconds = 1.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def quality(self) -> Quality:
+        """Nivel de calidad según la ocupación actual de la cola."""
+        if not self.adaptive or self.max_queue == 0:
+            return NORMAL
+        load = len(self._waiters) / self.max_queue
+        if load >= self.minimal_at:
+            return MINIMAL
+        if load >= self.reduced_at:
+            return REDUCED
+        return NORMAL
+
+    def retry_after(self) -> int:
+        """Segundos estimados para que se vacíe la cola actual."""
+        seconds = (len(self._waiters) + 1) * self._service_seconds / self.max_concurrent
+        return max(1, min(30, math.ceil(seconds)))
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Turno para procesar un request de reconocimiento; entrega el nivel de
+        calidad a usar. Lanza HTTPException 503 si la cola está llena o la
+        espera excede queue_timeout.
+        """
+        with metrics.stage("admission"):
+            await self._acquire()
+        quality = self.quality()
+        admitted.inc(quality=quality.level)
+        start = time.monotonic()
+        try:
+            yield quality
+        finally:
+            elapsed = time.monotonic() - start
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * elapsed
+            self._release()
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.max_concurrent and not self._waiters:
+            self._in_flight += 1
+            queue_wait.observe(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            shed.inc(reason="queue_full")
+            raise self._busy()
+
+        # El turno se hereda en _release(): in_flight no cambia al pasar de un request al siguiente
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._forget(waiter):
+                return  # El turno llegó justo al vencer la espera
+            shed.inc(reason="timeout")
+            raise self._busy()
+        except BaseException:
+            # Cliente desconectado: si ya se le había asignado el turno, se libera
+            if not self._forget(waiter):
+                self._release()
+            raise
+        finally:
+            queue_wait.observe(time.monotonic() - start)
+
+    def _forget(self, waiter) -> bool:
+        """Saca a un request de la cola; False si ya había recibido su turno."""
+        if waiter.done():
+            return False
+        waiter.cancel()
+        self._waiters.remove(waiter)
+        return True
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail="Servidor ocupado procesando otras checadas. Intente de nuevo en unos segundos.",
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+
+# Instancia única por proceso
+admission = AdmissionController(
+    max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    queue_timeout=config.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    adaptive=config.ADAPTIVE_QUALITY,
+    reduced_at=config.ADAPTIVE_REDUCED_AT,
+    minimal_at=config.ADAPTIVE_MINIMAL_AT
+)
@@ -0,0 +1,108 @@
+from datetime import datetime
+from typing import Optional
+import schemas
+from services import metrics
+
+# Configuración de intervalos (ver CASOS_DE_PRUEBA_TIEMPOS.md)
+ANTI_REBOUND_SECONDS = 60    # Cooldown global para no duplicar registros
+MINIMUM_SHIFT_MINUTES = 10   # Tiempo mínimo para permitir salida (errores, devoluciones)
+CYCLE_TIMEOUT_HOURS = 18     # Ventana máxima antes de auto-cerrar ciclo
+MAX_DAILY_ENTRIES = 4        # Máximo de ENTRADAS por empleado por día
+
+
+def display_time(value: datetime = None) -> str:
+    return (value or datetime.now()).strftime("%I:%M %p")
+
+
+def evaluate_check_in(employee, last_record, entries_today: int, now_utc: datetime = None) -> tuple[Optional[int], Optional[schemas.CheckInResponse]]:
+    """
+    Aplica las reglas de negocio de entrada/salida.
+
+    - last_record: último registro del empleado (cualquier objeto con
+      type, timestamp_utc y local_time) o None si no tiene historial.
+    - entries_today: número de ENTRADAS (type=0) registradas hoy.
+
+    Retorna (new_type, None) si se debe guardar un registro nuevo, o
+    (None, respuesta) si el intento se resuelve sin escribir en la BD.
+    """
+    now_utc = now_utc or datetime.utcnow()
+    first_name = employee.full_name.split(" ")[0]
+
+    # REGLA PREVIA: Máximo 4 entradas por día
+    # Si no hay registro previo O el último fue SALIDA → próximo sería ENTRADA
+    would_be_entry = (last_record is None) or (last_record.type == 1)
+
+    if would_be_entry and entries_today >= MAX_DAILY_ENTRIES:
+        metrics.rule_rejections.inc(rule="max_daily_entries")
+        return None, schemas.CheckInResponse(
+            success=False,
+            message=f"❌ Máximo de entradas diarias alcanzado ({MAX_DAILY_ENTRIES}), {first_name}",
+            employee_name=employee.full_name,
+            employee_code=employee.code,
+            time=display_time()
+        )
+
+    new_type = 0 # CheckIn por defecto
+
+    if last_record:
+        seconds_since = (now_utc - last_record.timestamp_utc).total_seconds()
+        minutes_since = seconds_since / 60
+        hours_since = seconds_since / 3600
+
+        # ⚡ REGLA 1: ANTI-REBOTE (Cooldown Global de 60 segundos)
+        # Si han pasado menos de 60 segundos, NO guardar en BD
+        # Retornar éxito para no confundir al usuario con error rojo
+        if seconds_since < ANTI_REBOUND_SECONDS:
+            metrics.rule_rejections.inc(rule="anti_rebound")
+            last_action = "entrada" if last_record.type == 0 else "salida"
+            return None, schemas.CheckInResponse(
+                success=True,
+                message=f"✓ Ya registraste tu {last_action}, {first_name}",
+                employee_name=employee.full_name,
+                employee_code=employee.code,
+                time=display_time(last_record.local_time)
+            )
+
+        # 🔄 REGLA 2: GESTIÓN DE TIEMPOS OPERACIONALES
+        # Si último registro fue ENTRADA (type 0)
+        if last_record.type == 0:
+            # ⏰ VALIDACIÓN 1: Intervalo mínimo de 10 minutos
+            # Permite gestionar: errores de turno, devoluciones por retardo, incidencias
+            if minutes_since < MINIMUM_SHIFT_MINUTES:
+                metrics.rule_rejections.inc(rule="minimum_shift")
+                minutes_remaining = int(MINIMUM_SHIFT_MINUTES - minutes_since)
+                return None, schemas.CheckInResponse(
+                    success=False,
+                    message=f"⏱️ Espera {minutes_remaining} min para marcar salida, {first_name}",
+                    employee_name=employee.full_name,
+                    employee_code=employee.code,
+                    time=display_time()
+                )
+            elif hours_since < CYCLE_TIMEOUT_HOURS:
+                # ✅ Entre 10 min y 18 horas → PERMITIR SALIDA
+                new_type = 1  # Marcar SALIDA
+            else:
+                # 🔄 Más de 18 horas sin cerrar ciclo → Auto-cierre y Nueva ENTRADA
+                new_type = 0
+
+        # Si último registro fue SALIDA (type 1)
+        elif last_record.type == 1:
+            # Siempre será ENTRADA después de una SALIDA
+            # (El cooldown de 60 segundos ya previene duplicados)
+            new_type = 0
+
+    return new_type, None
+
+
+def success_response(employee, new_type: int, local_time: datetime, record_id: str = None) -> schemas.CheckInResponse:
+    action_msg = "Bienvenido" if new_type == 0 else "Hasta luego"
+    first_name = employee.full_name.split(" ")[0]
+
+    return schemas.CheckInResponse(
+        success=True,
+        message=f"{action_msg} {first_name}",
+        employee_name=employee.full_name,
+        employee_code=employee.code,
+        time=display_time(local_time),
+        record_id=record_id
+    )
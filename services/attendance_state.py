@@ -0,0 +1,142 @@
+import threading
+from datetime import datetime, date
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import AttendanceRecord
+import config
+
+
+class EmployeeState:
+    """
+    Último registro conocido de un empleado y sus ENTRADAS del día.
+    Expone type / timestamp_utc / local_time igual que AttendanceRecord, así
+    que services.attendance_rules lo acepta como `last_record`.
+    """
+
+    __slots__ = ("type", "timestamp_utc", "local_time", "entries_today", "day")
+
+    def __init__(self, type: int, timestamp_utc: datetime, local_time: datetime, entries_today: int, day: date):
+        self.type = type
+        self.timestamp_utc = timestamp_utc
+        self.local_time = local_time
+        self.entries_today = entries_today
+        self.day = day
+
+
+class AttendanceStateCache:
+    """
+    Tabla en memoria (write-through) con el estado de asistencia por empleado,
+    para evaluar las reglas de checada en O(1) sin consultar attendance_records.
+
+    Se precarga al arrancar desde la BD y se actualiza con cada registro
+    nuevo en cuanto se encola para el commit agrupado (antes de que se
+    guarde), para que otra checada del mismo empleado que llegue mientras
+    tanto ya lo vea; si el commit falla se invalida y se recarga de la BD.
+    El conteo de entradas se reinicia solo al cambiar de día (hora local).
+
+    Con varios workers (`shared`) otro proceso pudo registrar checadas que
+    esta tabla no vio: refresh() relee de la BD a los empleados involucrados
+    antes de evaluar las reglas (2 consultas por índice).
+    """
+
+    def __init__(self, shared: bool = False):
+        self._lock = threading.Lock()
+        self._states: dict[str, EmployeeState] = {}
+        self._warmed = False
+        self.shared = shared
+
+    @property
+    def warmed(self) -> bool:
+        return self._warmed
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def warm(self, db: Session) -> None:
+        """Carga el último registro y las entradas de hoy de todos los empleados (2 consultas)."""
+        states = self._query_states(db)
+        with self._lock:
+            self._states = states
+            self._warmed = True
+
+    def refresh(self, db: Session, employee_ids) -> None:
+        """Relee de la BD el estado de estos empleados; solo con varios workers."""
+        if not self.shared:
+            return
+        employee_ids = list(set(employee_ids))
+        if not employee_ids:
+            return
+        states = self._query_states(db, employee_ids)
+        with self._lock:
+            for employee_id in employee_ids:
+                state = states.get(employee_id)
+                if state is None:
+                    self._states.pop(employee_id, None)
+                else:
+                    self._states[employee_id] = state
+
+    def _query_states(self, db: Session, employee_ids: Optional[list[str]] = None) -> dict[str, EmployeeState]:
+        today = datetime.now().date()
+        today_start = datetime.combine(today, datetime.min.time())
+
+        entries_query = db.query(AttendanceRecord.employee_id, func.count(AttendanceRecord.id))\
+            .filter(AttendanceRecord.type == 0, AttendanceRecord.local_time >= today_start)
+        latest = db.query(
+                AttendanceRecord.employee_id,
+                func.max(AttendanceRecord.timestamp_utc).label("last_ts")
+            )
+        if employee_ids is not None:
+            entries_query = entries_query.filter(AttendanceRecord.employee_id.in_(employee_ids))
+            latest = latest.filter(AttendanceRecord.employee_id.in_(employee_ids))
+
+        entries_today = dict(entries_query.group_by(AttendanceRecord.employee_id).all())
+        latest = latest.group_by(AttendanceRecord.employee_id).subquery()
+        rows = db.query(
+                AttendanceRecord.employee_id,
+                AttendanceRecord.type,
+                AttendanceRecord.timestamp_utc,
+                AttendanceRecord.local_time
+            )\
+            .join(latest, (AttendanceRecord.employee_id == latest.c.employee_id)
+                  & (AttendanceRecord.timestamp_utc == latest.c.last_ts))\
+            .all()
+
+        return {
+            employee_id: EmployeeState(record_type, timestamp_utc, local_time, entries_today.get(employee_id, 0), today)
+            for employee_id, record_type, timestamp_utc, local_time in rows
+        }
+
+    def ensure_warm(self, db: Session) -> None:
+        if not self._warmed:
+            self.warm(db)
+
+    def get(self, employee_id: str) -> tuple[Optional[EmployeeState], int]:
+        """Retorna (último registro o None, entradas de hoy)."""
+        state = self._states.get(employee_id)
+        if state is None:
+            return None, 0
+        entries = state.entries_today if state.day == datetime.now().date() else 0
+        return state, entries
+
+    def record(self, employee_id: str, record_type: int, timestamp_utc: datetime, local_time: datetime) -> None:
+        """
+        Registra una checada nueva. Llamar antes de esperar su commit (ver
+        services/attendance_writer.py); si el commit falla, llamar
+        invalidate() para descartar el registro no guardado.
+        """
+        today = local_time.date()
+        with self._lock:
+            previous = self._states.get(employee_id)
+            entries = previous.entries_today if previous is not None and previous.day == today else 0
+            if record_type == 0:
+                entries += 1
+            self._states[employee_id] = EmployeeState(record_type, timestamp_utc, local_time, entries, today)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._warmed = False
+
+
+# Instancia única por proceso
+attendance_state = AttendanceStateCache(shared=config.MULTI_WORKER)
@@ -0,0 +1,142 @@
+"""
+Escritura agrupada (group commit) de los registros de asistencia.
+
+Con varios checadores a la vez, un commit por checada hace que el lock de
+escritura de SQLite y el fsync de cada commit marquen el techo de
+throughput. Aquí las escrituras de requests concurrentes se juntan en una
+sola transacción: el hilo escritor toma el primer trabajo de la cola, espera
+hasta `max_wait_ms` (o a juntar `max_batch`) y hace un solo commit. Cada
+request recibe su respuesta cuando el commit de su lote terminó.
+
+Un trabajo es una función `work(db)` que agrega sus objetos a la sesión del
+lote (sin commit) y retorna un valor para el request. Si un trabajo falla,
+el lote se revierte y cada trabajo se repite en su propia transacción para
+no arrastrar a los demás; por eso `work` debe poder ejecutarse de nuevo
+(crear sus objetos dentro de la función).
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from services import metrics
+import config
+
+batch_size = metrics.registry.histogram(
+    "checador_attendance_batch_size", "Checadas por commit agrupado", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+commit_latency = metrics.registry.histogram(
+    "checador_attendance_commit_seconds", "Duración del commit de cada lote (trabajos + commit)")
+batches = metrics.registry.counter(
+    "checador_attendance_batches_total", "Lotes escritos por resultado (ok, fallback: repetidos uno por uno)", ("result",))
+
+
+class _Job:
+    __slots__ = ("work", "future")
+
+    def __init__(self, work: Callable[[Session], object]):
+        self.work = work
+        self.future = Future()
+
+
+class AttendanceWriter:
+    def __init__(self, max_batch: int, max_wait_ms: float, session_factory=SessionLocal):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._session_factory = session_factory
+        self._queue: "queue.Queue[_Job | None]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="attendance-writer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self) -> None:
+        """Escribe lo pendiente y detiene el hilo (al apagar el servidor)."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, work: Callable[[Session], object]) -> Future:
+        job = _Job(work)
+        self.start()
+        self._queue.put(job)
+        return job.future
+
+    async def run(self, work: Callable[[Session], object]):
+        """Encola el trabajo y espera a que su lote quede guardado; retorna lo que retornó work."""
+        return await asyncio.wrap_future(self.submit(work))
+
+    def _loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    # Lo que ya esté en cola entra sin esperar; después, hasta el deadline
+                    job = self._queue.get(timeout=max(0.0, deadline - time.monotonic())) \
+                        if self.max_wait else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list[_Job]) -> None:
+        start = time.perf_counter()
+        db = self._session_factory()
+        try:
+            try:
+                results = [job.work(db) for job in batch]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Error en commit agrupado ({len(batch)} checadas), reintentando una por una: {e}")
+                batches.inc(result="fallback")
+                for job in batch:
+                    self._write_one(db, job)
+                return
+            batches.inc(result="ok")
+            for job, result in zip(batch, results):
+                job.future.set_result(result)
+        finally:
+            db.close()
+            batch_size.observe(len(batch))
+            commit_latency.observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _write_one(db: Session, job: _Job) -> None:
+        try:
+            result = job.work(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+
+
+# Instancia única por proceso
+attendance_writer = AttendanceWriter(
+    max_batch=config.GROUP_COMMIT_MAX_BATCH,
+    max_wait_ms=config.GROUP_COMMIT_WAIT_MS
+)
@@ -1,8 +1,27 @@
 import numpy as np
-import face_recognition
+from io import BytesIO
+from PIL import Image
 from sqlalchemy.orm import Session
 from models import Employee
 from typing import Optional
+from services.gallery import gallery
+from services import metrics
+from services.burst_cache import recent_matches
+import config
+
+# face_recognition carga dlib y sus modelos al importarse (varios segundos, más
+# dentro del ejecutable de PyInstaller). Se importa hasta que se necesita, para
+# que el servidor arranque sin esperar; ver BiometricService.warm_up().
+_face_recognition = None
+
+
+def _recognition():
+    global _face_recognition
+    if _face_recognition is None:
+        import face_recognition
+        _face_recognition = face_recognition
+    return _face_recognition
+
 
 class BiometricService:
     def __init__(self, db: Session):
@@ -10,35 +29,95 @@ class BiometricService:
         self.threshold = 0.5 # Bajamos un poco el umbral para ser más estrictos con fotos reales
 
     def find_best_match(self, incoming_vector: list[float]) -> Optional[Employee]:
-        # (Este método queda IGUAL que antes, no lo borres)
-        if not incoming_vector:
+        match = self.find_best_match_with_distance(incoming_vector)
+        return match[0] if match else None
+
+    def find_best_match_with_distance(self, incoming_vector: list[float]) -> Optional[tuple[Employee, float]]:
+        """
+        Busca al empleado más cercano en la galería en memoria.
+        Retorna (empleado, distancia) o None si nadie queda bajo el umbral.
+        """
+        if incoming_vector is None or len(incoming_vector) == 0:
             return None
-        
-        incoming_arr = np.array(incoming_vector)
-        active_employees = self.db.query(Employee).filter(Employee.is_active == True).all()
-
-        best_match = None
-        min_distance = float('inf')
-
-        for employee in active_employees:
-            try:
-                stored_vector = employee.face_vector
-                if len(stored_vector) != len(incoming_vector):
-                    continue
-                
-                stored_arr = np.array(stored_vector)
-                distance = np.linalg.norm(incoming_arr - stored_arr)
-
-                if distance < min_distance:
-                    min_distance = distance
-                    best_match = employee
-            except Exception:
-                continue
-
-        if min_distance < self.threshold:
-            return best_match
-        
-        return None
+
+        with metrics.stage("match"):
+            gallery.ensure_loaded(self.db)
+            # Ráfaga: un vector casi igual a uno que coincidió hace poco se
+            # compara solo contra las plantillas de ese empleado
+            recent = self._recent_candidate(incoming_vector)
+            candidates = recent or gallery.search(incoming_vector, k=1)
+        if not candidates:
+            metrics.matches.inc(result="miss")
+            return None
+
+        employee_id, distance = candidates[0]
+        metrics.match_distance.observe(distance)
+        if distance >= self.threshold:
+            metrics.matches.inc(result="miss")
+            return None
+
+        with metrics.stage("match_lookup"):
+            employee = self.db.get(Employee, employee_id)
+        if employee is None or not employee.is_active:
+            # La galería quedó desfasada respecto a la BD; se recarga en la próxima búsqueda
+            gallery.invalidate()
+            metrics.matches.inc(result="miss")
+            return None
+
+        metrics.matches.inc(result="match")
+        if not recent:
+            recent_matches.add(incoming_vector, employee.id)
+        return employee, distance
+
+    def _recent_candidate(self, incoming_vector) -> list[tuple[str, float]]:
+        employee_id = recent_matches.lookup(incoming_vector)
+        if employee_id is None:
+            return []
+        templates = gallery.employee_vectors(employee_id)
+        if len(templates) == 0:
+            return []  # Ya no está en la galería (desactivado)
+        query = np.asarray(incoming_vector, dtype=np.float32).reshape(-1)
+        distance = float(np.sqrt(((templates - query) ** 2).sum(axis=1).min()))
+        return [(employee_id, distance)] if distance < self.threshold else []
+
+    def find_best_matches(self, incoming_vectors) -> list[Optional[tuple[Employee, float]]]:
+        """
+        Versión por lotes de find_best_match_with_distance: compara todos los
+        vectores contra la galería en una sola operación matricial y carga a
+        los empleados encontrados con una sola consulta.
+        """
+        if len(incoming_vectors) == 0:
+            return []
+
+        with metrics.stage("match"):
+            gallery.ensure_loaded(self.db)
+            candidates = gallery.search_batch(incoming_vectors)
+
+        matched_ids = {employee_id for employee_id, distance in candidates
+                       if employee_id is not None and distance < self.threshold}
+        employees = {}
+        if matched_ids:
+            with metrics.stage("match_lookup"):
+                rows = self.db.query(Employee).filter(Employee.id.in_(matched_ids), Employee.is_active == True).all()
+            employees = {employee.id: employee for employee in rows}
+            if len(employees) != len(matched_ids):
+                gallery.invalidate()
+
+        results = []
+        for employee_id, distance in candidates:
+            if employee_id is not None:
+                metrics.match_distance.observe(distance)
+            employee = employees.get(employee_id) if distance < self.threshold else None
+            metrics.matches.inc(result="match" if employee else "miss")
+            results.append((employee, distance) if employee else None)
+        return results
+
+    def find_top_matches(self, incoming_vector: list[float], k: int = 5) -> list[tuple[str, float]]:
+        """Retorna los k candidatos más cercanos como (employee_id, distancia), sin aplicar umbral."""
+        if incoming_vector is None or len(incoming_vector) == 0:
+            return []
+        gallery.ensure_loaded(self.db)
+        return gallery.search(incoming_vector, k=k)
 
     # --- NUEVA FUNCIÓN DE IA ---
     @staticmethod
@@ -46,24 +125,149 @@ class BiometricService:
         """
         Recibe los bytes de una imagen, detecta la cara y retorna el vector (encoding).
         Retorna None si no encuentra ninguna cara.
+
+        Ruta rápida: se decodifica a tamaño reducido, se detecta sobre una copia
+        pequeña, y solo se codifica el recorte de la cara más grande.
+        """
+        vectors = BiometricService.vectors_from_image(file_bytes)
+        return vectors[0] if vectors else None
+
+    @staticmethod
+    def vectors_from_image(file_bytes, all_faces: bool = False,
+                           detection_side: int = None, upsample: int = None) -> list[list[float]]:
+        """
+        Igual que vector_from_image pero puede retornar el encoding de todas las
+        caras detectadas (ordenadas de la más grande a la más pequeña).
+        Retorna una lista vacía si no hay caras. detection_side/upsample
+        sobreescriben la configuración (calidad adaptativa, ver services/admission.py).
         """
         try:
-            # Cargar imagen desde bytes
-            image = face_recognition.load_image_file(file_bytes)
-            
-            # Detectar caras y generar encodings (vectores)
-            # num_jitters=1 hace que sea rápido. Aumentar para más precisión.
-            encodings = face_recognition.face_encodings(image)
-
-            if len(encodings) > 0:
-                # Retornamos el de la primera cara encontrada y lo convertimos a lista normal
-                return encodings[0].tolist()
-            
-            return None
+            with metrics.stage("decode"):
+                image = BiometricService.load_image(file_bytes)
+
+            with metrics.stage("detect"):
+                boxes = BiometricService.detect_faces(image, detection_side, upsample)
+            if not boxes:
+                return []
+
+            # La cara más grande primero (la persona frente al checador)
+            boxes.sort(key=lambda b: (b[2] - b[0]) * (b[1] - b[3]), reverse=True)
+            if not all_faces:
+                boxes = boxes[:1]
+
+            vectors = []
+            with metrics.stage("encode_face"):
+                for box in boxes:
+                    encoding = BiometricService.encode_face(image, box)
+                    if encoding is not None:
+                        vectors.append(encoding.tolist())
+            return vectors
         except Exception as e:
             print(f"Error procesando imagen: {e}")
-            return None
+            return []
+
+    @staticmethod
+    def load_image(file_bytes, max_side: int = None) -> np.ndarray:
+        """
+        Decodifica la imagen a RGB limitando su lado mayor a max_side.
+        Para JPEG usa draft(), que decodifica directamente a 1/2, 1/4 o 1/8
+        de resolución sin procesar todos los píxeles.
+        """
+        max_side = max_side or config.ENCODER_MAX_IMAGE_SIDE
+        if isinstance(file_bytes, (bytes, bytearray)):
+            file_bytes = BytesIO(file_bytes)
+
+        img = Image.open(file_bytes)
+        if max_side > 0:
+            img.draft("RGB", (max_side, max_side))
+        img = img.convert("RGB")
+        if max_side > 0 and max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.BILINEAR)
+        return np.asarray(img)
+
+    @staticmethod
+    def detect_faces(image: np.ndarray, detection_side: int = None, upsample: int = None) -> list[tuple[int, int, int, int]]:
+        """
+        Detecta rostros sobre una copia reducida de la imagen y retorna las cajas
+        (top, right, bottom, left) en coordenadas de la imagen original.
+        """
+        detection_side = config.ENCODER_DETECTION_SIDE if detection_side is None else detection_side
+        upsample = config.ENCODER_UPSAMPLE if upsample is None else upsample
+
+        height, width = image.shape[:2]
+        scale = 1.0
+        small = image
+        if detection_side > 0 and max(height, width) > detection_side:
+            scale = max(height, width) / detection_side
+            small_size = (max(1, round(width / scale)), max(1, round(height / scale)))
+            small = np.asarray(Image.fromarray(image).resize(small_size, Image.BILINEAR))
+
+        locations = _recognition().face_locations(
+            small,
+            number_of_times_to_upsample=upsample,
+            model=config.ENCODER_DETECTION_MODEL
+        )
+
+        boxes = []
+        for top, right, bottom, left in locations:
+            boxes.append((
+                max(0, int(top * scale)),
+                min(width, int(right * scale)),
+                min(height, int(bottom * scale)),
+                max(0, int(left * scale))
+            ))
+        return boxes
+
+    @staticmethod
+    def encode_face(image: np.ndarray, box: tuple[int, int, int, int]) -> Optional[np.ndarray]:
+        """Genera el encoding de 128 dimensiones usando solo el recorte de la cara (con margen)."""
+        top, right, bottom, left = box
+        height, width = image.shape[:2]
+        margin_y = (bottom - top) // 4
+        margin_x = (right - left) // 4
+
+        crop_top = max(0, top - margin_y)
+        crop_left = max(0, left - margin_x)
+        crop = np.ascontiguousarray(image[
+            crop_top:min(height, bottom + margin_y),
+            crop_left:min(width, right + margin_x)
+        ])
+
+        local_box = (top - crop_top, right - crop_left, bottom - crop_top, left - crop_left)
+        encodings = _recognition().face_encodings(
+            crop,
+            known_face_locations=[local_box],
+            num_jitters=config.ENCODER_NUM_JITTERS
+        )
+        return encodings[0] if encodings else None
+
+    @staticmethod
+    def sharpness(image: np.ndarray, box: tuple[int, int, int, int], size: int = 64) -> float:
+        """
+        Nitidez del rostro: varianza del Laplaciano sobre el recorte en gris
+        llevado a size x size (así caras de distinto tamaño son comparables).
+        Un cuadro movido o desenfocado da valores bajos.
+        """
+        top, right, bottom, left = box
+        crop = image[top:bottom, left:right]
+        if crop.size == 0:
+            return 0.0
+        gray = np.asarray(Image.fromarray(crop).convert("L").resize((size, size), Image.BILINEAR), dtype=np.float32)
+        laplacian = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]) - 4 * gray[1:-1, 1:-1]
+        return float(laplacian.var())
+
+    @staticmethod
+    def warm_up() -> None:
+        """
+        Carga face_recognition y ejecuta una detección y un encoding de prueba,
+        para que la primera checada real no pague la inicialización de dlib.
+        """
+        recognition = _recognition()
+        blank = np.zeros((150, 150, 3), dtype=np.uint8)
+        recognition.face_locations(blank[:64, :64], number_of_times_to_upsample=0, model=config.ENCODER_DETECTION_MODEL)
+        recognition.face_encodings(blank, known_face_locations=[(25, 125, 125, 25)], num_jitters=1)
 
     @staticmethod
-    def calculate_distance(vec1: list[float], vec2: list[float]) -> float:
-        return float(np.linalg.norm(np.array(vec1) - np.array(vec2)))
\ No newline at end of file
+    def calculate_distance(vec1, vec2) -> float:
+        # Acepta listas o ndarrays (p. ej. Employee.face_vector) sin copias innecesarias
+        return float(np.linalg.norm(np.asarray(vec1, dtype=np.float32) - np.asarray(vec2, dtype=np.float32)))
\ No newline at end of file
@@ -0,0 +1,371 @@
+"""
+Alta masiva de empleados a partir de un ZIP (o directorio) con fotos y un CSV.
+
+El CSV lleva las columnas code y full_name (también se aceptan codigo/nombre)
+y opcionalmente photo/foto con el nombre del archivo; sin esa columna se busca
+una foto cuyo nombre sea el código (A001.jpg, A001.png...). Puede venir dentro
+del ZIP o por separado.
+
+- Los códigos se validan contra la BD en una sola consulta.
+- Las fotos se codifican por bloques en el pool de procesos
+  (services/encoder_pool.py), dejando lugar en la cola para las checadas.
+- Los empleados se insertan en transacciones por lotes.
+- La galería en memoria se recarga una sola vez al final.
+- Cada fila que falla (sin rostro, código duplicado...) queda en el reporte
+  del trabajo, que se consulta mientras avanza.
+
+Uso por consola:
+    python -m services.bulk_import fotos.zip [--csv empleados.csv]
+    python -m services.bulk_import carpeta_fotos/ --csv empleados.csv
+"""
+import asyncio
+import csv
+import io
+import os
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal
+from models import Employee, FaceTemplate, encode_face_vector, generate_uuid
+from services.encoder_pool import encoder_pool
+from services.gallery import gallery
+from services.photo_store import photo_store
+import config
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+INSERT_BATCH_SIZE = 200
+# Imágenes por trabajo del pool (cada bloque se reparte entre todos los procesos)
+IMAGES_PER_WORKER = 4
+MAX_FINISHED_JOBS = 20
+
+_COLUMN_ALIASES = {
+    "code": ("code", "codigo", "código"),
+    "full_name": ("full_name", "nombre", "name", "nombre_completo"),
+    "photo": ("photo", "foto", "file", "archivo"),
+}
+
+
+# --- Fuentes de fotos ---
+class ZipPhotoSource:
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path)
+        # Nombre del archivo (sin carpetas, en minúsculas) -> nombre dentro del ZIP
+        self._names = {
+            os.path.basename(name).lower(): name
+            for name in self._zip.namelist()
+            if not name.endswith("/") and not os.path.basename(name).startswith(".")
+        }
+
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def read(self, name: str) -> bytes:
+        return self._zip.read(self._names[name.lower()])
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class DirectoryPhotoSource:
+    def __init__(self, path: str):
+        self._root = path
+        self._names = {name.lower(): name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name))}
+
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self._root, self._names[name.lower()]), "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        pass
+
+
+def open_photo_source(path: str):
+    return DirectoryPhotoSource(path) if os.path.isdir(path) else ZipPhotoSource(path)
+
+
+# --- Trabajos ---
+class ImportJob:
+    def __init__(self, source_name: str):
+        self.id = str(uuid.uuid4())
+        self.source_name = source_name
+        self.status = "queued"  # queued | running | done | failed
+        self.total = 0
+        self.processed = 0
+        self.created = 0
+        self.failures: list[dict] = []
+        self.error: Optional[str] = None
+        self.task = None  # asyncio.Task cuando corre dentro del servidor
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    def fail_row(self, row: int, code: str, reason: str) -> None:
+        self.failures.append({"row": row, "code": code, "error": reason})
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "source": self.source_name,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "created": self.created,
+            "failed": len(self.failures),
+            "failures": self.failures,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ImportJobRegistry:
+    """Trabajos en memoria del proceso (se conservan los últimos terminados)."""
+
+    def __init__(self):
+        self._jobs: dict[str, ImportJob] = {}
+        self._lock = threading.Lock()
+
+    def create(self, source_name: str) -> ImportJob:
+        job = ImportJob(source_name)
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.status in ("done", "failed")]
+            for old in sorted(finished, key=lambda j: j.created_at)[:max(0, len(finished) - MAX_FINISHED_JOBS + 1)]:
+                del self._jobs[old.id]
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+
+
+import_jobs = ImportJobRegistry()
+
+
+# --- Lectura del CSV ---
+def parse_rows(csv_text: str, photo_names: list[str], job: ImportJob) -> list[tuple[int, str, str, str]]:
+    """
+    Retorna las filas válidas como (fila, código, nombre, archivo de foto) y
+    registra en el trabajo las inválidas. La fila 1 es el encabezado.
+    """
+    sample = csv_text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(csv_text), dialect)
+
+    header = [h.strip().lower() for h in next(reader, [])]
+    columns = {}
+    for field, aliases in _COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in header:
+                columns[field] = header.index(alias)
+                break
+    if "code" not in columns or "full_name" not in columns:
+        raise ValueError("El CSV debe tener las columnas code y full_name")
+
+    # Fotos por nombre de archivo y por nombre sin extensión (= código)
+    available = {name.lower() for name in photo_names}
+    by_stem = {}
+    for name in photo_names:
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in PHOTO_EXTENSIONS:
+            by_stem.setdefault(stem.lower(), name)
+
+    rows = []
+    seen_codes = set()
+    for row_number, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        cell = lambda field: values[columns[field]].strip() if field in columns and columns[field] < len(values) else ""
+        code, full_name, photo = cell("code"), cell("full_name"), os.path.basename(cell("photo"))
+
+        if not code or not full_name:
+            job.fail_row(row_number, code, "Falta el código o el nombre")
+            continue
+        if code in seen_codes:
+            job.fail_row(row_number, code, "Código repetido en el CSV")
+            continue
+        seen_codes.add(code)
+
+        photo_name = photo if photo and photo.lower() in available else by_stem.get(code.lower())
+        if not photo_name:
+            job.fail_row(row_number, code, "No se encontró la foto")
+            continue
+        rows.append((row_number, code, full_name, photo_name))
+    return rows
+
+
+def _taken_codes(db, codes: list[str]) -> dict[str, bool]:
+    """Códigos que ya existen en la BD -> is_active (una consulta por cada 500 códigos)."""
+    taken = {}
+    for begin in range(0, len(codes), 500):
+        chunk = codes[begin:begin + 500]
+        for code, is_active in db.query(Employee.code, Employee.is_active).filter(Employee.code.in_(chunk)):
+            taken[code] = bool(is_active)
+    return taken
+
+
+# --- Importación ---
+async def run_import(job: ImportJob, source, csv_text: str) -> ImportJob:
+    """Ejecuta el trabajo completo. Cierra `source` al terminar."""
+    job.status = "running"
+    db = SessionLocal()
+    try:
+        rows = parse_rows(csv_text, source.names(), job)
+        job.total = len(rows) + len(job.failures)
+        job.processed = len(job.failures)
+
+        # Validar todos los códigos contra la BD en una sola consulta. La BD, el
+        # ZIP y las fotos se leen/escriben en hilos: el event loop queda libre
+        # para las checadas y aquí solo se espera al pool de encoding
+        taken = await asyncio.to_thread(_taken_codes, db, [code for _, code, _, _ in rows])
+        pending = []
+        for row in rows:
+            row_number, code = row[0], row[1]
+            if code in taken:
+                reason = ("El código ya está registrado" if taken[code]
+                          else "El código pertenece a un empleado desactivado (reactivarlo desde /api/employees)")
+                job.fail_row(row_number, code, reason)
+                job.processed += 1
+            else:
+                pending.append(row)
+
+        chunk_size = max(1, encoder_pool.workers) * IMAGES_PER_WORKER
+        batch = []
+        for begin in range(0, len(pending), chunk_size):
+            chunk = pending[begin:begin + chunk_size]
+            images = await asyncio.to_thread(lambda: [source.read(photo_name) for _, _, _, photo_name in chunk])
+            vectors_per_image = await encoder_pool.encode_batch_background(images)
+
+            for (row_number, code, full_name, _), content, vectors in zip(chunk, images, vectors_per_image):
+                job.processed += 1
+                if vectors is None:
+                    job.fail_row(row_number, code, "Tiempo de procesamiento excedido")
+                elif not vectors:
+                    job.fail_row(row_number, code, "No se detectó ningún rostro en la foto")
+                else:
+                    batch.append((row_number, code, full_name, vectors[0], content))
+
+            if len(batch) >= INSERT_BATCH_SIZE:
+                job.created += await asyncio.to_thread(_insert_batch, db, batch, job)
+                batch = []
+
+        if batch:
+            job.created += await asyncio.to_thread(_insert_batch, db, batch, job)
+
+        # Un solo refresco de la galería para todo el lote (con varios workers
+        # se publica aunque este no la tenga cargada: los demás sí)
+        if job.created and (gallery.loaded or gallery.shared):
+            await asyncio.to_thread(gallery.load, db)
+
+        job.failures.sort(key=lambda failure: failure["row"])
+        job.status = "done"
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e) or e.__class__.__name__
+    finally:
+        job.finished_at = datetime.utcnow()
+        db.close()
+        source.close()
+    return job
+
+
+def _insert_batch(db, batch: list[tuple], job: ImportJob) -> int:
+    """
+    Guarda las fotos de perfil e inserta el lote en una transacción; si
+    falla, fila por fila para aislar el error. Corre fuera del event loop.
+    """
+    batch = [(row_number, code, full_name, vector, photo_store.submit(content, "profiles"))
+             for row_number, code, full_name, vector, content in batch]
+    employees = [_new_employee(code, full_name, vector, photo_url) for _, code, full_name, vector, photo_url in batch]
+    try:
+        db.add_all(employees)
+        db.commit()
+        return len(employees)
+    except IntegrityError:
+        db.rollback()
+
+    created = 0
+    for row_number, code, full_name, vector, photo_url in batch:
+        try:
+            db.add(_new_employee(code, full_name, vector, photo_url))
+            db.commit()
+            created += 1
+        except IntegrityError:
+            db.rollback()
+            job.fail_row(row_number, code, "El código ya está registrado")
+    return created
+
+
+def _new_employee(code: str, full_name: str, vector, photo_url: str) -> Employee:
+    blob = encode_face_vector(vector)
+    employee = Employee(id=generate_uuid(), code=code, full_name=full_name, photo_path=photo_url)
+    employee.face_vector_blob = blob
+    employee.face_templates.append(FaceTemplate(vector_blob=blob, source="enroll", model_version=config.ENCODER_MODEL_VERSION))
+    return employee
+
+
+def read_csv_bytes(content: bytes) -> str:
+    # utf-8-sig quita el BOM que agrega Excel; latin-1 como respaldo
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("latin-1")
+
+
+def csv_from_source(source) -> str:
+    """El CSV incluido en el ZIP/directorio (el primero que se encuentre)."""
+    for name in sorted(source.names()):
+        if name.endswith(".csv"):
+            return read_csv_bytes(source.read(name))
+    raise ValueError("No se encontró un archivo CSV; envíalo por separado")
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import engine, Base
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Alta masiva de empleados desde un ZIP o directorio de fotos")
+    parser.add_argument("source", help="Archivo ZIP o directorio con las fotos")
+    parser.add_argument("--csv", help="CSV con code,full_name[,photo] (por defecto, el incluido en la fuente)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    async def _main():
+        source = open_photo_source(args.source)
+        if args.csv:
+            with open(args.csv, "rb") as f:
+                csv_text = read_csv_bytes(f.read())
+        else:
+            csv_text = csv_from_source(source)
+
+        job = import_jobs.create(os.path.basename(args.source))
+        task = asyncio.create_task(run_import(job, source, csv_text))
+        while not task.done():
+            await asyncio.sleep(1.0)
+            print(f"\r{job.processed}/{job.total} procesadas, {job.created} creadas", end="", flush=True)
+        print()
+        for failure in job.failures:
+            print(f"  Fila {failure['row']} ({failure['code']}): {failure['error']}")
+        if job.error:
+            print(f"Error: {job.error}")
+        print(f"Empleados creados: {job.created} de {job.total}")
+
+    encoder_pool.start()
+    try:
+        started = time.monotonic()
+        asyncio.run(_main())
+        print(f"Tiempo total: {time.monotonic() - started:.1f}s")
+    finally:
+        encoder_pool.shutdown()
+        photo_store.shutdown(wait=True)
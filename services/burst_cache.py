@@ -0,0 +1,216 @@
+"""
+Cachés de corta duración para las ráfagas de los checadores.
+
+Un kiosco suele reenviar varios cuadros casi idénticos en pocos segundos;
+sin caché, cada uno paga detección + encoding antes de que la regla de
+anti-rebote lo descarte.
+
+- FrameCache: por dispositivo (header X-Device-Id), firma del recorte de la
+  cara detectada -> encoding ya calculado. La firma es un hash perceptual
+  (dHash de 64 bits, 9x8 en gris) más una miniatura en gris de 16x16. Un
+  rostro en la misma posición, con el mismo hash (o a pocos bits, ver
+  BURST_FRAME_MAX_BITS) y cuya miniatura casi no difiere píxel a píxel de
+  uno reciente reutiliza ese encoding y se salta el encoding (la detección
+  sí se hace). El hash es del rostro y no del cuadro completo: con el fondo
+  fijo del kiosco, cuadros de personas distintas (o sin nadie) se parecen
+  demasiado.
+  Riesgo: el encoding reutilizado no se vuelve a verificar. Dos personas
+  distintas en el mismo lugar del mismo checador (una fila) pueden dar
+  hashes a pocos bits; por eso por omisión se exige el mismo hash y además
+  se compara la miniatura. Subir BURST_FRAME_MAX_BITS o
+  BURST_FRAME_MAX_PIXEL_DIFF aumenta los aciertos y también el riesgo de
+  registrar a una persona con el encoding de la anterior.
+  Un cuadro sin rostro nunca se guarda.
+- RecentMatches: encodings que coincidieron recientemente con un empleado.
+  Un vector casi igual a uno de ellos se resuelve contra las plantillas de
+  ese empleado, sin buscar en toda la galería.
+
+Solo se reutiliza el encoding o el empleado, nunca la respuesta: las reglas
+de checada se evalúan siempre con el estado actual.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import NamedTuple, Optional
+import numpy as np
+from PIL import Image
+from services import metrics
+from services.face_tracker import iou
+import config
+
+lookups = metrics.registry.counter(
+    "checador_burst_cache_total", "Consultas a los cachés de ráfagas por resultado", ("cache", "result"))
+
+# Marca de "no está en caché"
+MISS = object()
+# Traslape mínimo entre la caja del rostro y la del cuadro guardado
+MIN_BOX_IOU = 0.5
+
+
+# Lado de la miniatura en gris que confirma un acierto del hash
+THUMB_SIDE = 16
+
+
+class FaceSignature(NamedTuple):
+    hash: int  # dHash de 64 bits
+    thumb: np.ndarray  # THUMB_SIDE x THUMB_SIDE en gris (uint8)
+
+
+def face_signature(image: np.ndarray, box: tuple[int, int, int, int]) -> Optional[FaceSignature]:
+    """
+    Firma del recorte de la cara: dHash de 64 bits (en gris a 9x8, un bit por
+    par de píxeles vecinos: ¿el de la izquierda es más brillante?) y la
+    miniatura en gris con la que se confirma. None si el recorte está vacío.
+    """
+    top, right, bottom, left = box
+    crop = image[top:bottom, left:right]
+    if crop.size == 0:
+        return None
+    gray = Image.fromarray(crop).convert("L")
+    pixels = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).reshape(-1)
+    thumb = np.asarray(gray.resize((THUMB_SIDE, THUMB_SIDE), Image.BILINEAR), dtype=np.uint8)
+    return FaceSignature(int(np.packbits(bits).view(">u8")[0]), thumb)
+
+
+def _pixel_diff(a: np.ndarray, b: np.ndarray) -> float:
+    """Diferencia media absoluta entre dos miniaturas (0-255)."""
+    return float(np.abs(a.astype(np.int16) - b.astype(np.int16)).mean())
+
+
+class FrameCache:
+    """Últimos cuadros por dispositivo (LRU de dispositivos, TTL por cuadro)."""
+
+    def __init__(self, ttl_seconds: float, max_devices: int, per_device: int, max_bits: int, max_pixel_diff: float):
+        self.ttl = ttl_seconds
+        self.max_devices = max(1, max_devices)
+        self.per_device = max(1, per_device)
+        self.max_bits = max_bits
+        self.max_pixel_diff = max_pixel_diff
+        self._devices: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def __len__(self) -> int:
+        return sum(len(frames) for frames in self._devices.values())
+
+    def get(self, device_id: str, signature: Optional[FaceSignature], box):
+        """
+        Encoding del rostro reciente con la misma firma y posición, o MISS.
+        El hash solo preselecciona: la miniatura tiene que confirmarlo.
+        """
+        if not self.enabled or not device_id or signature is None:
+            return MISS
+        now = time.monotonic()
+        with self._lock:
+            frames = self._devices.get(device_id)
+            if frames:
+                for stored, stored_box, vector, expires in reversed(frames):
+                    if (expires > now and bin(stored.hash ^ signature.hash).count("1") <= self.max_bits
+                            and iou(stored_box, box) >= MIN_BOX_IOU
+                            and _pixel_diff(stored.thumb, signature.thumb) <= self.max_pixel_diff):
+                        lookups.inc(cache="frame", result="hit")
+                        return vector
+        lookups.inc(cache="frame", result="miss")
+        return MISS
+
+    def put(self, device_id: str, signature: Optional[FaceSignature], box, vector) -> None:
+        if not self.enabled or not device_id or signature is None or not vector:
+            return
+        now = time.monotonic()
+        with self._lock:
+            frames = self._devices.get(device_id)
+            if frames is None:
+                frames = self._devices[device_id] = deque(maxlen=self.per_device)
+                while len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+            else:
+                self._devices.move_to_end(device_id)
+            # Descartar vencidos (los más viejos están al inicio)
+            while frames and frames[0][3] <= now:
+                frames.popleft()
+            frames.append((signature, tuple(box), vector, now + self.ttl))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._devices.clear()
+
+
+class RecentMatches:
+    """
+    Búfer circular (N x 128) con los encodings que coincidieron con un
+    empleado en los últimos segundos; la búsqueda es una sola multiplicación
+    sobre N filas en lugar de toda la galería.
+    """
+
+    def __init__(self, size: int, ttl_seconds: float, max_distance: float, dim: int = 128):
+        self.size = max(1, size)
+        self.ttl = ttl_seconds
+        self.max_distance = max_distance
+        self._vectors = np.zeros((self.size, dim), dtype=np.float32)
+        self._owners: list[Optional[str]] = [None] * self.size
+        self._expires = np.zeros(self.size, dtype=np.float64)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def __len__(self) -> int:
+        return int((self._expires > time.monotonic()).sum())
+
+    def lookup(self, vector) -> Optional[str]:
+        """Empleado de un encoding reciente a menos de max_distance, o None."""
+        if not self.enabled:
+            return None
+        query = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self._vectors.shape[1]:
+            return None
+
+        with self._lock:
+            live = self._expires > time.monotonic()
+            if live.any():
+                sq_dist = ((self._vectors - query) ** 2).sum(axis=1)
+                sq_dist[~live] = np.inf
+                best = int(np.argmin(sq_dist))
+                if sq_dist[best] <= self.max_distance ** 2:
+                    lookups.inc(cache="vector", result="hit")
+                    return self._owners[best]
+        lookups.inc(cache="vector", result="miss")
+        return None
+
+    def add(self, vector, employee_id: str) -> None:
+        if not self.enabled:
+            return
+        row = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if row.shape[0] != self._vectors.shape[1]:
+            return
+        with self._lock:
+            i = self._next
+            self._vectors[i] = row
+            self._owners[i] = employee_id
+            self._expires[i] = time.monotonic() + self.ttl
+            self._next = (i + 1) % self.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires[:] = 0
+
+
+# Instancias únicas por proceso
+frame_cache = FrameCache(
+    ttl_seconds=config.BURST_FRAME_TTL_SECONDS,
+    max_devices=config.BURST_FRAME_MAX_DEVICES,
+    per_device=config.BURST_FRAME_PER_DEVICE,
+    max_bits=config.BURST_FRAME_MAX_BITS,
+    max_pixel_diff=config.BURST_FRAME_MAX_PIXEL_DIFF
+)
+recent_matches = RecentMatches(
+    size=config.RECENT_MATCH_SIZE,
+    ttl_seconds=config.RECENT_MATCH_TTL_SECONDS,
+    max_distance=config.RECENT_MATCH_MAX_DISTANCE
+)
@@ -0,0 +1,136 @@
+"""
+Checada por streaming: un WebSocket por checador que envía cuadros de baja
+resolución de forma continua (ver routers/attendance.py, /api/attendance/stream).
+
+Protocolo:
+- Cliente -> servidor: mensajes binarios, un JPEG/PNG por cuadro.
+- Servidor -> cliente: JSON con un campo "event":
+    {"event": "track",  "track_id": 1, "box": [top, right, bottom, left]}
+    {"event": "result", "track_id": 1, ...campos de CheckInResponse}
+    {"event": "lost",   "track_id": 1}
+    {"event": "busy"}                     cuadro descartado, el pool está saturado
+
+Siempre se procesa el cuadro más reciente: si llegan más rápido de lo que
+se detectan, los intermedios se descartan en lugar de encolarse.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from services import metrics
+from services.encoder_pool import encoder_pool, EncoderBusyError, EncoderTimeoutError
+from services.admission import admission
+from services.face_tracker import FaceTracker, Track
+import config
+import schemas
+
+ROUTE = "/api/attendance/stream"
+
+frames = metrics.registry.counter(
+    "checador_stream_frames_total", "Cuadros recibidos por streaming por resultado (processed, dropped, busy, invalid)", ("result",))
+encodes = metrics.registry.counter(
+    "checador_stream_encodes_total", "Encodings hechos en streaming (uno por rostro seguido, salvo reintentos)")
+
+# (encoding, bytes del cuadro) -> respuesta de la checada
+Register = Callable[[list[float], bytes], Awaitable[schemas.CheckInResponse]]
+
+
+class CheckInStream:
+    def __init__(self, websocket: WebSocket, register: Register, no_face: Callable[[], schemas.CheckInResponse]):
+        self.websocket = websocket
+        self.register = register
+        self.no_face = no_face
+        self.tracker = FaceTracker(
+            iou_threshold=config.STREAM_IOU_THRESHOLD,
+            max_missed=config.STREAM_MAX_MISSED_FRAMES,
+            collect_frames=config.STREAM_COLLECT_FRAMES,
+            max_faces=config.STREAM_MAX_FACES
+        )
+        self._latest: Optional[bytes] = None
+        self._available = asyncio.Event()
+        self._closed = False
+
+    async def run(self) -> None:
+        receiver = asyncio.create_task(self._receive())
+        try:
+            while True:
+                await self._available.wait()
+                self._available.clear()
+                frame, self._latest = self._latest, None
+                if frame is None:
+                    if self._closed:
+                        break
+                    continue
+                await self._process(frame)
+        except (WebSocketDisconnect, RuntimeError):
+            # El cliente cerró mientras se le respondía
+            pass
+        finally:
+            receiver.cancel()
+
+    async def _receive(self) -> None:
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("bytes")
+                if not data:
+                    continue  # Mensajes de texto (p. ej. keep-alive) se ignoran
+                if len(data) > config.STREAM_MAX_FRAME_BYTES:
+                    frames.inc(result="invalid")
+                    continue
+                if self._latest is not None:
+                    frames.inc(result="dropped")
+                self._latest = data
+                self._available.set()
+        finally:
+            self._closed = True
+            self._available.set()
+
+    async def _process(self, frame: bytes) -> None:
+        # Sin request HTTP: las etapas se juntan por cuadro y se publican con la ruta del WebSocket
+        with metrics.collect_stages() as stages:
+            try:
+                # Sin turno propio (los cuadros se descartan solos), pero con la calidad que marque la carga
+                boxes, scores = await encoder_pool.detect(frame, admission.quality())
+            except (EncoderBusyError, EncoderTimeoutError):
+                frames.inc(result="busy")
+                await self._send({"event": "busy"})
+                return
+            frames.inc(result="processed")
+
+            new, ready, lost = self.tracker.update(frame, boxes, scores)
+            for track in new:
+                await self._send({"event": "track", "track_id": track.id, "box": list(track.box)})
+            for track in ready:
+                await self._resolve(track)
+            for track in lost:
+                await self._send({"event": "lost", "track_id": track.id})
+
+        for name, seconds in stages.items():
+            metrics.stage_latency.observe(seconds, route=ROUTE, stage=name)
+
+    async def _resolve(self, track: Track) -> None:
+        """Codifica el cuadro más nítido del rostro y registra la checada (una vez por rostro)."""
+        try:
+            encodes.inc()
+            vector = await encoder_pool.encode_box(track.best_frame, track.best_box)
+        except (EncoderBusyError, EncoderTimeoutError):
+            # Sigue pendiente: se intenta de nuevo con el siguiente cuadro
+            await self._send({"event": "busy", "track_id": track.id})
+            return
+
+        if not vector:
+            if self.tracker.retry(track):
+                return
+            metrics.check_ins.inc(result="no_face")
+            response = self.no_face()
+        else:
+            response = await self.register(vector, track.best_frame)
+
+        track.resolved = True
+        track.best_frame = None  # No retener los bytes del cuadro mientras siga a cuadro
+        await self._send({"event": "result", "track_id": track.id, **response.model_dump(mode="json")})
+
+    async def _send(self, payload: dict) -> None:
+        await self.websocket.send_json(payload)
@@ -0,0 +1,304 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Optional
+from fastapi import HTTPException
+from services import metrics
+from services.burst_cache import FaceSignature
+import config
+
+
+class EncoderBusyError(Exception):
+    """La cola del pool está llena; el cliente debe reintentar."""
+
+
+class EncoderTimeoutError(Exception):
+    """El trabajo excedió el tiempo máximo permitido."""
+
+
+# --- Funciones que se ejecutan dentro de los procesos trabajadores ---
+def _init_worker():
+    # Importar face_recognition carga dlib y los modelos una sola vez por proceso
+    from services.biometric import _recognition
+    _recognition()
+
+
+def _warm_up_job() -> None:
+    from services.biometric import BiometricService
+    BiometricService.warm_up()
+
+
+# Retornan (resultado, tiempos por etapa) para que el request los reporte (ver services/metrics.py)
+# detection_side/upsample: None = configuración normal (ver services/admission.py)
+def _encode_job(file_bytes: bytes, detection_side: Optional[int] = None,
+                upsample: Optional[int] = None) -> tuple[Optional[list[float]], dict]:
+    from services.biometric import BiometricService
+    with metrics.collect_stages() as stages:
+        vectors = BiometricService.vectors_from_image(BytesIO(file_bytes), detection_side=detection_side, upsample=upsample)
+    return (vectors[0] if vectors else None), stages
+
+
+def _encode_batch_job(images: list[bytes], all_faces: bool, detection_side: Optional[int] = None,
+                      upsample: Optional[int] = None) -> tuple[list[list[list[float]]], dict]:
+    from services.biometric import BiometricService
+    with metrics.collect_stages() as stages:
+        vectors = [
+            BiometricService.vectors_from_image(BytesIO(file_bytes), all_faces, detection_side, upsample)
+            for file_bytes in images
+        ]
+    return vectors, stages
+
+
+def _detect_job(frame: bytes, detection_side: Optional[int] = None,
+                upsample: Optional[int] = None) -> tuple[list[tuple[int, int, int, int]], list[float], dict]:
+    """Solo detección (sin encoding) y nitidez de cada cara: para el streaming de cuadros."""
+    from services.biometric import BiometricService
+    with metrics.collect_stages() as stages:
+        try:
+            with metrics.stage("decode"):
+                image = BiometricService.load_image(frame)
+            with metrics.stage("detect"):
+                boxes = BiometricService.detect_faces(image, detection_side, upsample)
+        except Exception as e:
+            print(f"Error procesando cuadro: {e}")
+            return [], [], stages
+        with metrics.stage("sharpness"):
+            scores = [BiometricService.sharpness(image, box) for box in boxes]
+    return boxes, scores, stages
+
+
+def _detect_face_job(frame: bytes, detection_side: Optional[int] = None,
+                     upsample: Optional[int] = None) -> tuple[Optional[tuple[int, int, int, int]], Optional[FaceSignature], dict]:
+    """Caja de la cara más grande y firma de su recorte (clave del caché de ráfagas); (None, None) sin cara."""
+    from services.biometric import BiometricService
+    from services.burst_cache import face_signature
+    with metrics.collect_stages() as stages:
+        try:
+            with metrics.stage("decode"):
+                image = BiometricService.load_image(frame)
+            with metrics.stage("detect"):
+                boxes = BiometricService.detect_faces(image, detection_side, upsample)
+        except Exception as e:
+            print(f"Error procesando imagen: {e}")
+            return None, None, stages
+        if not boxes:
+            return None, None, stages
+        box = max(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+        with metrics.stage("face_hash"):
+            key = face_signature(image, box)
+    return box, key, stages
+
+
+def _encode_box_job(frame: bytes, box: tuple[int, int, int, int]) -> tuple[Optional[list[float]], dict]:
+    """Encoding de una caja ya detectada en el cuadro (se salta la detección)."""
+    from services.biometric import BiometricService
+    with metrics.collect_stages() as stages:
+        try:
+            with metrics.stage("decode"):
+                image = BiometricService.load_image(frame)
+            with metrics.stage("encode_face"):
+                encoding = BiometricService.encode_face(image, tuple(box))
+        except Exception as e:
+            print(f"Error procesando cuadro: {e}")
+            encoding = None
+    return (encoding.tolist() if encoding is not None else None), stages
+
+
+class EncoderPool:
+    """
+    Ejecuta el encoding facial (detección HOG + ResNet de dlib) fuera del
+    event loop, en un pool de procesos para aprovechar todos los núcleos.
+
+    - Cola acotada: si hay más de `max_pending` trabajos, se rechaza de inmediato.
+    - Timeout por trabajo: el request deja de esperar pasado `timeout` segundos.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _create_executor(self):
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=2, thread_name_prefix="encoder")
+        # 'spawn' funciona igual en Windows, Linux y dentro del ejecutable de PyInstaller
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    async def run(self, fn, *args):
+        """Ejecuta fn(*args) en el pool respetando la cola acotada y el timeout."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise EncoderBusyError()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = self._create_executor()
+            executor = self._executor
+
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # El lugar en la cola se libera cuando el trabajo termina de verdad: un
+        # trabajo que excedió el timeout sigue ocupando a un proceso
+        future.add_done_callback(lambda _: self._release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()  # Solo tiene efecto si todavía no empezaba
+            raise EncoderTimeoutError()
+        except BrokenProcessPool:
+            # Un trabajador murió (p. ej. imagen corrupta que tumbó a dlib): recrear el pool
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise EncoderBusyError()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def warm_up(self) -> None:
+        """
+        Un encoding de prueba por trabajador: arranca los procesos (el pool los
+        crea bajo demanda) y deja dlib cargado en cada uno.
+        """
+        # Sin el timeout de run(): la primera carga de dlib puede tardar más que un encoding
+        self.start()
+        with self._lock:
+            executor = self._executor
+        futures = [executor.submit(_warm_up_job) for _ in range(max(1, self.workers))]
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+
+    async def encode(self, file_bytes: bytes, quality=None) -> Optional[list[float]]:
+        # "encoder" incluye la espera en la cola; decode/detect/encode_face vienen del trabajador
+        with metrics.stage("encoder"):
+            vector, stages = await self.run(_encode_job, file_bytes, *_detection_args(quality))
+        metrics.add_stages(stages)
+        return vector
+
+    async def encode_batch(self, images: list[bytes], all_faces: bool = False, quality=None) -> list[list[list[float]]]:
+        """
+        Codifica varias imágenes repartiéndolas en tantos trabajos como procesos
+        haya (no uno por imagen), para no saturar la cola con un solo lote.
+        Retorna, por imagen, la lista de encodings encontrados.
+        """
+        if not images:
+            return []
+        chunks = max(1, min(len(images), self.workers))
+        size = -(-len(images) // chunks)
+        parts = [images[i:i + size] for i in range(0, len(images), size)]
+        with metrics.stage("encoder"):
+            results = await asyncio.gather(*(self.run(_encode_batch_job, part, all_faces, *_detection_args(quality)) for part in parts))
+        for _, stages in results:
+            metrics.add_stages(stages)
+        return [vectors for part, _ in results for vectors in part]
+
+    async def encode_batch_background(self, images: list[bytes], busy_retries: int = 30) -> list[Optional[list[list[float]]]]:
+        """
+        encode_batch para trabajos en segundo plano (alta masiva, regeneración):
+        si el pool está ocupado con checadas espera y reintenta. None por
+        imagen si no respondió a tiempo.
+        """
+        for _ in range(busy_retries):
+            try:
+                return await self.encode_batch(images)
+            except EncoderBusyError:
+                await asyncio.sleep(1.0)
+            except EncoderTimeoutError:
+                break
+        return [None] * len(images)
+
+    async def detect(self, frame: bytes, quality=None) -> tuple[list[tuple[int, int, int, int]], list[float]]:
+        """Cajas de las caras del cuadro (coordenadas de load_image) y su nitidez."""
+        with metrics.stage("encoder"):
+            boxes, scores, stages = await self.run(_detect_job, frame, *_detection_args(quality))
+        metrics.add_stages(stages)
+        return boxes, scores
+
+    async def detect_face(self, frame: bytes, quality=None) -> tuple[Optional[tuple[int, int, int, int]], Optional[FaceSignature]]:
+        """(caja de la cara más grande, firma de su recorte) o (None, None) si no hay cara."""
+        with metrics.stage("encoder"):
+            box, key, stages = await self.run(_detect_face_job, frame, *_detection_args(quality))
+        metrics.add_stages(stages)
+        return box, key
+
+    async def encode_box(self, frame: bytes, box: tuple[int, int, int, int]) -> Optional[list[float]]:
+        with metrics.stage("encoder"):
+            vector, stages = await self.run(_encode_box_job, frame, box)
+        metrics.add_stages(stages)
+        return vector
+
+
+def _detection_args(quality) -> tuple[Optional[int], Optional[int]]:
+    """(detection_side, upsample) de un nivel de services.admission.Quality; None = configuración normal."""
+    if quality is None:
+        return None, None
+    return quality.detection_side, quality.upsample
+
+
+encoder_pool = EncoderPool(
+    workers=config.ENCODER_WORKERS,
+    max_pending=config.ENCODER_MAX_PENDING,
+    timeout=config.ENCODER_TIMEOUT_SECONDS
+)
+
+
+async def encode_image_or_raise(file_bytes: bytes, quality=None) -> Optional[list[float]]:
+    """Atajo para los routers: traduce la saturación del pool a errores HTTP."""
+    return await _run_or_raise(encoder_pool.encode(file_bytes, quality))
+
+
+async def encode_batch_or_raise(images: list[bytes], all_faces: bool = False, quality=None) -> list[list[list[float]]]:
+    return await _run_or_raise(encoder_pool.encode_batch(images, all_faces, quality))
+
+
+async def detect_face_or_raise(frame: bytes, quality=None) -> tuple[Optional[tuple[int, int, int, int]], Optional[FaceSignature]]:
+    return await _run_or_raise(encoder_pool.detect_face(frame, quality))
+
+
+async def encode_box_or_raise(frame: bytes, box: tuple[int, int, int, int]) -> Optional[list[float]]:
+    return await _run_or_raise(encoder_pool.encode_box(frame, box))
+
+
+async def _run_or_raise(job):
+    try:
+        return await job
+    except EncoderBusyError:
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado procesando otros rostros. Intente de nuevo en unos segundos.",
+            headers={"Retry-After": "1"}
+        )
+    except EncoderTimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="El procesamiento de la imagen tardó demasiado. Intente de nuevo."
+        )
@@ -0,0 +1,233 @@
+import numpy as np
+from typing import Optional
+
+
+def _sq_norms(matrix: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+class BruteForceIndex:
+    """
+    Índice exacto: todas las filas en una matriz contigua y una sola
+    multiplicación matriz-vector por búsqueda. Ideal hasta algunos miles de filas.
+
+    Las modificaciones publican arreglos nuevos (copy-on-write); las búsquedas
+    no toman lock. Las escrituras las serializa FaceGallery.
+    """
+
+    name = "exact"
+    needs_rebuild = False
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._snapshot = self._pack(np.empty((0, dim), dtype=np.float32), np.empty(0, dtype=object))
+
+    def __len__(self) -> int:
+        return len(self._snapshot[2])
+
+    def build(self, matrix: np.ndarray, owners: np.ndarray) -> None:
+        self._snapshot = self._pack(matrix, owners)
+
+    def replace(self, owner: str, rows: Optional[np.ndarray]) -> None:
+        """Quita las filas de `owner` y agrega `rows` (None para solo quitar)."""
+        matrix, _, owners = self._snapshot
+        keep = owners != owner
+        if not keep.all():
+            matrix = matrix[keep]
+            owners = owners[keep]
+        if rows is not None and len(rows) > 0:
+            matrix = np.vstack([matrix, rows])
+            owners = np.concatenate([owners, np.array([owner] * len(rows), dtype=object)])
+        self._snapshot = self._pack(matrix, owners)
+
+    def candidates(self, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Retorna (dueños, distancias²) exactas de las filas candidatas (aquí: todas)."""
+        matrix, sq_norms, owners = self._snapshot
+        if len(owners) == 0:
+            return owners, np.empty(0, dtype=np.float32)
+        # ||a - b||² = ||a||² + ||b||² - 2·a·b
+        sq_dist = sq_norms + np.dot(query, query) - 2.0 * (matrix @ query)
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        return owners, sq_dist
+
+    def nearest_batch(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Fila más cercana para cada consulta: (dueños, distancias²); dueño None si está vacío."""
+        matrix, sq_norms, owners = self._snapshot
+        if len(owners) == 0:
+            return np.array([None] * len(queries), dtype=object), np.full(len(queries), np.inf)
+        sq_dist = sq_norms[np.newaxis, :] + _sq_norms(queries)[:, np.newaxis] - 2.0 * (queries @ matrix.T)
+        best = np.argmin(sq_dist, axis=1)
+        best_sq = np.maximum(sq_dist[np.arange(len(queries)), best], 0.0)
+        return owners[best], best_sq
+
+    @staticmethod
+    def _pack(matrix: np.ndarray, owners: np.ndarray) -> tuple:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        return (matrix, _sq_norms(matrix), owners)
+
+
+class IVFIndex:
+    """
+    Índice aproximado tipo IVF (inverted file) en NumPy puro.
+
+    Las filas se reparten en `nlist` particiones con k-means; una búsqueda
+    compara la consulta contra los centroides, revisa solo las `nprobe`
+    particiones más cercanas y calcula distancias exactas sobre esas filas
+    (re-rank exacto), de modo que el umbral se aplica sobre distancias reales.
+
+    Inserciones y bajas son incrementales: solo se copia la partición
+    afectada. Con menos de `min_rows` filas se comporta como búsqueda exacta.
+    """
+
+    name = "ivf"
+
+    def __init__(self, dim: int, nlist: int = 0, nprobe: int = 8, min_rows: int = 2000,
+                 train_sample: int = 20000, iterations: int = 10, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.train_sample = train_sample
+        self.iterations = iterations
+        self.seed = seed
+        self._built_rows = 0
+        # Estado publicado de una sola vez: (centroides, particiones, dueño -> partición)
+        self._state = self._empty_state()
+
+    def __len__(self) -> int:
+        return sum(len(part[2]) for part in self._state[1])
+
+    @property
+    def partitions(self) -> int:
+        return len(self._state[1])
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """La galería creció lo suficiente como para re-entrenar las particiones."""
+        rows = len(self)
+        if rows >= self.min_rows and self.partitions == 1:
+            return True
+        return rows > 4 * max(self._built_rows, self.min_rows)
+
+    # --- Construcción ---
+    def build(self, matrix: np.ndarray, owners: np.ndarray) -> None:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self._built_rows = len(matrix)
+        if len(matrix) < self.min_rows:
+            # Galería pequeña: una sola partición = búsqueda exacta
+            centroids = matrix.mean(axis=0, keepdims=True) if len(matrix) else np.zeros((1, self.dim), dtype=np.float32)
+            assignments = np.zeros(len(matrix), dtype=np.int64)
+        else:
+            centroids = self._train(matrix)
+            assignments = self._assign(matrix, centroids)
+
+        # Agrupar filas por partición con un solo ordenamiento
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+        parts = []
+        owner_part = {}
+        for p in range(len(centroids)):
+            rows = order[bounds[p]:bounds[p + 1]]
+            parts.append(BruteForceIndex._pack(matrix[rows], owners[rows]))
+            for owner in set(owners[rows]):
+                owner_part.setdefault(owner, set()).add(p)
+        self._state = (centroids.astype(np.float32), parts, owner_part)
+
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        """k-means (Lloyd) sobre una muestra de la galería."""
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(np.sqrt(len(matrix))))
+        nlist = min(nlist, len(matrix))
+
+        sample = matrix
+        if len(matrix) > self.train_sample:
+            sample = matrix[rng.choice(len(matrix), self.train_sample, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+            # Particiones vacías: re-sembrar con puntos al azar
+            if empty.any():
+                centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        return centroids
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        sq = _sq_norms(centroids)[np.newaxis, :] - 2.0 * (matrix @ centroids.T)
+        return np.argmin(sq, axis=1)
+
+    # --- Mantenimiento incremental ---
+    def replace(self, owner: str, rows: Optional[np.ndarray]) -> None:
+        centroids, parts, owner_part = self._state
+        parts = list(parts)
+        owner_part = dict(owner_part)
+
+        for p in owner_part.pop(owner, ()):
+            matrix, _, owners = parts[p]
+            keep = owners != owner
+            parts[p] = BruteForceIndex._pack(matrix[keep], owners[keep])
+
+        if rows is not None and len(rows) > 0:
+            rows = np.ascontiguousarray(rows, dtype=np.float32)
+            assignments = self._assign(rows, centroids)
+            for p in np.unique(assignments):
+                new_rows = rows[assignments == p]
+                matrix, _, owners = parts[p]
+                parts[p] = BruteForceIndex._pack(
+                    np.vstack([matrix, new_rows]),
+                    np.concatenate([owners, np.array([owner] * len(new_rows), dtype=object)])
+                )
+            owner_part[owner] = set(int(p) for p in np.unique(assignments))
+
+        self._state = (centroids, parts, owner_part)
+
+    # --- Búsqueda ---
+    def candidates(self, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        centroids, parts, _ = self._state
+        probes = self._probes(query[np.newaxis, :], centroids)[0]
+
+        selected = [parts[p] for p in probes if len(parts[p][2]) > 0]
+        if not selected:
+            return np.empty(0, dtype=object), np.empty(0, dtype=np.float32)
+        matrix = np.concatenate([part[0] for part in selected]) if len(selected) > 1 else selected[0][0]
+        sq_norms = np.concatenate([part[1] for part in selected]) if len(selected) > 1 else selected[0][1]
+        owners = np.concatenate([part[2] for part in selected]) if len(selected) > 1 else selected[0][2]
+
+        # Re-rank exacto sobre las filas candidatas
+        sq_dist = sq_norms + np.dot(query, query) - 2.0 * (matrix @ query)
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        return owners, sq_dist
+
+    def nearest_batch(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        best_owners = np.array([None] * len(queries), dtype=object)
+        best_sq = np.full(len(queries), np.inf)
+        for i, query in enumerate(queries):
+            owners, sq_dist = self.candidates(query)
+            if len(owners) > 0:
+                j = int(np.argmin(sq_dist))
+                best_owners[i] = owners[j]
+                best_sq[i] = sq_dist[j]
+        return best_owners, best_sq
+
+    def _probes(self, queries: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        nprobe = max(1, min(self.nprobe, len(centroids)))
+        sq = _sq_norms(centroids)[np.newaxis, :] - 2.0 * (queries @ centroids.T)
+        if nprobe >= len(centroids):
+            return np.tile(np.arange(len(centroids)), (len(queries), 1))
+        return np.argpartition(sq, nprobe - 1, axis=1)[:, :nprobe]
+
+    def _empty_state(self) -> tuple:
+        empty = BruteForceIndex._pack(np.empty((0, self.dim), dtype=np.float32), np.empty(0, dtype=object))
+        return (np.zeros((1, self.dim), dtype=np.float32), [empty], {})
+
+
+def create_index(kind: str, dim: int, **options):
+    """Crea el índice configurado: "exact" (por defecto) o "ivf"."""
+    if kind == "ivf":
+        return IVFIndex(dim, **options)
+    return BruteForceIndex(dim)
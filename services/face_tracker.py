@@ -0,0 +1,125 @@
+"""
+Seguimiento de rostros entre cuadros de un mismo checador (streaming).
+
+Cada cuadro solo pasa por la detección; las cajas se asocian a los rostros
+del cuadro anterior por traslape (IoU). Un rostro nuevo acumula algunos
+cuadros, se queda con el más nítido y solo ese se codifica y se busca en
+la galería: un encoding por persona en lugar de uno por cuadro.
+"""
+import itertools
+from typing import Optional
+
+Box = tuple[int, int, int, int]  # (top, right, bottom, left), como face_recognition
+
+
+def iou(a: Box, b: Box) -> float:
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left:
+        return 0.0
+    inter = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def _area(box: Box) -> int:
+    return (box[2] - box[0]) * (box[1] - box[3])
+
+
+class Track:
+    """Un rostro seguido a través de los cuadros."""
+
+    __slots__ = ("id", "box", "frames", "missed", "attempts", "resolved",
+                 "best_frame", "best_box", "best_score")
+
+    def __init__(self, track_id: int, box: Box):
+        self.id = track_id
+        self.box = box
+        self.frames = 0        # Cuadros acumulados en el intento actual
+        self.missed = 0        # Cuadros seguidos sin verlo
+        self.attempts = 0      # Encodings intentados
+        self.resolved = False  # Ya se codificó y se respondió
+        self.best_frame: Optional[bytes] = None
+        self.best_box: Optional[Box] = None
+        self.best_score = -1.0
+
+    def observe(self, frame: bytes, box: Box, score: float) -> None:
+        self.box = box
+        self.missed = 0
+        if self.resolved:
+            return
+        self.frames += 1
+        if score > self.best_score:
+            self.best_frame, self.best_box, self.best_score = frame, box, score
+
+    def reset_best(self) -> None:
+        self.frames = 0
+        self.best_frame, self.best_box, self.best_score = None, None, -1.0
+
+
+class FaceTracker:
+    """
+    Rostros visibles en un checador. update() recibe las cajas de cada cuadro
+    y retorna qué rostros aparecieron, cuáles ya tienen suficientes cuadros
+    para codificarse y cuáles se perdieron.
+    """
+
+    def __init__(self, iou_threshold: float, max_missed: int, collect_frames: int,
+                 max_faces: int, max_attempts: int = 2):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max(0, max_missed)
+        self.collect_frames = max(1, collect_frames)
+        self.max_faces = max(1, max_faces)
+        self.max_attempts = max(1, max_attempts)
+        self.tracks: list[Track] = []
+        self._ids = itertools.count(1)
+
+    def update(self, frame: bytes, boxes: list[Box], scores: list[float]) -> tuple[list[Track], list[Track], list[Track]]:
+        """Retorna (nuevos, listos para codificar, perdidos)."""
+        detections = sorted(zip(boxes, scores), key=lambda item: _area(item[0]), reverse=True)[:self.max_faces]
+
+        # Asociación voraz: primero los pares con mayor traslape
+        pairs = sorted(
+            ((iou(track.box, box), t, d) for t, track in enumerate(self.tracks) for d, (box, _) in enumerate(detections)),
+            reverse=True
+        )
+        matched_tracks, matched_detections = set(), set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            box, score = detections[d]
+            self.tracks[t].observe(frame, tuple(box), score)
+
+        lost = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    lost.append(track)
+
+        new = []
+        for d, (box, score) in enumerate(detections):
+            if d not in matched_detections:
+                track = Track(next(self._ids), tuple(box))
+                track.observe(frame, tuple(box), score)
+                new.append(track)
+
+        self.tracks = [track for track in self.tracks if track not in lost] + new
+
+        ready = [track for track in self.tracks if not track.resolved and track.frames >= self.collect_frames]
+        # Un rostro que se va antes de juntar los cuadros se codifica con lo que haya
+        ready.extend(track for track in lost if not track.resolved and track.best_frame is not None)
+        return new, ready, lost
+
+    def retry(self, track: Track) -> bool:
+        """Descarta el cuadro elegido (no dio encoding) para juntar otros; False si ya no hay intentos."""
+        track.attempts += 1
+        if track.attempts >= self.max_attempts or track not in self.tracks:
+            return False
+        track.reset_best()
+        return True
@@ -0,0 +1,325 @@
+import threading
+import numpy as np
+from typing import Optional
+from sqlalchemy.orm import Session
+from models import Employee, FaceTemplate, decode_face_vector
+from services.face_index import create_index
+from services.shared_gallery import SharedGalleryStore
+import config
+
+VECTOR_DIM = 128
+
+
+class FaceGallery:
+    """
+    Galería en memoria con las plantillas biométricas de los empleados activos.
+
+    Los vectores viven en matrices contiguas float32 (N x 128) junto con un
+    arreglo paralelo con el ID del empleado dueño de cada fila, de modo que
+    una búsqueda es una operación vectorizada en lugar de un ciclo en Python
+    por empleado. El almacenamiento y la búsqueda los resuelve un índice
+    intercambiable (ver services/face_index.py): exacto o IVF aproximado.
+
+    Un empleado puede tener varias plantillas; la distancia se reduce a una por
+    empleado según `reduce`:
+    - "min": cada plantilla es una fila y gana la más cercana.
+    - "centroid": se guarda una sola fila con el promedio de sus plantillas.
+
+    El índice publica arreglos nuevos en cada modificación (copy-on-write),
+    así que una búsqueda en curso siempre ve una instantánea consistente sin
+    necesidad de tomar el lock; las escrituras se serializan aquí.
+
+    Con varios workers (`shared`, ver services/shared_gallery.py) las
+    plantillas se leen de archivos mapeados en memoria: cada cambio publica
+    una generación nueva y los demás workers la adoptan en su siguiente
+    búsqueda, sin consultar la BD.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM, reduce: str = "min", index_factory=None,
+                 shared: Optional[SharedGalleryStore] = None):
+        self.dim = dim
+        self.reduce = reduce
+        self._index_factory = index_factory or (lambda: create_index("exact", dim))
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._templates: dict[str, np.ndarray] = {}
+        self._index = self._index_factory()
+        self._shared = shared
+        self._generation = 0   # Generación compartida que refleja este worker
+        self._stale = False    # invalidate(): la siguiente carga vuelve a leer la BD
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def employee_count(self) -> int:
+        return len(self._templates)
+
+    @property
+    def shared(self) -> bool:
+        return self._shared is not None
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    # --- Carga ---
+    def load(self, db: Session) -> None:
+        """Reconstruye la galería completa desde la tabla de plantillas (y la publica a los demás workers)."""
+        with self._lock:
+            if self._shared is None:
+                self._load_locked(db)
+                return
+            with self._shared.lock():
+                self._publish_locked(self._query_templates(db))
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded and not self._behind():
+            return
+        with self._lock:
+            if self._loaded and not self._behind():
+                return
+            if self._shared is None:
+                self._load_locked(db)
+                return
+            with self._shared.lock():
+                generation = self._shared.generation
+                if generation and not self._stale:
+                    # Otro worker ya la publicó (o la cambió): se mapea sin consultar la BD
+                    self._adopt_locked(generation)
+                else:
+                    self._publish_locked(self._query_templates(db))
+
+    def _behind(self) -> bool:
+        # Lectura de 16 bytes mapeados: barata en cada búsqueda
+        return self._shared is not None and self._shared.generation != self._generation
+
+    def _load_locked(self, db: Session) -> None:
+        self._templates = self._query_templates(db)
+        self._rebuild_index_locked()
+        self._loaded = True
+
+    def _query_templates(self, db: Session) -> dict[str, np.ndarray]:
+        # Solo se leen las columnas necesarias; el blob se decodifica sin copiar
+        rows = db.query(FaceTemplate.employee_id, FaceTemplate.vector_blob)\
+            .join(Employee, Employee.id == FaceTemplate.employee_id)\
+            .filter(Employee.is_active == True)\
+            .order_by(FaceTemplate.employee_id, FaceTemplate.created_at_utc)\
+            .all()
+
+        grouped: dict[str, list[np.ndarray]] = {}
+        for employee_id, blob in rows:
+            vector = self._as_vector(decode_face_vector(blob))
+            if vector is not None:
+                grouped.setdefault(employee_id, []).append(vector)
+
+        return {employee_id: np.vstack(vectors) for employee_id, vectors in grouped.items()}
+
+    def _rebuild_index_locked(self) -> None:
+        owners = []
+        entries = []
+        for employee_id, templates in self._templates.items():
+            employee_rows = self._entries_for(templates)
+            entries.append(employee_rows)
+            owners.extend([employee_id] * len(employee_rows))
+
+        matrix = np.vstack(entries) if entries else np.empty((0, self.dim), dtype=np.float32)
+        # Se construye un índice nuevo y se publica al final (las búsquedas siguen usando el anterior)
+        index = self._index_factory()
+        index.build(matrix, np.array(owners, dtype=object))
+        self._index = index
+
+    # --- Galería compartida (varios workers) ---
+    def _publish_locked(self, templates: dict[str, np.ndarray]) -> None:
+        """Publica la galería completa como generación nueva y la adopta."""
+        owners = []
+        for employee_id, employee_templates in templates.items():
+            owners.extend([employee_id] * len(employee_templates))
+        matrix = np.vstack(list(templates.values())) if templates else np.empty((0, self.dim), dtype=np.float32)
+        self._adopt_locked(self._shared.publish(matrix, owners))
+
+    def _publish_change_locked(self, employee_id: str, templates: Optional[np.ndarray]) -> None:
+        """Reemplaza (o quita, con None) las plantillas de un empleado en la generación vigente."""
+        generation = self._shared.generation
+        if not generation:
+            return  # Nadie ha cargado la galería: la primera carga leerá este cambio de la BD
+        matrix, owners = self._shared.read(generation)
+        keep = owners != employee_id
+        if templates is None and keep.all():
+            return
+        matrix, owners = matrix[keep], owners[keep]
+        if templates is not None:
+            matrix = np.vstack([matrix, templates])
+            owners = np.concatenate([owners, np.array([employee_id] * len(templates), dtype=str)])
+        self._adopt_locked(self._shared.publish(matrix, owners))
+
+    def _adopt_locked(self, generation: int) -> None:
+        """Mapea una generación publicada y reconstruye el índice de este worker sobre ella."""
+        matrix, owners = self._shared.read(generation)
+        templates = {}
+        if len(owners):
+            # Las filas vienen agrupadas por empleado: cada grupo es una vista, sin copiar
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            ends = np.r_[starts[1:], len(owners)]
+            templates = {str(owners[start]): matrix[start:end] for start, end in zip(starts, ends)}
+        self._templates = templates
+
+        if self.reduce == "centroid":
+            self._rebuild_index_locked()
+        else:
+            # Las filas del índice son las mismas plantillas: el índice usa la matriz mapeada
+            index = self._index_factory()
+            index.build(matrix, np.asarray(owners, dtype=object))
+            self._index = index
+        self._generation = generation
+        self._stale = False
+        self._loaded = True
+
+    # --- Mantenimiento (llamado desde routers/employees.py y services/templates.py) ---
+    def set_employee(self, employee_id: str, vectors) -> None:
+        """Reemplaza todas las plantillas de un empleado (lista o matriz de vectores)."""
+        templates = [v for v in (self._as_vector(vector) for vector in vectors) if v is not None]
+        if not templates:
+            self.remove(employee_id)
+            return
+        with self._lock:
+            if self._shared is not None:
+                with self._shared.lock():
+                    self._publish_change_locked(employee_id, np.vstack(templates))
+                return
+            if not self._loaded:
+                # Se cargará completa (ya con este cambio) en la próxima búsqueda
+                return
+            self._templates[employee_id] = np.vstack(templates)
+            self._index.replace(employee_id, self._entries_for(self._templates[employee_id]))
+            if self._index.needs_rebuild:
+                self._rebuild_index_locked()
+
+    def upsert(self, employee_id: str, face_vector) -> None:
+        """Atajo para empleados con una sola plantilla."""
+        self.set_employee(employee_id, [face_vector])
+
+    def remove(self, employee_id: str) -> None:
+        """Quita a un empleado de la galería (p. ej. al desactivarlo)."""
+        with self._lock:
+            if self._shared is not None:
+                with self._shared.lock():
+                    self._publish_change_locked(employee_id, None)
+                return
+            if not self._loaded:
+                return
+            if self._templates.pop(employee_id, None) is None:
+                return
+            self._index.replace(employee_id, None)
+
+    def employee_vectors(self, employee_id: str) -> np.ndarray:
+        """Plantillas en memoria de un empleado (matriz vacía si no tiene)."""
+        return self._templates.get(employee_id, np.empty((0, self.dim), dtype=np.float32))
+
+    def invalidate(self) -> None:
+        """Fuerza una recarga completa (desde la BD) en la siguiente búsqueda."""
+        with self._lock:
+            self._loaded = False
+            self._stale = True
+
+    # --- Búsqueda ---
+    def search(self, incoming_vector, k: int = 1) -> list[tuple[str, float]]:
+        """
+        Retorna los k empleados más cercanos como (employee_id, distancia),
+        ordenados de menor a mayor distancia euclidiana. Con varias plantillas
+        por empleado, cada uno aparece una sola vez con su mejor distancia.
+        """
+        query = self._as_vector(incoming_vector)
+        if query is None:
+            return []
+
+        owners, sq_dist = self._index.candidates(query)
+        n = len(owners)
+        if n == 0:
+            return []
+
+        # Los k mejores empleados están entre las k * (plantillas por empleado) mejores filas
+        per_employee = 1 if self.reduce == "centroid" else max(1, config.MAX_TEMPLATES_PER_EMPLOYEE)
+        candidates = min(n, max(1, k) * per_employee)
+        while True:
+            if candidates < n:
+                top = np.argpartition(sq_dist, candidates - 1)[:candidates]
+                top = top[np.argsort(sq_dist[top])]
+            else:
+                top = np.argsort(sq_dist)
+
+            results = []
+            seen = set()
+            for i in top:
+                owner = owners[i]
+                if owner in seen:
+                    continue
+                seen.add(owner)
+                results.append((owner, float(np.sqrt(sq_dist[i]))))
+                if len(results) == k:
+                    return results
+
+            if candidates >= n:
+                return results
+            # Algún empleado excede el máximo de plantillas: ampliar la ventana
+            candidates = n
+
+    def search_batch(self, incoming_vectors) -> list[tuple[Optional[str], float]]:
+        """
+        Busca el empleado más cercano para cada vector de entrada (M x 128);
+        con el índice exacto es una sola multiplicación de matrices. Retorna una lista de
+        (employee_id, distancia); (None, inf) si la galería está vacía o el
+        vector no tiene la dimensión correcta.
+        """
+        queries = [self._as_vector(v) for v in incoming_vectors]
+        valid = [i for i, q in enumerate(queries) if q is not None]
+        results = [(None, float("inf"))] * len(queries)
+        if not valid or len(self._index) == 0:
+            return results
+
+        # La fila más cercana ya es la mínima por empleado
+        owners, sq_dist = self._index.nearest_batch(np.vstack([queries[i] for i in valid]))
+        for row, i in enumerate(valid):
+            if owners[row] is not None:
+                results[i] = (owners[row], float(np.sqrt(sq_dist[row])))
+        return results
+
+    # --- Auxiliares ---
+    def _entries_for(self, templates: np.ndarray) -> np.ndarray:
+        """Filas que representan a un empleado en la matriz de búsqueda."""
+        if self.reduce == "centroid":
+            return templates.mean(axis=0, keepdims=True).astype(np.float32)
+        return templates
+
+    def _as_vector(self, value) -> Optional[np.ndarray]:
+        if value is None:
+            return None
+        vector = np.asarray(value, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            return None
+        return vector
+
+
+def _configured_index():
+    return create_index(
+        config.INDEX_TYPE,
+        VECTOR_DIM,
+        **({"nlist": config.IVF_NLIST, "nprobe": config.IVF_NPROBE, "min_rows": config.IVF_MIN_ROWS}
+           if config.INDEX_TYPE == "ivf" else {})
+    )
+
+
+# Instancia única por proceso, compartida por todos los requests
+gallery = FaceGallery(
+    reduce=config.TEMPLATE_REDUCE,
+    index_factory=_configured_index,
+    shared=SharedGalleryStore(config.SHARED_GALLERY_DIR, VECTOR_DIM) if config.MULTI_WORKER else None
+)
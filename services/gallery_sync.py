@@ -0,0 +1,145 @@
+"""
+Sincronización delta de la galería para kioscos que comparan localmente.
+
+Cada alta, cambio, desactivación o plantilla aprendida sube la revisión
+del empleado (ver models.next_revision). El kiosco guarda la última
+revisión que aplicó y pide solo lo posterior; si nada cambió la respuesta
+es la cabecera sola (32 bytes).
+
+Formato binario (little-endian):
+
+    cabecera   "GSYN", versión u8, reservado u8, dimensión u16,
+               next_since u64, latest u64, entradas u32, reservado u32
+    entrada    operación u8 (1 = alta/cambio, 0 = baja), plantillas u8,
+               id (u8 + utf-8), código (u8 + utf-8), nombre (u16 + utf-8),
+               plantillas x dimensión float32
+
+Una baja no trae código, nombre ni plantillas. next_since es la revisión
+a enviar en la siguiente consulta; si es menor que latest hay más páginas.
+Si latest es menor que la revisión del kiosco (BD restaurada o cambiada),
+el kiosco debe descartar su copia y descargar todo de nuevo con since=0.
+"""
+import struct
+from typing import NamedTuple
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Employee, FaceTemplate, decode_face_vector
+from services.gallery import VECTOR_DIM
+
+SYNC_MAGIC = b"GSYN"
+SYNC_VERSION = 1
+UPSERT = 1
+REMOVE = 0
+_HEADER = struct.Struct("<4sBxHQQI4x")
+_ENTRY = struct.Struct("<BB")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+MEDIA_TYPE = "application/vnd.checador.gallery-sync"
+
+
+class SyncEntry(NamedTuple):
+    op: int
+    employee_id: str
+    code: str
+    full_name: str
+    templates: np.ndarray  # plantillas x dimensión (vacía en una baja)
+
+
+class SyncPage(NamedTuple):
+    next_since: int
+    latest: int
+    entries: list[SyncEntry]
+
+
+def read_changes(db: Session, since: int, limit: int) -> SyncPage:
+    """
+    Empleados con revisión mayor a `since` (hasta `limit`), en orden de
+    revisión, con sus plantillas actuales. Con since=0 (descarga inicial)
+    se omiten las bajas.
+    """
+    latest = db.query(func.max(Employee.revision)).scalar() or 0
+    query = db.query(Employee.id, Employee.code, Employee.full_name, Employee.is_active, Employee.revision)\
+        .filter(Employee.revision > since)
+    if since == 0:
+        query = query.filter(Employee.is_active == True)
+    rows = query.order_by(Employee.revision).limit(limit).all()
+    if not rows:
+        return SyncPage(latest, latest, [])
+
+    # Plantillas de todos los empleados de la página en una sola consulta
+    active_ids = [row.id for row in rows if row.is_active]
+    templates: dict[str, list[np.ndarray]] = {}
+    if active_ids:
+        blobs = db.query(FaceTemplate.employee_id, FaceTemplate.vector_blob)\
+            .filter(FaceTemplate.employee_id.in_(active_ids))\
+            .order_by(FaceTemplate.employee_id, FaceTemplate.created_at_utc)\
+            .all()
+        for employee_id, blob in blobs:
+            templates.setdefault(employee_id, []).append(decode_face_vector(blob))
+
+    empty = np.empty((0, VECTOR_DIM), dtype=np.float32)
+    entries = []
+    for row in rows:
+        if row.is_active:
+            vectors = templates.get(row.id)
+            matrix = np.vstack(vectors).astype(np.float32, copy=False) if vectors else empty
+            entries.append(SyncEntry(UPSERT, row.id, row.code, row.full_name, matrix))
+        else:
+            entries.append(SyncEntry(REMOVE, row.id, "", "", empty))
+
+    # Con más filas pendientes se sigue desde la última revisión entregada
+    next_since = rows[-1].revision if len(rows) == limit else latest
+    return SyncPage(next_since, latest, entries)
+
+
+def _text(value: str, length: struct.Struct) -> bytes:
+    data = value.encode("utf-8")[:(1 << (8 * length.size)) - 1]
+    # Si el recorte partió un carácter multibyte, se descarta el pedazo
+    data = data.decode("utf-8", "ignore").encode("utf-8")
+    return length.pack(len(data)) + data
+
+
+def encode_changes(page: SyncPage, dim: int = VECTOR_DIM) -> bytes:
+    parts = [_HEADER.pack(SYNC_MAGIC, SYNC_VERSION, dim, page.next_since, page.latest, len(page.entries))]
+    for entry in page.entries:
+        # Máximo 255 plantillas por empleado (el límite de la galería es mucho menor)
+        templates = entry.templates[:255]
+        parts.append(_ENTRY.pack(entry.op, len(templates)))
+        parts.append(_text(entry.employee_id, _U8))
+        if entry.op == UPSERT:
+            parts.append(_text(entry.code, _U8))
+            parts.append(_text(entry.full_name, _U16))
+            parts.append(np.ascontiguousarray(templates, dtype="<f4").tobytes())
+    return b"".join(parts)
+
+
+def decode_changes(data: bytes) -> SyncPage:
+    """Inverso de encode_changes (para clientes en Python y pruebas)."""
+    magic, version, dim, next_since, latest, count = _HEADER.unpack_from(data, 0)
+    if magic != SYNC_MAGIC or version != SYNC_VERSION:
+        raise ValueError("Formato de sincronización no reconocido")
+
+    offset = _HEADER.size
+    entries = []
+
+    def text(length: struct.Struct) -> str:
+        nonlocal offset
+        (size,) = length.unpack_from(data, offset)
+        offset += length.size
+        value = data[offset:offset + size].decode("utf-8")
+        offset += size
+        return value
+
+    for _ in range(count):
+        op, template_count = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        employee_id = text(_U8)
+        code = full_name = ""
+        if op == UPSERT:
+            code = text(_U8)
+            full_name = text(_U16)
+        matrix = np.frombuffer(data, dtype="<f4", count=template_count * dim, offset=offset).reshape(template_count, dim)
+        offset += matrix.nbytes
+        entries.append(SyncEntry(op, employee_id, code, full_name, matrix))
+    return SyncPage(next_since, latest, entries)
@@ -0,0 +1,235 @@
+"""
+Métricas del servidor en formato de texto de Prometheus (GET /metrics).
+
+- Contadores e histogramas en memoria, sin dependencias externas.
+- Tiempos por etapa: `stage("nombre")` mide un bloque y lo acumula en el
+  request en curso (contextvar). Al terminar el request, MetricsMiddleware
+  pasa las etapas al histograma checador_stage_seconds y, si el request fue
+  lento (CHECADOR_SLOW_REQUEST_MS), imprime el desglose.
+- El encoding corre en otro proceso: ahí se usa `collect_stages()` y los
+  tiempos viajan de regreso con el resultado (ver services/encoder_pool.py).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# Buckets en segundos: de 1 ms (búsqueda en galería) a 10 s (timeout del encoder)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets de distancia facial (el umbral de coincidencia es 0.5)
+DISTANCE_BUCKETS = (0.2, 0.3, 0.35, 0.4, 0.45, 0.5, 0.6, 0.8)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [conteos por bucket..., suma, total]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(data)) for key, data in self._values.items())
+        for key, data in items:
+            for bound, count in zip(self.buckets, data):
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {data[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {data[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {data[-1]}")
+        return lines
+
+
+class Gauge:
+    """Valor instantáneo leído al momento de exponer las métricas."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> list[str]:
+        try:
+            value = float(self.read())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    "checador_http_requests_total", "Requests HTTP por ruta y código de estado", ("method", "route", "status"))
+http_latency = registry.histogram(
+    "checador_http_request_seconds", "Duración de los requests HTTP", ("method", "route"))
+stage_latency = registry.histogram(
+    "checador_stage_seconds", "Duración de cada etapa dentro de un request", ("route", "stage"))
+check_ins = registry.counter(
+    "checador_check_ins_total", "Intentos de checada por resultado (recorded, no_face, unknown, rejected)", ("result",))
+rule_rejections = registry.counter(
+    "checador_check_in_rejections_total", "Checadas no registradas por regla de tiempos", ("rule",))
+matches = registry.counter(
+    "checador_face_matches_total", "Búsquedas en la galería por resultado (match, miss)", ("result",))
+match_distance = registry.histogram(
+    "checador_face_match_distance", "Distancia al empleado más cercano", buckets=DISTANCE_BUCKETS)
+
+
+# --- Tiempos por etapa ---
+_current_stages: ContextVar[Optional[dict]] = ContextVar("checador_stages", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Mide el bloque y lo suma a la etapa `name` del request en curso (si hay uno)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = _current_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - start)
+
+
+@contextmanager
+def collect_stages():
+    """Recolecta las etapas medidas dentro del bloque en un dict nuevo (p. ej. en un proceso del pool)."""
+    stages = {}
+    token = _current_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _current_stages.reset(token)
+
+
+def add_stages(stages: dict) -> None:
+    """Suma etapas medidas en otro proceso al request en curso."""
+    current = _current_stages.get()
+    if current is None or not stages:
+        return
+    for name, seconds in stages.items():
+        current[name] = current.get(name, 0.0) + seconds
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: mide cada request HTTP, publica sus etapas en los
+    histogramas y registra los requests lentos con su desglose.
+    Las rutas se etiquetan con su plantilla (/api/attendance/history/{employee_id}),
+    no con la URL real, para no crear una serie por ID.
+    """
+
+    def __init__(self, app, slow_request_ms: int = 0):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stages = {}
+        token = _current_stages.set(stages)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_stages.reset(token)
+
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_requests.inc(method=method, route=route, status=str(status_code))
+            http_latency.observe(elapsed, method=method, route=route)
+            for name, seconds in stages.items():
+                stage_latency.observe(seconds, route=route, stage=name)
+
+            if self.slow_request_ms > 0 and elapsed * 1000 >= self.slow_request_ms:
+                breakdown = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in stages.items())
+                print(f"Request lento: {method} {route} {status_code} {elapsed * 1000:.1f}ms [{breakdown}]")
+
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from io import BytesIO
+from PIL import Image
+import config
+
+
+class PhotoStore:
+    """
+    Guarda las fotos de checadas y de perfil en segundo plano.
+
+    - La ruta se deriva del SHA-256 del archivo subido, así que se conoce antes
+      de escribir (se guarda en la BD en el mismo request) y las fotos
+      repetidas se deduplican solas.
+    - Directorios por prefijo del hash (uploads/<tipo>/ab/cd/<hash>.jpg) para
+      que ningún directorio crezca sin límite.
+    - La escritura (con recompresión JPEG a calidad/tamaño configurables) la
+      hace un pool de hilos con cola acotada. Si la cola está llena la foto
+      igual se encola, pero quien la envió espera a que se escriba
+      (submit_async lo hace sin bloquear el event loop): nunca se pierde la
+      foto. submit_async también calcula el hash, revisa el formato y busca
+      duplicados en disco fuera del event loop.
+    - Toda imagen legible se guarda como JPEG (.jpg); lo que PIL no entiende
+      se guarda tal cual con extensión .bin.
+    """
+
+    def __init__(self, root: str, workers: int, max_queue: int, quality: int, max_side: int):
+        self.root = root
+        self.quality = quality
+        self.max_side = max_side
+        self.workers = max(1, workers)
+        self._executor = self._create_executor()
+        self._slots = threading.BoundedSemaphore(max(1, max_queue))
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def path_for(self, content: bytes, kind: str) -> tuple[str, str]:
+        """
+        Retorna (ruta relativa para URL y BD, ruta en disco) de la foto.
+        La URL siempre empieza con 'uploads/' (ver el mount en main.py).
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        parts = [kind, digest[:2], digest[2:4], f"{digest}{self._extension(content)}"]
+        return "/".join(["uploads"] + parts), os.path.join(self.root, *parts)
+
+    @staticmethod
+    def _extension(content: bytes) -> str:
+        # Solo lee la cabecera: _recompress() guarda como JPEG todo lo que PIL abre
+        try:
+            Image.open(BytesIO(content))
+            return ".jpg"
+        except Exception:
+            return ".bin"
+
+    def disk_path(self, url: str) -> str:
+        """Ruta en disco de una foto a partir de su URL 'uploads/...' guardada en la BD."""
+        parts = url.replace("\\", "/").lstrip("/").split("/")
+        if parts and parts[0] == "uploads":
+            parts = parts[1:]
+        return os.path.join(self.root, *parts)
+
+    def submit(self, content: bytes, kind: str = "checkins") -> str:
+        """
+        Programa la escritura de la foto y retorna su ruta final. Con la cola
+        llena espera a que se escriba: usar solo fuera del event loop.
+        """
+        url, overflow = self._schedule(content, kind)
+        if overflow is not None:
+            overflow.result()
+        return url
+
+    async def submit_async(self, content: bytes, kind: str = "checkins") -> str:
+        """
+        submit() para el event loop: el hash, la revisión del formato y la de
+        duplicados corren en un hilo, y con la cola llena espera la escritura
+        sin bloquearlo.
+        """
+        url, overflow = await asyncio.to_thread(self._schedule, content, kind)
+        if overflow is not None:
+            await asyncio.wrap_future(overflow)
+        return url
+
+    def _schedule(self, content: bytes, kind: str) -> tuple[str, Optional[Future]]:
+        """Encola la escritura; retorna (ruta, futuro a esperar si la cola estaba llena)."""
+        url, disk_path = self.path_for(content, kind)
+
+        with self._lock:
+            if disk_path in self._in_flight or os.path.exists(disk_path):
+                return url, None  # Duplicado: ya está en disco o en camino
+            self._in_flight.add(disk_path)
+            executor = self._executor
+
+        if self._slots.acquire(blocking=False):
+            future = executor.submit(self._write, content, disk_path)
+            future.add_done_callback(lambda _: self._slots.release())
+            return url, None
+        # Cola llena: se encola de todos modos y el que envía espera (contrapresión)
+        return url, executor.submit(self._write, content, disk_path)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Espera a que terminen las escrituras pendientes (al apagar el servidor)."""
+        with self._lock:
+            executor, self._executor = self._executor, self._create_executor()
+        executor.shutdown(wait=wait)
+
+    def _create_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="photos")
+
+    def _write(self, content: bytes, path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = self._recompress(content)
+
+            # Escritura atómica: nunca queda un archivo a medias con el nombre final
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error guardando foto {path}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+
+    def _recompress(self, content: bytes) -> bytes:
+        try:
+            img = Image.open(BytesIO(content))
+            original_format = img.format
+            if self.max_side > 0:
+                img.draft("RGB", (self.max_side, self.max_side))
+            img = img.convert("RGB")
+            if self.max_side > 0 and max(img.size) > self.max_side:
+                img.thumbnail((self.max_side, self.max_side), Image.BILINEAR)
+
+            out = BytesIO()
+            img.save(out, "JPEG", quality=self.quality, optimize=True)
+            # Si la recompresión no ahorra nada, conservar el original (solo si
+            # ya es JPEG: el archivo se llama .jpg)
+            if out.tell() >= len(content) and original_format == "JPEG":
+                return content
+            return out.getvalue()
+        except Exception:
+            # No es una imagen que PIL entienda: guardar tal cual
+            return content
+
+
+photo_store = PhotoStore(
+    root=config.UPLOADS_DIR,
+    workers=config.PHOTO_WORKERS,
+    max_queue=config.PHOTO_MAX_QUEUE,
+    quality=config.PHOTO_JPEG_QUALITY,
+    max_side=config.PHOTO_MAX_SIDE
+)
@@ -0,0 +1,306 @@
+"""
+Regeneración de los encodings de todos los empleados desde su foto de perfil.
+
+Al cambiar los parámetros de detección/encoding (jitters, modelo, ampliación,
+tamaños) las plantillas guardadas dejan de ser comparables con los encodings
+de las checadas nuevas. Cada plantilla lleva la etiqueta de los parámetros con
+que se calculó (config.ENCODER_MODEL_VERSION); este trabajo vuelve a codificar
+la foto de perfil de cada empleado cuya plantilla de registro tiene otra
+etiqueta:
+
+- Las fotos se codifican por bloques en el pool de procesos, dejando lugar
+  en la cola para las checadas.
+- Los resultados se guardan en transacciones por lotes. Las plantillas
+  aprendidas en checadas con otra etiqueta se descartan (no hay foto de la
+  cual regenerarlas); se vuelven a aprender con el uso.
+- Después de cada lote se guarda el avance en un archivo de checkpoint: si el
+  proceso se interrumpe, la siguiente ejecución continúa donde se quedó.
+- La galería en memoria se reconstruye una sola vez al final y se reemplaza
+  de golpe (con varios workers, como una generación nueva).
+
+Un empleado sin foto legible o sin rostro en ella conserva sus plantillas y
+queda en el reporte del trabajo.
+
+Uso por consola (con el servidor detenido; con el servidor corriendo usar
+POST /api/employees/reencode para que la galería se actualice):
+    python -m services.reencode [--force] [--restart]
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import or_
+from database import SessionLocal
+from models import Employee, FaceTemplate, encode_face_vector
+from services.encoder_pool import encoder_pool
+from services.gallery import gallery
+from services.photo_store import photo_store
+import config
+
+# Imágenes por trabajo del pool (cada bloque se reparte entre todos los procesos)
+IMAGES_PER_WORKER = 4
+
+
+class ReencodeJob:
+    def __init__(self, model_version: str, force: bool = False):
+        self.id = str(uuid.uuid4())
+        self.model_version = model_version
+        self.force = force
+        self.status = "queued"  # queued | running | done | failed
+        self.total = 0
+        self.processed = 0
+        self.updated = 0
+        self.failures: list[dict] = []
+        self.after_id = ""  # Último empleado procesado (orden por ID); punto de reanudación
+        self.resumed = False
+        self.error: Optional[str] = None
+        self.task = None  # asyncio.Task cuando corre dentro del servidor
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def fail(self, employee_id: str, code: str, reason: str) -> None:
+        self.failures.append({"employee_id": employee_id, "code": code, "error": reason})
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "model_version": self.model_version,
+            "total": self.total,
+            "processed": self.processed,
+            "updated": self.updated,
+            "failed": len(self.failures),
+            "failures": self.failures,
+            "resumed": self.resumed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# --- Checkpoint ---
+def _load_checkpoint(path: str, job: ReencodeJob) -> None:
+    """Continúa un trabajo interrumpido con los mismos parámetros (si lo hay)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    if state.get("model_version") != job.model_version or bool(state.get("force")) != job.force:
+        return  # Era para otros parámetros: se empieza de cero
+    job.after_id = state.get("after_id", "")
+    job.processed = state.get("processed", 0)
+    job.updated = state.get("updated", 0)
+    job.failures = state.get("failures", [])
+    job.resumed = True
+
+
+def _save_checkpoint(path: str, job: ReencodeJob) -> None:
+    state = {
+        "model_version": job.model_version,
+        "force": job.force,
+        "after_id": job.after_id,
+        "processed": job.processed,
+        "updated": job.updated,
+        "failures": job.failures,
+    }
+    # Escritura atómica: una interrupción nunca deja un checkpoint a medias
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _clear_checkpoint(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# --- Trabajo ---
+def _pending_query(db, job: ReencodeJob):
+    """Empleados activos con foto de perfil pendientes de regenerar (por ID)."""
+    query = db.query(Employee.id, Employee.code, Employee.photo_path)\
+        .filter(Employee.is_active == True, Employee.photo_path.isnot(None))
+    if not job.force:
+        current = db.query(FaceTemplate.id).filter(
+            FaceTemplate.employee_id == Employee.id,
+            FaceTemplate.source == "enroll",
+            FaceTemplate.model_version == job.model_version
+        )
+        query = query.filter(~current.exists())
+    return query
+
+
+async def run_reencode(job: ReencodeJob, checkpoint_path: str = None, batch_size: int = None) -> ReencodeJob:
+    checkpoint_path = checkpoint_path or config.REENCODE_CHECKPOINT_PATH
+    batch_size = max(1, batch_size or config.REENCODE_BATCH_SIZE)
+    job.status = "running"
+    db = SessionLocal()
+    try:
+        _load_checkpoint(checkpoint_path, job)
+        job.total = job.processed + _pending_query(db, job).filter(Employee.id > job.after_id).count()
+
+        chunk_size = max(1, encoder_pool.workers) * IMAGES_PER_WORKER
+        while True:
+            rows = _pending_query(db, job).filter(Employee.id > job.after_id)\
+                .order_by(Employee.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            results = []
+            for begin in range(0, len(rows), chunk_size):
+                chunk = rows[begin:begin + chunk_size]
+                images = await asyncio.to_thread(_read_photos, chunk)
+                readable = [(row, content) for row, content in zip(chunk, images) if content is not None]
+                vectors_per_image = await encoder_pool.encode_batch_background([content for _, content in readable])
+
+                for row, content in zip(chunk, images):
+                    if content is None:
+                        job.fail(row.id, row.code, "No se encontró la foto de perfil")
+                for (row, _), vectors in zip(readable, vectors_per_image):
+                    if vectors is None:
+                        job.fail(row.id, row.code, "Tiempo de procesamiento excedido")
+                    elif not vectors:
+                        job.fail(row.id, row.code, "No se detectó ningún rostro en la foto")
+                    else:
+                        results.append((row.id, row.photo_path, vectors[0]))
+
+            job.updated += await asyncio.to_thread(_write_batch, db, results, job.model_version)
+            job.processed += len(rows)
+            job.after_id = rows[-1].id
+            _save_checkpoint(checkpoint_path, job)
+
+        # Un solo reemplazo de la galería con todas las plantillas nuevas (con
+        # varios workers se publica aunque este no la tenga cargada: los demás sí)
+        if job.updated and (gallery.loaded or gallery.shared):
+            await asyncio.to_thread(gallery.load, db)
+
+        _clear_checkpoint(checkpoint_path)
+        job.status = "done"
+    except Exception as e:
+        # El checkpoint se conserva: la siguiente ejecución continúa desde el último lote guardado
+        job.status = "failed"
+        job.error = str(e) or e.__class__.__name__
+    finally:
+        job.finished_at = datetime.utcnow()
+        db.close()
+    return job
+
+
+def _read_photos(rows) -> list[Optional[bytes]]:
+    images = []
+    for row in rows:
+        try:
+            with open(photo_store.disk_path(row.photo_path), "rb") as f:
+                images.append(f.read())
+        except OSError:
+            images.append(None)
+    return images
+
+
+def _write_batch(db, results: list[tuple], model_version: str) -> int:
+    """
+    Guarda un lote en una transacción: vector de perfil y plantilla de registro
+    nuevos, y se descartan las plantillas aprendidas con otros parámetros.
+    Retorna los empleados actualizados.
+    """
+    if not results:
+        return 0
+    ids = [employee_id for employee_id, _, _ in results]
+    employees = {employee.id: employee for employee in db.query(Employee).filter(Employee.id.in_(ids))}
+
+    # Si la foto cambió mientras se codificaba, el registro nuevo ya trae su encoding
+    results = [(employee_id, vector) for employee_id, photo_path, vector in results
+               if employee_id in employees and employees[employee_id].photo_path == photo_path]
+    ids = [employee_id for employee_id, _ in results]
+    if not ids:
+        return 0
+
+    db.query(FaceTemplate).filter(
+        FaceTemplate.employee_id.in_(ids),
+        or_(
+            FaceTemplate.source == "enroll",
+            FaceTemplate.model_version.is_(None),
+            FaceTemplate.model_version != model_version
+        )
+    ).delete(synchronize_session=False)
+
+    for employee_id, vector in results:
+        blob = encode_face_vector(vector)
+        # Sube la revisión del empleado: los kioscos reciben el encoding nuevo
+        employees[employee_id].face_vector_blob = blob
+        db.add(FaceTemplate(employee_id=employee_id, vector_blob=blob, source="enroll", model_version=model_version))
+    db.commit()
+    return len(results)
+
+
+class ReencodeJobRegistry:
+    """Un solo trabajo a la vez por proceso; se conserva el último para consultarlo."""
+
+    def __init__(self):
+        self._job: Optional[ReencodeJob] = None
+        self._lock = threading.Lock()
+
+    def create(self, model_version: str, force: bool = False) -> Optional[ReencodeJob]:
+        """Retorna None si ya hay un trabajo en curso."""
+        with self._lock:
+            if self._job is not None and self._job.running:
+                return None
+            self._job = ReencodeJob(model_version, force)
+            return self._job
+
+    @property
+    def current(self) -> Optional[ReencodeJob]:
+        return self._job
+
+
+reencode_jobs = ReencodeJobRegistry()
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import engine, Base
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Regenera los encodings de los empleados desde su foto de perfil")
+    parser.add_argument("--force", action="store_true", help="Regenerar también las plantillas que ya tienen la etiqueta actual")
+    parser.add_argument("--restart", action="store_true", help="Ignorar el checkpoint y empezar de cero")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    if args.restart:
+        _clear_checkpoint(config.REENCODE_CHECKPOINT_PATH)
+
+    async def _main():
+        job = reencode_jobs.create(config.ENCODER_MODEL_VERSION, args.force)
+        task = asyncio.create_task(run_reencode(job))
+        while not task.done():
+            await asyncio.sleep(1.0)
+            print(f"\r{job.processed}/{job.total} procesados, {job.updated} actualizados", end="", flush=True)
+        print()
+        if job.resumed:
+            print("Se continuó desde el checkpoint anterior")
+        for failure in job.failures:
+            print(f"  {failure['code']}: {failure['error']}")
+        if job.error:
+            print(f"Error: {job.error} (vuelva a ejecutar para continuar)")
+        print(f"Empleados actualizados: {job.updated} de {job.total} (etiqueta {job.model_version})")
+
+    encoder_pool.start()
+    try:
+        started = time.monotonic()
+        asyncio.run(_main())
+        print(f"Tiempo total: {time.monotonic() - started:.1f}s")
+    finally:
+        encoder_pool.shutdown()
@@ -0,0 +1,267 @@
+"""
+Motor de reportes de horas trabajadas.
+
+Arma turnos a partir de los pares entrada/salida de cada empleado y mantiene
+la tabla daily_summaries (models.DailySummary): se actualiza en cada checada,
+en la misma transacción que el registro, y se puede reconstruir completa con
+backfill(). Los reportes por rango de fechas leen solo los resúmenes.
+
+Uso por consola (reconstruye los resúmenes):
+    python -m services.reports [--start 2026-01-01] [--end 2026-01-31]
+"""
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from typing import Iterable, Optional
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from models import AttendanceRecord, DailySummary, Employee
+from services.attendance_rules import CYCLE_TIMEOUT_HOURS
+
+CYCLE_TIMEOUT = timedelta(hours=CYCLE_TIMEOUT_HOURS)
+BACKFILL_BATCH_ROWS = 5000
+
+
+class Shift:
+    """Un turno: entrada y salida en hora local (cualquiera puede faltar)."""
+
+    __slots__ = ("check_in", "check_out")
+
+    def __init__(self, check_in: Optional[datetime], check_out: Optional[datetime]):
+        self.check_in = check_in
+        self.check_out = check_out
+
+    @property
+    def day(self) -> date:
+        # El turno cuenta para el día de su entrada (turnos nocturnos)
+        return (self.check_in or self.check_out).date()
+
+    @property
+    def complete(self) -> bool:
+        return self.check_in is not None and self.check_out is not None
+
+    @property
+    def minutes(self) -> float:
+        if not self.complete:
+            return 0.0
+        return (self.check_out - self.check_in).total_seconds() / 60.0
+
+
+def pair_shifts(records: Iterable[tuple[int, datetime]]) -> list[Shift]:
+    """
+    Arma los turnos de UN empleado a partir de sus registros (type, local_time)
+    en orden cronológico, con el mismo criterio que las reglas de checada
+    (services/attendance_rules.py):
+    - una salida cierra la entrada abierta si llega dentro de CYCLE_TIMEOUT_HOURS;
+    - una entrada con otra entrada abierta deja la anterior sin salida;
+    - una salida sin entrada abierta queda como salida huérfana.
+    """
+    shifts = []
+    open_check_in = None
+    for record_type, local_time in records:
+        if record_type == 0:
+            if open_check_in is not None:
+                shifts.append(Shift(open_check_in, None))
+            open_check_in = local_time
+        elif open_check_in is not None and local_time - open_check_in <= CYCLE_TIMEOUT:
+            shifts.append(Shift(open_check_in, local_time))
+            open_check_in = None
+        else:
+            if open_check_in is not None:
+                shifts.append(Shift(open_check_in, None))
+                open_check_in = None
+            shifts.append(Shift(None, local_time))
+
+    if open_check_in is not None:
+        shifts.append(Shift(open_check_in, None))
+    return shifts
+
+
+def summarize(employee_id: str, shifts: Iterable[Shift], days: Optional[set] = None) -> dict[date, DailySummary]:
+    """Agrupa los turnos por día; con `days` solo se conservan esos días."""
+    summaries = {}
+    for shift in shifts:
+        day = shift.day
+        if days is not None and day not in days:
+            continue
+        summary = summaries.get(day)
+        if summary is None:
+            summary = summaries[day] = DailySummary(
+                employee_id=employee_id, day=day,
+                shifts=0, open_shifts=0, orphan_check_outs=0, worked_minutes=0.0
+            )
+
+        if shift.complete:
+            summary.shifts += 1
+            summary.worked_minutes += shift.minutes
+            if summary.last_check_out is None or shift.check_out > summary.last_check_out:
+                summary.last_check_out = shift.check_out
+        elif shift.check_in is not None:
+            summary.open_shifts += 1
+        else:
+            summary.orphan_check_outs += 1
+
+        if shift.check_in is not None and (summary.first_check_in is None or shift.check_in < summary.first_check_in):
+            summary.first_check_in = shift.check_in
+    return summaries
+
+
+def _window(start_day: date, end_day: date) -> tuple[datetime, datetime]:
+    """
+    Rango de registros necesario para calcular los días [start_day, end_day]:
+    incluye CYCLE_TIMEOUT antes (entradas abiertas del día anterior) y después
+    (salidas de turnos nocturnos del último día).
+    """
+    start = datetime.combine(start_day, time.min) - CYCLE_TIMEOUT
+    end = datetime.combine(end_day + timedelta(days=1), time.min) + CYCLE_TIMEOUT
+    return start, end
+
+
+# --- Actualización incremental ---
+def refresh_daily_summary(db: Session, employee_id: str, local_time: datetime) -> None:
+    """
+    Recalcula los resúmenes afectados por un registro nuevo: el día del
+    registro y, si es una salida de turno nocturno, el día de su entrada.
+    Llamar antes del commit (hace flush para ver el registro recién agregado).
+    """
+    days = {local_time.date(), (local_time - CYCLE_TIMEOUT).date()}
+    db.flush()
+
+    start, end = _window(min(days), max(days))
+    rows = db.query(AttendanceRecord.type, AttendanceRecord.local_time)\
+        .filter(
+            AttendanceRecord.employee_id == employee_id,
+            AttendanceRecord.local_time >= start,
+            AttendanceRecord.local_time < end
+        )\
+        .order_by(AttendanceRecord.local_time)\
+        .all()
+    computed = summarize(employee_id, pair_shifts(rows), days)
+
+    existing = {
+        summary.day: summary
+        for summary in db.query(DailySummary)
+            .filter(DailySummary.employee_id == employee_id, DailySummary.day.in_(days))
+    }
+    now_utc = datetime.utcnow()
+    for day in days:
+        current, fresh = existing.get(day), computed.get(day)
+        if fresh is None:
+            if current is not None:
+                db.delete(current)
+            continue
+        if current is None:
+            fresh.updated_at_utc = now_utc
+            db.add(fresh)
+            continue
+        for field in ("first_check_in", "last_check_out", "shifts", "open_shifts",
+                      "orphan_check_outs", "worked_minutes"):
+            setattr(current, field, getattr(fresh, field))
+        current.updated_at_utc = now_utc
+
+
+# --- Reconstrucción completa ---
+def backfill(db: Session, start_day: Optional[date] = None, end_day: Optional[date] = None) -> int:
+    """
+    Reconstruye los resúmenes de [start_day, end_day] (todo el historial si no
+    se indican) recorriendo attendance_records por lotes. Hace commit y
+    retorna el número de resúmenes escritos.
+    """
+    bounds = db.query(func.min(AttendanceRecord.local_time), func.max(AttendanceRecord.local_time)).one()
+    if bounds[0] is None:
+        return 0
+    start_day = start_day or bounds[0].date()
+    end_day = end_day or bounds[1].date()
+    if start_day > end_day:
+        return 0
+
+    days_filter = DailySummary.day.between(start_day, end_day)
+    db.query(DailySummary).filter(days_filter).delete(synchronize_session=False)
+
+    start, end = _window(start_day, end_day)
+    rows = db.query(AttendanceRecord.employee_id, AttendanceRecord.type, AttendanceRecord.local_time)\
+        .filter(AttendanceRecord.local_time >= start, AttendanceRecord.local_time < end)\
+        .order_by(AttendanceRecord.employee_id, AttendanceRecord.local_time)\
+        .yield_per(BACKFILL_BATCH_ROWS)
+
+    written = 0
+    now_utc = datetime.utcnow()
+    for employee_id, records in groupby(rows, key=lambda row: row[0]):
+        shifts = pair_shifts((record_type, local_time) for _, record_type, local_time in records)
+        for summary in summarize(employee_id, shifts).values():
+            if start_day <= summary.day <= end_day:
+                summary.updated_at_utc = now_utc
+                db.add(summary)
+                written += 1
+
+    db.commit()
+    return written
+
+
+# --- Consultas de reportes ---
+def daily_report(db: Session, start_day: date, end_day: date, employee_id: Optional[str] = None) -> list[dict]:
+    """Resúmenes diarios del rango con los datos del empleado."""
+    query = db.query(
+            DailySummary.employee_id,
+            Employee.full_name.label("employee_name"),
+            Employee.code.label("employee_code"),
+            DailySummary.day,
+            DailySummary.first_check_in,
+            DailySummary.last_check_out,
+            DailySummary.shifts,
+            DailySummary.open_shifts,
+            DailySummary.orphan_check_outs,
+            DailySummary.worked_minutes
+        )\
+        .join(Employee, Employee.id == DailySummary.employee_id)\
+        .filter(DailySummary.day.between(start_day, end_day))
+    if employee_id:
+        query = query.filter(DailySummary.employee_id == employee_id)
+
+    result = []
+    for row in query.order_by(DailySummary.day, Employee.full_name):
+        item = row._asdict()
+        item["worked_hours"] = round(item.pop("worked_minutes") / 60.0, 2)
+        result.append(item)
+    return result
+
+
+def worked_hours_report(db: Session, start_day: date, end_day: date, employee_id: Optional[str] = None) -> list[dict]:
+    """Totales por empleado en el rango (una sola agregación sobre los resúmenes)."""
+    query = db.query(
+            DailySummary.employee_id,
+            Employee.full_name.label("employee_name"),
+            Employee.code.label("employee_code"),
+            func.sum(case((DailySummary.shifts > 0, 1), else_=0)).label("days_worked"),
+            func.sum(DailySummary.shifts).label("shifts"),
+            func.sum(DailySummary.open_shifts).label("open_shifts"),
+            func.sum(DailySummary.orphan_check_outs).label("orphan_check_outs"),
+            func.sum(DailySummary.worked_minutes).label("worked_minutes")
+        )\
+        .join(Employee, Employee.id == DailySummary.employee_id)\
+        .filter(DailySummary.day.between(start_day, end_day))\
+        .group_by(DailySummary.employee_id, Employee.full_name, Employee.code)
+    if employee_id:
+        query = query.filter(DailySummary.employee_id == employee_id)
+
+    result = []
+    for row in query.order_by(Employee.full_name):
+        item = row._asdict()
+        item["worked_hours"] = round((item.pop("worked_minutes") or 0.0) / 60.0, 2)
+        result.append(item)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Reconstruye los resúmenes diarios de asistencia")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="Primer día (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Último día (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        print(f"Resúmenes escritos: {backfill(session, args.start, args.end)}")
+    finally:
+        session.close()
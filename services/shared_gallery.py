@@ -0,0 +1,126 @@
+"""
+Galería compartida entre varios workers de uvicorn (CHECADOR_WEB_WORKERS > 1).
+
+Cada worker es un proceso con su propia FaceGallery; para no consultar la
+BD en cada uno ni quedarse con una copia desfasada, las plantillas viven en
+archivos .npy que todos mapean en memoria (el sistema operativo comparte
+las páginas entre procesos):
+
+    gallery.gen              contador de generación (mmap de 16 bytes)
+    gallery.lock             lock entre procesos para publicar
+    templates-<gen>.npy      matriz T x 128 float32, filas agrupadas por empleado
+    owners-<gen>.npy         ID del empleado de cada fila
+
+El worker que hace commit de un cambio de empleado escribe una generación
+nueva (archivos nuevos + contador); los demás comparan el contador en cada
+búsqueda y, si cambió, mapean la generación nueva sin tocar la BD.
+
+El contador guarda también el PID del proceso padre (el supervisor de
+uvicorn): una galería escrita en una ejecución anterior del servidor se
+ignora y se reconstruye desde la BD.
+"""
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+import numpy as np
+
+_HEADER = struct.Struct("<QQ")  # (generación, PID del supervisor)
+_KEEP_GENERATIONS = 2
+
+
+@contextmanager
+def _file_lock(path: str):
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedGalleryStore:
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self.session = os.getppid()
+        self._counter = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_counter(self) -> mmap.mmap:
+        if self._counter is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path("gallery.gen")
+            with open(path, "a+b") as f:
+                if os.path.getsize(path) < _HEADER.size:
+                    f.write(b"\0" * (_HEADER.size - os.path.getsize(path)))
+                    f.flush()
+                self._counter = mmap.mmap(f.fileno(), _HEADER.size)
+        return self._counter
+
+    @property
+    def generation(self) -> int:
+        """Generación publicada en esta ejecución del servidor (0 = ninguna todavía)."""
+        generation, session = _HEADER.unpack_from(self._open_counter(), 0)
+        return generation if session == self.session else 0
+
+    def lock(self):
+        """Serializa a los workers que publican (y su lectura de la generación vigente)."""
+        os.makedirs(self.directory, exist_ok=True)
+        return _file_lock(self._path("gallery.lock"))
+
+    def read(self, generation: int) -> tuple[np.ndarray, np.ndarray]:
+        """(plantillas, dueños) de una generación, mapeados en memoria de solo lectura."""
+        matrix = np.load(self._path(f"templates-{generation}.npy"), mmap_mode="r")
+        owners = np.load(self._path(f"owners-{generation}.npy"), mmap_mode="r")
+        return matrix, owners
+
+    def publish(self, matrix: np.ndarray, owners) -> int:
+        """Escribe una generación nueva y la anuncia. Llamar dentro de lock()."""
+        counter = self._open_counter()
+        previous, session = _HEADER.unpack_from(counter, 0)
+        generation = previous + 1
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        owners = np.asarray(owners, dtype=str)
+        self._write(f"templates-{generation}.npy", matrix)
+        self._write(f"owners-{generation}.npy", owners)
+
+        # El contador se actualiza hasta que los archivos están completos
+        _HEADER.pack_into(counter, 0, generation, self.session)
+        counter.flush()
+        self._cleanup(generation)
+        return generation
+
+    def _write(self, name: str, array: np.ndarray) -> None:
+        # Escritura atómica: nunca se mapea un archivo a medias
+        tmp_path = self._path(f"{name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, self._path(name))
+
+    def _cleanup(self, generation: int) -> None:
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                old = int(name.rsplit("-", 1)[1][:-4])
+            except ValueError:
+                continue
+            if old <= generation - _KEEP_GENERATIONS or old > generation:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass  # Windows: otro worker todavía la tiene mapeada; se borra en la siguiente
@@ -0,0 +1,80 @@
+import numpy as np
+from sqlalchemy.orm import Session
+from models import Employee, FaceTemplate, encode_face_vector, decode_face_vector, next_revision
+from services.gallery import gallery
+import config
+
+
+def set_enrollment_template(db: Session, employee: Employee, face_vector) -> None:
+    """
+    Reemplaza la plantilla de registro ('enroll') del empleado con el vector
+    de su foto de perfil. Las plantillas aprendidas en checadas se conservan.
+    No hace commit.
+    """
+    if employee.id:
+        db.query(FaceTemplate).filter(
+            FaceTemplate.employee_id == employee.id,
+            FaceTemplate.source == "enroll"
+        ).delete(synchronize_session=False)
+
+    employee.face_templates.append(FaceTemplate(
+        vector_blob=encode_face_vector(face_vector),
+        source="enroll",
+        model_version=config.ENCODER_MODEL_VERSION
+    ))
+
+
+def learn_from_check_in(db: Session, employee_id: str, face_vector, distance: float) -> bool:
+    """
+    Agrega el vector de una checada como plantilla 'checkin' si la coincidencia
+    fue muy alta pero el vector aporta variación (luz, lentes, etc.) respecto
+    a las plantillas existentes. Aplica el máximo por empleado desalojando las
+    plantillas aprendidas más antiguas. No hace commit.
+    Retorna True si se agregó una plantilla.
+    """
+    if not config.AUTO_TEMPLATES or distance > config.AUTO_TEMPLATE_MAX_DISTANCE:
+        return False
+
+    vector = np.asarray(face_vector, dtype=np.float32)
+    existing = gallery.employee_vectors(employee_id)
+    if len(existing) > 0:
+        novelty = float(np.sqrt(((existing - vector) ** 2).sum(axis=1)).min())
+        if novelty < config.AUTO_TEMPLATE_MIN_NOVELTY:
+            return False
+
+    db.add(FaceTemplate(
+        employee_id=employee_id,
+        vector_blob=encode_face_vector(vector),
+        source="checkin",
+        match_score=distance,
+        model_version=config.ENCODER_MODEL_VERSION
+    ))
+
+    # Política de desalojo: nunca se borra la plantilla de registro
+    templates = db.query(FaceTemplate.id, FaceTemplate.source)\
+        .filter(FaceTemplate.employee_id == employee_id)\
+        .order_by(FaceTemplate.created_at_utc)\
+        .all()
+    overflow = len(templates) + 1 - max(1, config.MAX_TEMPLATES_PER_EMPLOYEE)
+    evict = [template_id for template_id, source in templates if source == "checkin"][:max(0, overflow)]
+    if evict:
+        db.query(FaceTemplate).filter(FaceTemplate.id.in_(evict)).delete(synchronize_session=False)
+
+    # Las plantillas del empleado cambiaron: nueva revisión para la sincronización delta
+    db.query(Employee).filter(Employee.id == employee_id)\
+        .update({Employee.revision: next_revision()}, synchronize_session=False)
+    return True
+
+
+def sync_gallery(db: Session, employee_id: str) -> None:
+    """Publica en la galería en memoria las plantillas actuales del empleado (después del commit)."""
+    employee = db.get(Employee, employee_id)
+    if employee is None or not employee.is_active:
+        gallery.remove(employee_id)
+        return
+
+    blobs = db.query(FaceTemplate.vector_blob)\
+        .filter(FaceTemplate.employee_id == employee_id)\
+        .order_by(FaceTemplate.created_at_utc)\
+        .all()
+    gallery.set_employee(employee_id, [decode_face_vector(blob) for (blob,) in blobs])
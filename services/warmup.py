@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Optional
+from database import SessionLocal
+from services.attendance_state import attendance_state
+from services.encoder_pool import encoder_pool
+from services.gallery import gallery
+
+
+class WarmupState:
+    """
+    Calentamiento en segundo plano después de arrancar el servidor:
+    1. Modelos: arranca los procesos del pool y hace un encoding de prueba en cada uno.
+    2. Galería: carga las plantillas de la BD a memoria.
+    3. Estado de asistencia: precarga el último registro de cada empleado.
+
+    El servidor acepta requests desde el inicio; lo que llegue antes se
+    atiende igual (cargando lo que falte), solo que más lento. GET
+    /health/ready reporta cuándo está todo listo.
+    """
+
+    STEPS = ("models", "gallery", "attendance")
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: dict[str, Optional[float]] = {step: None for step in self.STEPS}  # paso -> segundos
+        self.error: Optional[str] = None
+
+    @property
+    def models_ready(self) -> bool:
+        return self.steps["models"] is not None
+
+    @property
+    def ready(self) -> bool:
+        # La galería y el estado también se cargan solos en la primera checada;
+        # aquí se reporta el estado real por si alguien los invalidó después
+        return self.models_ready and gallery.loaded and attendance_state.warmed
+
+    async def run(self) -> None:
+        self.started_at = time.monotonic()
+        try:
+            await self._step("models", encoder_pool.warm_up())
+            await self._step("gallery", asyncio.to_thread(self._with_session, gallery.ensure_loaded))
+            await self._step("attendance", asyncio.to_thread(self._with_session, attendance_state.ensure_warm))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = str(e) or e.__class__.__name__
+            print(f"Error en el calentamiento: {self.error}")
+        finally:
+            self.finished_at = time.monotonic()
+
+    async def _step(self, name: str, job) -> None:
+        start = time.monotonic()
+        await job
+        self.steps[name] = time.monotonic() - start
+
+    @staticmethod
+    def _with_session(load) -> None:
+        db = SessionLocal()
+        try:
+            load(db)
+        finally:
+            db.close()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "models": self.models_ready,
+            "gallery": gallery.loaded,
+            "attendance": attendance_state.warmed,
+            "gallery_employees": gallery.employee_count,
+            "steps_seconds": {name: round(seconds, 3) for name, seconds in self.steps.items() if seconds is not None},
+            "warmup_seconds": round((self.finished_at or time.monotonic()) - self.started_at, 3) if self.started_at else None,
+            "error": self.error,
+        }
+
+
+# Instancia única por proceso
+warmup = WarmupState()